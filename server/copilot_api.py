@@ -1,11 +1,32 @@
-import subprocess
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website'))
+from admission import AdmissionController
+from agent_backend import make_backend
 
 
 with open('prompt.txt', 'r') as file:
     initial_prompt = file.read()
 
-class CursorAPI:
+# At most AGENT_CONCURRENCY copilot runs at once, shared fairly between sessions; past
+# AGENT_QUEUE_MAX waiting runs requests are refused with Overloaded (see admission.py)
+admission = AdmissionController(
+    limit=int(os.environ.get('AGENT_CONCURRENCY', '4')),
+    max_queue=int(os.environ.get('AGENT_QUEUE_MAX', '32')),
+    max_per_participant=int(os.environ.get('AGENT_QUEUE_PER_PARTICIPANT', '3')),
+)
+
+# AGENT_HOST=1 keeps one `copilot --acp` process per session instead of one CLI run per message
+backend = make_backend(
+    'copilot',
+    model='gpt-5.1-codex-max',
+    persistent=os.environ.get('AGENT_HOST') == '1',
+    idle_seconds=float(os.environ.get('AGENT_HOST_IDLE_SECONDS', '600')),
+    admission=admission,
+)
+
+class CopilotAPI:
     def __init__(self, project_path, uuid=None):
         self.project_path = project_path
         self.uuid = uuid
@@ -15,69 +36,12 @@ class CursorAPI:
             self.ask_cursor_agent(initial_prompt)
     
     def create_chat(self, timeout=180):
-        shell_command = (
-            f'cd "{self.project_path}" && '
-            f'copilot -p "." --model gpt-5.1-codex-max -s --allow-all-tools 2>/dev/null >/dev/null && '
-            f'ls -t ~/.copilot/logs/ 2>/dev/null | head -n 1 | sed "s/\\.log$//"'
-        )
-        
-        try:
-            result = subprocess.run(
-                shell_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=self.project_path,
-                env={**os.environ, 'PATH': f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"},
-                timeout=timeout
-            )
-            
-            if result.returncode == 0:
-                output = result.stdout.strip()[8:]
-                if output:
-                    return output
-                else:
-                    raise Exception("Failed to retrieve session ID")
-            else:
-                error_msg = result.stderr if result.stderr else "Unknown error"
-                raise Exception(f"Failed to create chat: {error_msg}")
-        
-        except subprocess.TimeoutExpired:
-            raise Exception(f"Timeout: copilot create-chat took longer than {timeout} seconds")
-        except Exception as e:
-            raise Exception(f"Error creating copilot chat: {str(e)}")
+        return backend.create_session(self.project_path, timeout=timeout)
     
     def ask_cursor_agent(self, message, timeout=600):
         if not self.uuid:
             raise Exception("UUID not initialized. Cannot ask copilot.")
-        
-        shell_command = (
-            f'cd "{self.project_path}" && '
-            f'copilot --model gpt-5.1-codex-max --resume "{self.uuid}" -p "{message}" -s --allow-all-tools'
-        )
-        
-        try:
-            result = subprocess.run(
-                shell_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=self.project_path,
-                env={**os.environ, 'PATH': f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"},
-                timeout=timeout
-            )
-            
-            if result.returncode == 0:
-                return result.stdout
-            else:
-                error_msg = result.stderr if result.stderr else "Unknown error"
-                raise Exception(f"Failed to ask copilot: {error_msg}")
-        
-        except subprocess.TimeoutExpired:
-            raise Exception(f"Timeout: copilot took longer than {timeout} seconds to respond")
-        except Exception as e:
-            raise Exception(f"Error asking copilot: {str(e)}")
+        return backend.ask(self.uuid, self.project_path, message, timeout)
     
     def get_uuid(self):
         return self.uuid
-
@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from copilot_api import CursorAPI
+from copilot_api import CopilotAPI
+from admission import Overloaded
 import os
 import json
 from datetime import datetime
@@ -72,13 +73,13 @@ def ask():
     try:
         if session_id == "default" or session_id not in cursor_sessions:
             print('here1')
-            cursor_api = CursorAPI(STATIC_PROJECT_PATH)
+            cursor_api = CopilotAPI(STATIC_PROJECT_PATH)
             session_id = cursor_api.get_uuid()
             cursor_sessions.add(session_id)
             conversations[session_id] = []
         else:
             print('here2')
-            cursor_api = CursorAPI(STATIC_PROJECT_PATH, uuid=session_id)
+            cursor_api = CopilotAPI(STATIC_PROJECT_PATH, uuid=session_id)
             if session_id not in conversations:
                 conversations[session_id] = []
         
@@ -102,6 +103,12 @@ def ask():
             "session_id": session_id
         })
     
+    except Overloaded as e:
+        return jsonify({
+            "reply": f"Error: {str(e)}",
+            "session_id": session_id,
+            "retry_after": e.retry_after
+        }), 429, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         error_msg = str(e)
         return jsonify({
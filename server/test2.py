@@ -1,5 +1,5 @@
 import os
-from copilot_api import CursorAPI
+from copilot_api import CopilotAPI
 
 #project_path = os.getcwd()
 project_path = "/Users/neo/Desktop/Uni/Collin/05.HIPPA_SW2/0/Rocket.Chat.ReactNative"
@@ -8,7 +8,7 @@ print(f"Project path: {project_path}\n")
 
 print("Creating new cursor-agent chat...")
 try:
-    api = CursorAPI(project_path)
+    api = CopilotAPI(project_path)
     uuid = api.get_uuid()
     print(f"Chat created with UUID: {uuid}\n")
 except Exception as e:
@@ -0,0 +1,325 @@
+"""
+Latency benchmark for website/server.py request handlers.
+
+For each participant count in --sizes, writes synthetic response files
+(shaped like the data/N.* rounds) into a throwaway site directory, starts
+the server in a fresh process on them (with a stub `copilot` CLI in a
+throwaway HOME) and drives these handlers through Flask's test client:
+
+    get_requirements        GET  /api/get_requirements?batch=1&uuid=<participant>
+    submit_batch_feedback   POST /api/submit_batch_feedback
+    ask_chatbot             POST /api/ask_chatbot, then GET /api/chatbot_job/<id>?wait until done
+    get_admin_data          GET  /api/admin/data
+    show_results_data       GET  /api/show_results/data
+
+Each handler is called once to warm up (reported as first_ms), then up to
+--calls times or until --seconds have passed. Latency percentiles come from
+that loop; allocation figures come from a separate, shorter loop under
+tracemalloc (--alloc-calls): allocated blocks that are still alive after
+the call, and the peak of traced memory during it.
+
+Results are printed and saved as JSON (--output, by default
+test/bench_results/handlers-<UTC time>.json) with the commit and
+environment, so runs can be compared over time.
+
+    python test/bench_handlers.py [--sizes 10,100,1000,10000,100000] [--backend journal|sqlite]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+WEBSITE_DIR = os.path.join(REPO_DIR, 'website')
+
+HANDLERS = ['get_requirements', 'submit_batch_feedback', 'ask_chatbot', 'get_admin_data', 'show_results_data']
+
+STUB_CLI = r'''#!/usr/bin/env python3
+import os, sys, uuid
+args = sys.argv[1:]
+state_dir = os.path.expanduser('~/.copilot/session-state')
+os.makedirs(state_dir, exist_ok=True)
+if '--resume' not in args:
+    os.makedirs(os.path.join(state_dir, str(uuid.uuid4())))
+print('stub reply')
+'''
+
+AGREEMENT = ['Strongly Agree', 'Agree', 'Disagree', 'Strongly Disagree']
+SATISFACTION = ['Satisfied', 'Weakly Satisfied', 'Weakly Denied', 'Denied', 'Not Applicable']
+
+
+def synthesize(responses_dir, participants, nfrs_per_participant, turns, batches, rng):
+    """Write response files for `participants` synthetic participants into `responses_dir`."""
+    conversations, feedback, surveys, demographics = {}, {}, {}, {}
+    assignments, mapping, gates = {}, {}, {}
+    # Server-side times are naive isoformat, browser-side ones (toISOString) end in Z
+    server_time, client_time = '2026-03-10T19:31:32.583214', '2026-03-10T19:31:32.583Z'
+    for i in range(participants):
+        session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        batch = batches[(i // 2) % len(batches)]
+        assignments[session_id] = [batch]
+        mapping[session_id] = '%024x' % rng.getrandbits(96)
+        conversations[session_id] = [{
+            'user_message': f'Please evaluate the following NFR ({n}): ' + 'x' * 200,
+            'bot_reply': 'Satisfaction Level: Weakly Satisfied. Reasoning: ' + 'y' * 400,
+            'user_time': server_time,
+            'bot_time': server_time,
+        } for n in range(turns)]
+        feedback[session_id] = [{
+            'uuid': session_id, 'nfr_id': n + 1, 'batch': batch,
+            'q1_agreement': rng.choice(AGREEMENT), 'q2_agreement': rng.choice(AGREEMENT),
+            'q3_agreement': rng.choice(AGREEMENT), 'undecided_reason': '', 'forced_own_assessment': '',
+            'nfr_acknowledged': True, 'timestamp': client_time,
+            'satisfaction_level': rng.choice(SATISFACTION), 'reasoning': 'z' * 150,
+        } for n in range(nfrs_per_participant)]
+        surveys[session_id] = {'uuid': session_id, **{f'q{q}': str(rng.randint(1, 5)) for q in range(1, 9)},
+                               'timestamp': client_time}
+        demographics[session_id] = {'uuid': session_id, 'age': '18-25', 'gender': 'male', 'education': 'bachelor',
+                                    'experience': 'less-than-1', 'languages': ['python', 'sql'],
+                                    'timestamp': server_time}
+        gates[session_id] = {str(batch): {'1': {'nfr_id': 1, 'batch': batch, 'answer': 'because',
+                                                'timestamp': server_time}}}
+    files = {
+        'conversation.json': conversations,
+        'nfr_responses.json': feedback,
+        'satisfaction_survey.json': surveys,
+        'demographics.json': demographics,
+        'user_batch_assignments.json': assignments,
+        'prolific_uuid_mapping.json': mapping,
+        'gate_answers.json': gates,
+        'prize.json': {'prolific': {}, 'emails': []},
+    }
+    for filename, data in files.items():
+        with open(os.path.join(responses_dir, filename), 'w') as f:
+            json.dump(data, f)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_size(site, participants, args, results):
+    """Benchmark one dataset; runs in its own process so the server starts from scratch."""
+    os.chdir(site)
+    sys.path.insert(0, WEBSITE_DIR)
+    start = time.perf_counter()
+    import server
+    startup = time.perf_counter() - start
+
+    client = server.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_authenticated'] = True
+    rng = random.Random(participants)
+    chat_session = str(uuid.uuid4())
+
+    def get_requirements():
+        return client.get(f'/api/get_requirements?batch=1&uuid={rng.choice(participants_ids)}')
+
+    def submit_batch_feedback():
+        session_id = rng.choice(participants_ids)
+        return client.post('/api/submit_batch_feedback', json=[
+            {'uuid': session_id, 'batch': 1, 'nfr_id': n + 1, 'q1_agreement': rng.choice(AGREEMENT),
+             'q2_agreement': 'Agree', 'q3_agreement': 'Agree', 'reasoning': 'bench'}
+            for n in range(args.nfrs)])
+
+    def ask_chatbot():
+        response = client.post('/api/ask_chatbot', json={'uuid': chat_session, 'message': 'bench'})
+        job_id = response.json['job_id']
+        while True:
+            response = client.get(f'/api/chatbot_job/{job_id}?wait=5')
+            if response.json.get('status') in ('done', 'error'):
+                return response
+
+    def get_admin_data():
+        return client.get('/api/admin/data')
+
+    def show_results_data():
+        return client.get('/api/show_results/data')
+
+    calls = {
+        'get_requirements': get_requirements,
+        'submit_batch_feedback': submit_batch_feedback,
+        'ask_chatbot': ask_chatbot,
+        'get_admin_data': get_admin_data,
+        'show_results_data': show_results_data,
+    }
+    participants_ids = list(server.store.load(server.BATCH_ASSIGNMENTS_FILE))
+
+    report = {'participants': participants, 'startup_ms': startup * 1000, 'handlers': {}}
+    for name in args.handlers:
+        call = calls[name]
+        t0 = time.perf_counter()
+        response = call()
+        first = time.perf_counter() - t0
+        if response.status_code >= 400:
+            report['handlers'][name] = {'error': f'{response.status_code} {response.get_data(as_text=True)[:200]}'}
+            continue
+
+        latencies = []
+        deadline = time.perf_counter() + args.seconds
+        while len(latencies) < args.calls and (len(latencies) < args.min_calls or time.perf_counter() < deadline):
+            t0 = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        latencies.sort()
+
+        blocks, peaks = [], []
+        tracemalloc.start()
+        for _ in range(min(args.alloc_calls, len(latencies))):
+            before_blocks = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            blocks.append(sys.getallocatedblocks() - before_blocks)
+        tracemalloc.stop()
+
+        report['handlers'][name] = {
+            'calls': len(latencies),
+            'first_ms': first * 1000,
+            'mean_ms': sum(latencies) / len(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p90_ms': percentile(latencies, 90),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1],
+            'retained_blocks_per_call': sum(blocks) / len(blocks) if blocks else None,
+            'peak_alloc_kib_per_call': sum(peaks) / len(peaks) / 1024 if peaks else None,
+        }
+    server.agent_jobs._executor.shutdown(wait=True)
+    results.put(report)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000', help='Participant counts')
+    parser.add_argument('--handlers', default=','.join(HANDLERS))
+    parser.add_argument('--backend', choices=['journal', 'sqlite'], default='journal')
+    parser.add_argument('--calls', type=int, default=200, help='Most timed calls per handler')
+    parser.add_argument('--min-calls', type=int, default=5, help='Fewest timed calls per handler')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Time budget per handler')
+    parser.add_argument('--alloc-calls', type=int, default=10, help='Calls measured under tracemalloc')
+    parser.add_argument('--nfrs', type=int, default=10, help='NFR responses per participant')
+    parser.add_argument('--turns', type=int, default=4, help='Chat turns per participant')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Where to save the JSON results')
+    parser.add_argument('--compare', help='Earlier results file to print p50/p99 changes against')
+    args = parser.parse_args()
+    args.handlers = [name for name in args.handlers.split(',') if name]
+    unknown = set(args.handlers) - set(HANDLERS)
+    if unknown:
+        parser.error(f"unknown handlers: {', '.join(sorted(unknown))}")
+
+    tmp = tempfile.mkdtemp(prefix='bench-handlers-')
+    home = os.path.join(tmp, 'home')
+    os.makedirs(os.path.join(home, '.local', 'bin'))
+    os.makedirs(os.path.join(tmp, 'project'))
+    with open(os.path.join(home, '.local', 'bin', 'copilot'), 'w') as f:
+        f.write(STUB_CLI)
+    os.chmod(os.path.join(home, '.local', 'bin', 'copilot'), 0o755)
+    os.environ.update({
+        'HOME': home,
+        'RESPONSE_BACKEND': args.backend,
+        'SESSION_POOL_SIZE': '0',
+        'COPILOT_PROJECT_PATH': os.path.join(tmp, 'project'),
+        'RESULTS_DATA_DIR': os.path.join(tmp, 'no-datasets'),
+    })
+
+    # NFR.json is a list of batches
+    with open(os.path.join(WEBSITE_DIR, 'NFR.json')) as f:
+        batches = list(range(1, len(json.load(f)) + 1))
+    ctx = multiprocessing.get_context('spawn')
+    reports = []
+    try:
+        for size in [int(n) for n in args.sizes.split(',')]:
+            site = os.path.join(tmp, f'site-{size}')
+            os.makedirs(os.path.join(site, 'responses'))
+            for filename in ('NFR.json', 'forced.json', 'batch_allocation.json'):
+                shutil.copy(os.path.join(WEBSITE_DIR, filename), site)
+            synthesize(os.path.join(site, 'responses'), size, args.nfrs, args.turns, batches,
+                       random.Random(args.seed))
+
+            results = ctx.Queue()
+            process = ctx.Process(target=run_size, args=(site, size, args, results))
+            process.start()
+            report = None
+            while report is None:
+                try:
+                    report = results.get(timeout=1)
+                except queue.Empty:
+                    if not process.is_alive():
+                        sys.exit(f"benchmark process for {size} participants exited with {process.exitcode}")
+            process.join()
+            reports.append(report)
+            shutil.rmtree(site, ignore_errors=True)
+
+            print(f"\n{size} participants (server start {report['startup_ms']:.0f} ms)")
+            print(f"{'handler':<24}{'calls':>6}{'first':>10}{'p50':>10}{'p90':>10}{'p99':>10}"
+                  f"{'blocks':>10}{'peak KiB':>10}")
+            for name, row in report['handlers'].items():
+                if 'error' in row:
+                    print(f"{name:<24}  error: {row['error']}")
+                    continue
+                print(f"{name:<24}{row['calls']:>6}{row['first_ms']:>8.1f}ms{row['p50_ms']:>8.2f}ms"
+                      f"{row['p90_ms']:>8.2f}ms{row['p99_ms']:>8.2f}ms{row['retained_blocks_per_call']:>10.0f}"
+                      f"{row['peak_alloc_kib_per_call']:>10.0f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    now = datetime.now(timezone.utc)
+    output = args.output or os.path.join(REPO_DIR, 'test', 'bench_results',
+                                         f"handlers-{now.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'benchmark': 'handlers',
+            'timestamp': now.isoformat(),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+            'results': reports,
+        }, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        compare(args.compare, reports)
+
+
+def compare(path, reports):
+    """Print how p50/p99 moved against an earlier results file, for the sizes and handlers both have."""
+    with open(path) as f:
+        earlier = {report['participants']: report['handlers'] for report in json.load(f)['results']}
+    print(f"\nAgainst {path}")
+    print(f"{'participants':>12}  {'handler':<24}{'p50':>20}{'p99':>20}")
+    for report in reports:
+        before = earlier.get(report['participants'], {})
+        for name, row in report['handlers'].items():
+            old = before.get(name)
+            if not old or 'error' in old or 'error' in row:
+                continue
+            cells = [f"{old[key]:.2f} -> {row[key]:.2f}ms" for key in ('p50_ms', 'p99_ms')]
+            print(f"{report['participants']:>12}  {name:<24}{cells[0]:>20}{cells[1]:>20}")
+
+
+if __name__ == '__main__':
+    main()
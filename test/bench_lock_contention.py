@@ -0,0 +1,149 @@
+"""
+Contention benchmark for participant writes (website/lock_manager.py, website/response_store.py).
+
+Starts the server on a throwaway site directory (empty responses/, a stub
+`copilot` CLI in a throwaway HOME) and has each worker thread play one
+participant, submitting through Flask's test client as fast as it can:
+
+    submit_nfr_feedback   POST /api/submit_nfr_feedback (one NFR)
+    submit_survey         POST /api/submit_survey
+    submit_gate_answer    POST /api/submit_gate_answer
+
+in turn, --ops times. Nothing is simulated: each request runs the real
+handler, its locks and its store write (journal append + fsync, or a SQLite
+transaction). Every thread count is run twice: once with each request
+behind one global lock, like the handlers used to be, and once as the
+server runs them. The ratio shows how much unrelated participants still
+wait on each other.
+
+    python test/bench_lock_contention.py [--threads 1,2,4,8,16] [--ops 200] [--backend journal|sqlite]
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+WEBSITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website')
+
+STUB_CLI = r'''#!/usr/bin/env python3
+import os, sys, uuid
+state_dir = os.path.expanduser('~/.copilot/session-state')
+os.makedirs(state_dir, exist_ok=True)
+if '--resume' not in sys.argv:
+    os.makedirs(os.path.join(state_dir, str(uuid.uuid4())))
+print('stub reply')
+'''
+
+
+def requests_for(participant, n):
+    """The n-th request of a participant: (path, json body)."""
+    kind = n % 3
+    if kind == 0:
+        return '/api/submit_nfr_feedback', {'uuid': participant, 'batch': 1, 'nfr_id': n % 10 + 1,
+                                            'q1_agreement': 'Agree', 'q2_agreement': 'Agree',
+                                            'q3_agreement': 'Disagree', 'q3_own_assessment': 'bench'}
+    if kind == 1:
+        return '/api/submit_survey', {'uuid': participant, 'overall': n}
+    return '/api/submit_gate_answer', {'uuid': participant, 'batch': 1, 'nfr_id': n % 10 + 1, 'answer': 'bench'}
+
+
+def run_all(site, args, results):
+    """Runs in its own process so the server starts from scratch."""
+    os.chdir(site)
+    sys.stdout = open(os.devnull, 'w')  # the server logs every chatbot it restores
+    sys.path.insert(0, WEBSITE_DIR)
+    import server
+
+    def run(mode, threads):
+        global_lock = threading.Lock()
+        participants = [str(uuid.uuid4()) for _ in range(threads)]
+        errors = []
+
+        def participant(session_id):
+            client = server.app.test_client()
+            for n in range(args.ops):
+                path, body = requests_for(session_id, n)
+                with global_lock if mode == 'global' else nullcontext():
+                    response = client.post(path, json=body)
+                if response.status_code != 200:
+                    errors.append(f"{path}: {response.status_code}")
+
+        # Restore every participant's chatbot up front, so only the writes are timed
+        for session_id in participants:
+            server.get_chatbot(session_id)
+        workers = [threading.Thread(target=participant, args=(p,)) for p in participants]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise RuntimeError(f"{len(errors)} failed requests, e.g. {errors[0]}")
+        return threads * args.ops / elapsed
+
+    run('concurrent', 2)  # warm up the app, the store and the first-request paths
+    for threads in args.threads:
+        results.put((threads, run('global', threads), run('concurrent', threads)))
+    results.put(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,2,4,8,16')
+    parser.add_argument('--ops', type=int, default=200, help='Requests per thread')
+    parser.add_argument('--backend', choices=['journal', 'sqlite'], default='journal')
+    args = parser.parse_args()
+    args.threads = [int(n) for n in args.threads.split(',')]
+
+    tmp = tempfile.mkdtemp(prefix='bench-locks-')
+    home = os.path.join(tmp, 'home')
+    os.makedirs(os.path.join(home, '.local', 'bin'))
+    os.makedirs(os.path.join(tmp, 'project'))
+    with open(os.path.join(home, '.local', 'bin', 'copilot'), 'w') as f:
+        f.write(STUB_CLI)
+    os.chmod(os.path.join(home, '.local', 'bin', 'copilot'), 0o755)
+    os.environ.update({
+        'HOME': home,
+        'RESPONSE_BACKEND': args.backend,
+        'SESSION_POOL_SIZE': '0',
+        'COPILOT_PROJECT_PATH': os.path.join(tmp, 'project'),
+        'RESULTS_DATA_DIR': os.path.join(tmp, 'no-datasets'),
+    })
+    site = os.path.join(tmp, 'site')
+    os.makedirs(os.path.join(site, 'responses'))
+    for filename in ('NFR.json', 'forced.json', 'batch_allocation.json'):
+        shutil.copy(os.path.join(WEBSITE_DIR, filename), site)
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=run_all, args=(site, args, results))
+    process.start()
+    print(f"{args.backend} store, {args.ops} requests per thread")
+    print(f"{'threads':>8} {'global lock':>14} {'server':>14} {'speedup':>8}")
+    try:
+        while True:
+            try:
+                row = results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    sys.exit(f"benchmark process exited with {process.exitcode}")
+                continue
+            if row is None:
+                break
+            threads, serial, concurrent = row
+            print(f"{threads:>8} {serial:>10.0f} op/s {concurrent:>10.0f} op/s {concurrent / serial:>7.1f}x")
+        process.join()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Stress test for MULTI_WORKER=1 (several server processes on one data directory).
+
+Starts --workers processes, each importing website/server.py in the same
+throwaway site directory (its own responses/, a stub `copilot` CLI in a
+throwaway HOME) and driving it through Flask's test client from several
+threads at once. Every worker, concurrently:
+
+  - saves surveys for its own participants,
+  - submits single-NFR feedback for one participant shared by all workers,
+  - assigns batches to new participants (total capacity == assignments made),
+  - appends prize emails,
+  - sends chat turns to one shared chat session,
+
+then polls the chat jobs another worker submitted. Afterwards the store must
+hold every write exactly once, no batch may be over capacity, the stub must
+never have seen two turns resume the shared session at once, and every
+worker's peer index must see all of the shared participant's disagreements.
+
+    python test/stress_multi_worker.py [--workers 4] [--threads 4] [--ops 20] [--turns 3]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+WEBSITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website')
+
+STUB_CLI = r'''#!/usr/bin/env python3
+import os, sys, time, uuid
+args = sys.argv[1:]
+state_dir = os.path.expanduser('~/.copilot/session-state')
+os.makedirs(state_dir, exist_ok=True)
+if '--resume' not in args:
+    os.makedirs(os.path.join(state_dir, str(uuid.uuid4())))
+    print('ok')
+    sys.exit(0)
+session_id = args[args.index('--resume') + 1]
+# Two turns resuming one session at the same time is what the turn lease must prevent
+marker = os.path.expanduser('~/running/%s' % session_id)
+try:
+    fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+except FileExistsError:
+    with open(os.path.expanduser('~/overlaps/%d' % os.getpid()), 'w') as f:
+        f.write(session_id)
+    fd = None
+for word in ('stub', 'reply', 'to', args[args.index('-p') + 1][:40]):
+    print(word, flush=True)
+    time.sleep(0.02)
+if fd is not None:
+    os.close(fd)
+    os.remove(marker)
+'''
+
+
+def worker(index, args, site, shared_session, shared_participant, barrier, results):
+    os.chdir(site)
+    sys.path.insert(0, WEBSITE_DIR)
+    import server
+
+    client = server.app.test_client()
+    errors = []
+
+    def check(response, what):
+        if response.status_code >= 400 or (response.is_json and response.json.get('status') == 'error'):
+            errors.append(f"worker {index}: {what}: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def op(n):
+        key = f'w{index}-{n}'
+        check(client.post('/api/submit_survey', json={'uuid': f'survey-{key}', 'q1': n}), 'survey')
+        check(client.post('/api/submit_nfr_feedback', json={
+            'uuid': shared_participant, 'batch': 1, 'nfr_id': key,
+            'q1_agreement': 'Disagree', 'q1_own_assessment': ''}), 'feedback')
+        check(client.get(f'/api/get_requirements?batch=1&uuid=assign-{key}'), 'assignment')
+        check(client.post('/api/submit_prize', json={'type': 'email', 'identifier': f'{key}@example.com'}), 'prize')
+
+    def turn(n):
+        response = check(client.post('/api/ask_chatbot', json={'uuid': shared_session, 'message': f'w{index}-{n}'}),
+                         'ask_chatbot')
+        return response.json.get('job_id')
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        turns = pool.map(turn, range(args.turns))
+        list(pool.map(op, range(args.ops)))
+        job_ids = list(turns)
+    with open(os.path.join(site, f'jobs-{index}.json'), 'w') as f:
+        json.dump(job_ids, f)
+    barrier.wait()
+
+    # Follow the turns another worker queued
+    with open(os.path.join(site, f'jobs-{(index + 1) % args.workers}.json')) as f:
+        for job_id in json.load(f):
+            deadline = time.time() + 120
+            while True:
+                job = check(client.get(f'/api/chatbot_job/{job_id}?wait=5'), 'chatbot_job').json
+                if job.get('status') in ('done', 'error') or time.time() > deadline:
+                    break
+            if job.get('status') != 'done':
+                errors.append(f"worker {index}: job {job_id} ended as {job.get('status')}")
+    barrier.wait()
+
+    # Feedback from every worker must be visible to this worker's peer index
+    seen = server.peer_index.required(shared_participant, 1)['q1']
+    results.put((index, errors, sorted(seen)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='Request threads per worker')
+    parser.add_argument('--ops', type=int, default=20, help='Writes of each kind per worker')
+    parser.add_argument('--turns', type=int, default=3, help='Chat turns per worker')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='stress-workers-')
+    home = os.path.join(tmp, 'home')
+    site = os.path.join(tmp, 'site')
+    for directory in ('.local/bin', 'running', 'overlaps'):
+        os.makedirs(os.path.join(home, directory))
+    os.makedirs(os.path.join(site, 'responses'))
+    os.makedirs(os.path.join(tmp, 'project'))
+    with open(os.path.join(home, '.local', 'bin', 'copilot'), 'w') as f:
+        f.write(STUB_CLI)
+    os.chmod(os.path.join(home, '.local', 'bin', 'copilot'), 0o755)
+    for filename in ('NFR.json', 'forced.json'):
+        shutil.copy(os.path.join(WEBSITE_DIR, filename), site)
+
+    # Exactly as many seats as assignments, and an impossible fallback to spot overflow
+    assignments = args.workers * args.ops
+    capacity = 2
+    with open(os.path.join(site, 'batch_allocation.json'), 'w') as f:
+        json.dump({'batches': list(range(1, (assignments + capacity - 1) // capacity + 1)),
+                   'capacity': capacity, 'fallback_batch': -1}, f)
+
+    os.environ.update({
+        'HOME': home,
+        'MULTI_WORKER': '1',
+        'SESSION_POOL_SIZE': '0',
+        'COPILOT_PROJECT_PATH': os.path.join(tmp, 'project'),
+    })
+    shared_session = str(uuid.uuid4())
+    shared_participant = 'shared-participant'
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(i, args, site, shared_session, shared_participant, barrier, results))
+                 for i in range(args.workers)]
+    start = time.time()
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=600) for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.time() - start
+
+    errors = []
+    for index, worker_errors, seen in sorted(reports):
+        errors.extend(worker_errors)
+        if len(seen) != assignments:
+            errors.append(f"worker {index}: peer index sees {len(seen)} of {assignments} disagreements")
+    errors.extend(f"worker {process.pid} exited with {process.exitcode}" for process in processes if process.exitcode)
+
+    sys.path.insert(0, WEBSITE_DIR)
+    from sqlite_store import SqliteResponseStore
+    responses = os.path.join(site, 'responses')
+    store = SqliteResponseStore([os.path.join(responses, name) for name in
+                                 ('satisfaction_survey.json', 'nfr_responses.json', 'prize.json',
+                                  'user_batch_assignments.json', 'conversation.json')],
+                                os.path.join(responses, 'responses.db'))
+
+    def expect(what, got, want):
+        if got != want:
+            errors.append(f"{what}: {got} != {want}")
+
+    expect('surveys', len(store.load(os.path.join(responses, 'satisfaction_survey.json'))), assignments)
+    expect('feedback entries', len(store.get(os.path.join(responses, 'nfr_responses.json'), shared_participant, [])),
+           assignments)
+    emails = store.load(os.path.join(responses, 'prize.json')).get('emails', [])
+    expect('prize emails', (len(emails), len(set(emails))), (assignments, assignments))
+    occupancy = {}
+    for batches in store.load(os.path.join(responses, 'user_batch_assignments.json')).values():
+        for batch in batches:
+            occupancy[batch] = occupancy.get(batch, 0) + 1
+    expect('assigned participants', sum(occupancy.values()), assignments)
+    expect('over-capacity batches', sorted(b for b, n in occupancy.items() if n > capacity or b == -1), [])
+    expect('chat turns', len(store.get(os.path.join(responses, 'conversation.json'), shared_session, [])),
+           args.workers * args.turns)
+    expect('overlapping turns on the shared session', len(os.listdir(os.path.join(home, 'overlaps'))), 0)
+
+    for error in errors:
+        print(error)
+    print(f"{args.workers} workers x {args.threads} threads, {args.ops} writes of each kind and {args.turns} "
+          f"chat turns per worker: {len(errors)} errors in {elapsed:.2f}s")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Stress test for session ID resolution in website/chatbot.py.
+
+Creates many copilot chats at the same time against a stub `copilot` CLI (in a
+throwaway HOME) and checks that every Chatbot got the session its own CLI run
+created. The session-state directory is pre-filled with thousands of old
+sessions to show resolution cost doesn't grow with them.
+
+    python test/stress_session_resolver.py [--chats 64] [--existing 5000] [--no-log-dir]
+
+--no-log-dir makes the stub ignore --log-dir to exercise the diff fallback.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+STUB_CLI = r'''#!/usr/bin/env python3
+import os, random, sys, time, uuid
+args = sys.argv[1:]
+state_dir = os.path.expanduser('~/.copilot/session-state')
+os.makedirs(state_dir, exist_ok=True)
+time.sleep(random.uniform(0, 0.2))
+session_id = str(uuid.uuid4())
+os.makedirs(os.path.join(state_dir, session_id))
+# Record which session this process created, so the test can check the mapping
+with open(os.path.expanduser('~/created/%s' % session_id), 'w') as f:
+    f.write(args[args.index('-p') + 1])
+if '--log-dir' in args and not os.environ.get('STUB_IGNORE_LOG_DIR'):
+    log_dir = args[args.index('--log-dir') + 1]
+    with open(os.path.join(log_dir, 'process-%d.log' % os.getpid()), 'w') as f:
+        f.write('request %s\nsession %s started\n' % (uuid.uuid4(), session_id))
+time.sleep(random.uniform(0, 0.2))
+print('ok')
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=64)
+    parser.add_argument('--existing', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--no-log-dir', action='store_true')
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix='stress-home-')
+    os.environ['HOME'] = home
+    if args.no_log_dir:
+        os.environ['STUB_IGNORE_LOG_DIR'] = '1'
+    bin_dir = os.path.join(home, '.local', 'bin')
+    os.makedirs(bin_dir)
+    os.makedirs(os.path.join(home, 'created'))
+    os.makedirs(os.path.join(home, 'project'))
+    state_dir = os.path.join(home, '.copilot', 'session-state')
+    os.makedirs(state_dir)
+    stub = os.path.join(bin_dir, 'copilot')
+    with open(stub, 'w') as f:
+        f.write(STUB_CLI)
+    os.chmod(stub, 0o755)
+    for _ in range(args.existing):
+        os.makedirs(os.path.join(state_dir, str(uuid.uuid4())))
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website'))
+    from chatbot import Chatbot
+
+    # Each chat gets a distinct priming prompt so we can match it back to the stub's record
+    def create(i):
+        chatbot = Chatbot.__new__(Chatbot)
+        chatbot.project_path = os.path.join(home, 'project')
+        chatbot.chat_history = []
+        return i, chatbot.create_chat(initial_prompt=f'prime-{i}')
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(create, range(args.chats)))
+    elapsed = time.time() - start
+
+    created_dir = os.path.join(home, 'created')
+    errors = 0
+    seen = set()
+    for i, session_id in results:
+        marker = os.path.join(created_dir, session_id)
+        if session_id in seen:
+            print(f"chat {i}: session {session_id} handed out twice")
+            errors += 1
+        seen.add(session_id)
+        if not os.path.exists(marker):
+            print(f"chat {i}: {session_id} was not created by this run")
+            errors += 1
+            continue
+        with open(marker) as f:
+            prompt = f.read()
+        if prompt != f'prime-{i}':
+            print(f"chat {i}: got the session created for {prompt!r}")
+            errors += 1
+
+    mode = 'diff fallback' if args.no_log_dir else 'private --log-dir'
+    print(f"{args.chats} concurrent chats ({mode}), {args.existing} existing sessions: "
+          f"{errors} errors in {elapsed:.2f}s")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Checks that website/chatbot_registry.py never evicts a chatbot with a turn queued or running.
+
+The registry is wired the way server.py wires it: a chatbot is busy while its
+turn lock is held or while website/agent_jobs.py has a job for its session.
+
+    python test/test_chatbot_registry.py     (or: python -m pytest test/test_chatbot_registry.py)
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website'))
+from agent_jobs import AgentJobQueue
+from chatbot_registry import ChatbotRegistry
+
+
+class FakeChatbot:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.turn_lock = threading.Lock()
+
+    def get_uuid(self):
+        return self.uuid
+
+
+def _registry(jobs, capacity):
+    return ChatbotRegistry(capacity=capacity, idle_ttl=3600,
+                           is_busy=lambda chatbot: chatbot.turn_lock.locked()
+                           or jobs.pending(chatbot.get_uuid()) > 0)
+
+
+def test_session_with_queued_job_is_not_evicted():
+    jobs = AgentJobQueue(max_workers=1)
+    chatbots = _registry(jobs, capacity=1)
+    release = threading.Event()
+    a = chatbots.add('a', FakeChatbot('a'))
+
+    # The only worker is taken by another session, so a's job stays queued
+    blocker = jobs.submit('other', lambda on_chunk: release.wait(5) and {})
+    queued = jobs.submit('a', lambda on_chunk: {'response': 'ok'})
+    assert jobs.get(queued)['status'] == 'queued'
+    assert jobs.pending('a') == 1
+
+    chatbots.add('b', FakeChatbot('b'))
+    assert chatbots.get('a') is a, 'evicted a chatbot whose turn was still queued'
+
+    release.set()
+    assert jobs.wait(blocker, 5)['status'] == 'done'
+    assert jobs.wait(queued, 5)['status'] == 'done'
+    assert jobs.pending('a') == 0
+
+    # Nothing pending any more: over capacity, the least recently used one goes
+    chatbots.add('c', FakeChatbot('c'))
+    assert 'a' not in chatbots and len(chatbots) == 1
+
+
+def test_pending_count_drops_when_a_job_fails():
+    jobs = AgentJobQueue(max_workers=1)
+
+    def fail(on_chunk):
+        raise RuntimeError('agent failed')
+
+    job_id = jobs.submit('a', fail)
+    assert jobs.wait(job_id, 5)['status'] == 'error'
+    assert jobs.pending('a') == 0
+
+
+if __name__ == '__main__':
+    for test in [v for k, v in list(globals().items()) if k.startswith('test_')]:
+        test()
+        print(f"ok  {test.__name__}")
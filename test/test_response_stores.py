@@ -0,0 +1,63 @@
+"""
+Checks for the NFR feedback writes of website/response_store.py and website/sqlite_store.py.
+
+Runs every check against both stores in a temp directory.
+
+    python test/test_response_stores.py     (or: python -m pytest test/test_response_stores.py)
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website'))
+from response_store import FEEDBACK_FILENAME, ResponseStore
+from sqlite_store import SqliteResponseStore
+
+
+def _stores():
+    tmp = tempfile.mkdtemp(prefix='test-stores-')
+    filepath = os.path.join(tmp, FEEDBACK_FILENAME)
+    yield 'journal', ResponseStore([filepath], os.path.join(tmp, 'journal.log')), filepath
+    yield 'sqlite', SqliteResponseStore([filepath], os.path.join(tmp, 'responses.db')), filepath
+
+
+def _feedback(store, filepath, session_id):
+    rows = [(r.get('batch'), r.get('nfr_id'), r.get('q1_agreement')) for r in store.get(filepath, session_id, [])]
+    return sorted(rows, key=lambda row: (row[0], -1 if row[1] is None else row[1]))
+
+
+def test_single_submission_without_nfr_id_keeps_the_batch():
+    for name, store, filepath in _stores():
+        store.replace_batch_feedback('p1', 3, [{'batch': 3, 'nfr_id': 21, 'q1_agreement': 'Agree'},
+                                               {'batch': 3, 'nfr_id': 22, 'q1_agreement': 'Agree'}])
+        # A malformed single-NFR POST: only responses without an nfr_id may be replaced
+        store.replace_feedback('p1', 3, [{'batch': 3, 'q1_agreement': 'Disagree'}], nfr_id=None)
+        store.replace_feedback('p1', 3, [{'batch': 3, 'q1_agreement': 'Agree'}], nfr_id=None)
+        assert _feedback(store, filepath, 'p1') == [(3, None, 'Agree'), (3, 21, 'Agree'), (3, 22, 'Agree')], name
+        store.close()
+
+
+def test_single_submission_replaces_only_its_nfr():
+    for name, store, filepath in _stores():
+        store.replace_batch_feedback('p1', 3, [{'batch': 3, 'nfr_id': 21, 'q1_agreement': 'Agree'},
+                                               {'batch': 3, 'nfr_id': 22, 'q1_agreement': 'Agree'}])
+        store.replace_batch_feedback('p1', 4, [{'batch': 4, 'nfr_id': 21, 'q1_agreement': 'Agree'}])
+        store.replace_feedback('p1', 3, [{'batch': 3, 'nfr_id': 21, 'q1_agreement': 'Disagree'}], nfr_id=21)
+        assert _feedback(store, filepath, 'p1') == [(3, 21, 'Disagree'), (3, 22, 'Agree'), (4, 21, 'Agree')], name
+        store.close()
+
+
+def test_batch_submission_replaces_the_whole_batch():
+    for name, store, filepath in _stores():
+        store.replace_batch_feedback('p1', 3, [{'batch': 3, 'nfr_id': 21, 'q1_agreement': 'Agree'},
+                                               {'batch': 3, 'nfr_id': 22, 'q1_agreement': 'Agree'}])
+        store.replace_batch_feedback('p1', 4, [{'batch': 4, 'nfr_id': 31, 'q1_agreement': 'Agree'}])
+        store.replace_batch_feedback('p1', 3, [{'batch': 3, 'nfr_id': 23, 'q1_agreement': 'Disagree'}])
+        assert _feedback(store, filepath, 'p1') == [(3, 23, 'Disagree'), (4, 31, 'Agree')], name
+        store.close()
+
+
+if __name__ == '__main__':
+    for test in [v for k, v in list(globals().items()) if k.startswith('test_')]:
+        test()
+        print(f"ok  {test.__name__}")
@@ -0,0 +1,96 @@
+"""
+Checks that the in-memory indexes over the response store follow other workers' writes incrementally.
+
+Two SqliteResponseStore instances on one database stand in for two gunicorn
+workers (MULTI_WORKER); each index must pick up the other worker's writes from
+`changed_since` and only fall back to a full rebuild when the file was replaced.
+
+    python test/test_store_indexes.py     (or: python -m pytest test/test_store_indexes.py)
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website'))
+from batch_allocator import BatchAllocator
+from response_store import ResponseStore
+from results_service import FirstSeenIndex
+from sqlite_store import SqliteResponseStore
+
+
+def _workers(filename):
+    tmp = tempfile.mkdtemp(prefix='test-indexes-')
+    filepath = os.path.join(tmp, filename)
+    db = os.path.join(tmp, 'responses.db')
+    return SqliteResponseStore([filepath], db), SqliteResponseStore([filepath], db), filepath
+
+
+def _counting_rebuilds(allocator):
+    allocator.rebuilds = 0
+    rebuild = allocator._rebuild
+
+    def counted(config):
+        allocator.rebuilds += 1
+        rebuild(config)
+    allocator._rebuild = counted
+    return allocator
+
+
+def test_changed_since_lists_keys_in_write_order():
+    tmp = tempfile.mkdtemp(prefix='test-indexes-')
+    filepath = os.path.join(tmp, 'a.json')
+    for store in (ResponseStore([filepath], os.path.join(tmp, 'journal.log')),
+                  SqliteResponseStore([filepath], os.path.join(tmp, 'responses.db'))):
+        start = store.version(filepath)
+        for key in ('b', 'a', 'c', 'b'):
+            store.put(filepath, key, 1)
+        assert store.changed_since(filepath, start) == ['a', 'c', 'b'], type(store).__name__
+        store.close()
+
+
+def test_allocator_follows_other_workers_assignments():
+    first, second, filepath = _workers('user_batch_assignments.json')
+    config = {'batches': [1, 2], 'capacity': 2}
+    a = _counting_rebuilds(BatchAllocator(first, filepath, lambda: config, lambda: 2))
+    b = _counting_rebuilds(BatchAllocator(second, filepath, lambda: config, lambda: 2))
+
+    assert a.assign('p1') == [1]
+    assert b.assign('p2') == [1]   # sees p1 from the other worker
+    assert a.assign('p3') == [2]   # sees that batch 1 filled up on the other worker
+    assert b.assign('p4') == [2]
+    for allocator in (a, b):
+        assert allocator.participants(1) == ['p1', 'p2'] and allocator.participants(2) == ['p3', 'p4']
+        assert allocator.participant_index('p4', 2) == 2
+        assert allocator.rebuilds == 1, 'rebuilt instead of applying the changed assignments'
+
+    first.replace(filepath, {})    # clear_all_data on one worker
+    assert b.batches_of('p1') is None and b.rebuilds == 2
+    first.close()
+    second.close()
+
+
+def test_first_seen_order_follows_other_workers_turns():
+    first, second, filepath = _workers('conversation.json')
+    index = FirstSeenIndex()
+    loads = []
+    load = second.load
+    second.load = lambda path: loads.append(path) or load(path)
+
+    first.append(filepath, 'late', {'user_time': '2024-01-02T00:00:00Z'})
+    first.append(filepath, 'early', {'user_time': '2024-01-03T00:00:00Z'})
+    assert index.sync_store(second, filepath) == ['late', 'early']
+    first.append(filepath, 'early', {'user_time': '2024-01-01T00:00:00Z'})
+    first.append(filepath, 'new', {'bot_time': '2024-01-04T00:00:00Z'})
+    assert index.sync_store(second, filepath) == ['early', 'late', 'new']
+    assert len(loads) == 1, 'reloaded every conversation instead of the changed ones'
+
+    first.replace(filepath, {'only': [{'user_time': '2024-02-01T00:00:00Z'}]})
+    assert index.sync_store(second, filepath) == ['only']
+    first.close()
+    second.close()
+
+
+if __name__ == '__main__':
+    for test in [v for k, v in list(globals().items()) if k.startswith('test_')]:
+        test()
+        print(f"ok  {test.__name__}")
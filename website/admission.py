@@ -0,0 +1,253 @@
+import fcntl
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+# Assumed length of one agent run until some have been timed
+DEFAULT_SERVICE_SECONDS = 30.0
+# Weight of the latest run in the average run length
+SERVICE_SMOOTHING = 0.2
+# How often a granted turn retries the inter-process slots while all are taken
+SLOT_POLL_SECONDS = 0.1
+
+
+class Overloaded(Exception):
+    """The agent queue is full; try again in `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A place in the queue, from `enqueue` until `release`."""
+
+    def __init__(self, participant: str):
+        self.participant = participant
+        self.enqueued_at = time.monotonic()
+        # Set by `wait`: the run is ready and in line for a slot
+        self.ready_at: Optional[float] = None
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self.slot_fd: Optional[int] = None
+
+
+class AdmissionController:
+    """
+    Caps how many agent runs happen at once and hands the slots out fairly.
+
+    Every agent CLI run holds one of `limit` slots. Runs waiting for a slot
+    are queued per participant, and slots go round-robin over the
+    participants with something queued, oldest request first within each.
+    A participant with five messages queued therefore gets one slot per
+    round, like everybody else, instead of five in a row.
+
+    `enqueue` admits a run to the queue, or refuses it with Overloaded
+    (carrying a Retry-After estimate from the average run length) when
+    `max_queue` runs are waiting in total, or `max_per_participant` for that
+    participant. An admitted run only gets in line for a slot once it calls
+    `wait`, so work admitted early (an agent job, at submit) doesn't take a
+    slot while it is still blocked on something else, such as its session's
+    previous turn; it counts against the queue limits all the same. Callers
+    that must not be refused (background work) use `slot(..., reject=False)`.
+
+    With a `lock_dir` the slots are also flock(2)ed files there, `limit` of
+    them shared by every worker process, so the cap is global. Fair ordering
+    and the queue limits then apply per worker process.
+
+    Work admitted ahead of time keeps its ticket and runs under
+    `reserved(ticket)`: the first `slot` taken in that block waits on the
+    ticket instead of queueing again, and later ones are not refused. Slots
+    are reentrant per thread, so nested runs don't take a second one.
+    """
+
+    def __init__(self, limit: int = 4, max_queue: int = 32, max_per_participant: int = 3,
+                 lock_dir: Optional[str] = None):
+        """
+        Args:
+            limit: How many agent runs may happen at once
+            max_queue: How many runs may wait for a slot before new ones are refused
+            max_per_participant: How many runs one participant may have waiting
+            lock_dir: Directory for slot files shared by worker processes (None: this process only)
+        """
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_per_participant = max_per_participant
+        self.lock_dir = lock_dir
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+        # participant -> their tickets ready for a slot; the order is the round-robin rotation
+        self._waiting: 'OrderedDict[str, Deque[Ticket]]' = OrderedDict()
+        # Tickets not granted yet (admitted or ready), in total and per participant
+        self._queued = 0
+        self._queued_of: Dict[str, int] = {}
+        self._running = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._service_seconds = DEFAULT_SERVICE_SECONDS
+
+        self.admitted = 0
+        self.rejected = 0
+
+    def enqueue(self, participant: str, reject: bool = True) -> Ticket:
+        """Admit a run for `participant`; raises Overloaded if the queue is full (unless not `reject`)."""
+        with self._cond:
+            queued = self._queued_of.get(participant, 0)
+            if reject:
+                if self._queued >= self.max_queue:
+                    self._reject('queue_full', f"{self._queued} agent requests are already waiting")
+                if queued >= self.max_per_participant:
+                    self._reject('participant_limit', f"You already have {queued} requests waiting")
+            self._queued += 1
+            self._queued_of[participant] = queued + 1
+            return Ticket(participant)
+
+    def wait(self, ticket: Ticket) -> None:
+        """Get in line and block until the ticket holds a slot; the calling thread then holds it."""
+        with self._cond:
+            if ticket.ready_at is None:
+                ticket.ready_at = time.monotonic()
+                self._waiting.setdefault(ticket.participant, deque()).append(ticket)
+                self._dispatch()
+            while ticket.granted_at is None:
+                self._cond.wait()
+        if self.lock_dir:
+            ticket.slot_fd = self._take_slot_file()
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - ticket.ready_at)
+        self._local.ticket = ticket
+
+    def release(self, ticket: Ticket) -> None:
+        """Give the slot back (or leave the queue, if it was never granted). Safe to call twice."""
+        if getattr(self._local, 'ticket', None) is ticket:
+            self._local.ticket = None
+        if ticket.slot_fd is not None:
+            os.close(ticket.slot_fd)
+            ticket.slot_fd = None
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted_at is None:
+                if ticket.ready_at is not None:
+                    waiting = self._waiting[ticket.participant]
+                    waiting.remove(ticket)
+                    if not waiting:
+                        del self._waiting[ticket.participant]
+                self._unqueue(ticket.participant)
+                return
+            self._running -= 1
+            held = time.monotonic() - ticket.granted_at
+            self._service_seconds += SERVICE_SMOOTHING * (held - self._service_seconds)
+            self._dispatch()
+
+    @contextmanager
+    def reserved(self, ticket: Ticket) -> Iterator[None]:
+        """Let the first `slot` of this thread in the block use `ticket`; releases it afterwards."""
+        self._local.pending = ticket
+        self._local.admitted = True
+        try:
+            yield
+        finally:
+            self._local.pending = None
+            self._local.admitted = False
+            self.release(ticket)
+
+    @contextmanager
+    def slot(self, participant: str, reject: bool = True) -> Iterator[None]:
+        """Hold a slot for the block, queueing for it fairly (a no-op if this thread holds one)."""
+        if getattr(self._local, 'ticket', None) is not None:
+            yield
+            return
+        ticket = getattr(self._local, 'pending', None)
+        if ticket is not None:
+            self._local.pending = None
+        else:
+            # Work admitted under `reserved` isn't turned away halfway through
+            ticket = self.enqueue(participant, reject and not getattr(self._local, 'admitted', False))
+        try:
+            self.wait(ticket)
+            yield
+        finally:
+            self.release(ticket)
+
+    def retry_after(self) -> int:
+        """Seconds until a run queued now would likely start."""
+        with self._cond:
+            return self._retry_after()
+
+    def queue_length(self) -> int:
+        with self._cond:
+            return self._queued
+
+    def running(self) -> int:
+        with self._cond:
+            return self._running
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'running': self._running,
+                'queued': self._queued,
+                'ready': sum(len(waiting) for waiting in self._waiting.values()),
+                'participants_waiting': len(self._waiting),
+                'max_queue': self.max_queue,
+                'max_per_participant': self.max_per_participant,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_run_seconds': round(self._service_seconds, 2),
+                'retry_after': self._retry_after(),
+            }
+
+    def _dispatch(self) -> None:
+        """Grant free slots round-robin over the participants with waiting runs. Caller holds _cond."""
+        granted = False
+        while self._running < self.limit and self._waiting:
+            participant, waiting = next(iter(self._waiting.items()))
+            ticket = waiting.popleft()
+            # Back of the rotation, or out of it once nothing of theirs is waiting
+            del self._waiting[participant]
+            if waiting:
+                self._waiting[participant] = waiting
+            self._unqueue(participant)
+            self._running += 1
+            self.admitted += 1
+            ticket.granted_at = time.monotonic()
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _unqueue(self, participant: str) -> None:
+        """Count one of the participant's tickets as no longer queued. Caller holds _cond."""
+        self._queued -= 1
+        self._queued_of[participant] -= 1
+        if not self._queued_of[participant]:
+            del self._queued_of[participant]
+
+    def _retry_after(self) -> int:
+        # Everyone waiting, plus the caller, spread over the slots
+        return max(1, math.ceil(self._service_seconds * (self._queued + 1) / max(1, self.limit)))
+
+    def _reject(self, reason: str, message: str) -> None:
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(reason=reason)
+        raise Overloaded(f"The assistant is busy: {message}. Please try again shortly.", self._retry_after())
+
+    def _take_slot_file(self) -> int:
+        """flock one of the `limit` slot files shared with the other worker processes."""
+        while True:
+            for i in range(self.limit):
+                fd = os.open(os.path.join(self.lock_dir, f'slot-{i}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    os.close(fd)
+            time.sleep(SLOT_POLL_SECONDS)
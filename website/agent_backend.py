@@ -0,0 +1,341 @@
+import codecs
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid as uuidlib
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+from admission import AdmissionController
+from agent_host import AgentHost, AgentHostError
+from metrics import observe_agent_run
+from session_resolver import SessionResolver
+
+# Seconds between SIGTERM and SIGKILL when a run is stopped
+KILL_GRACE_SECONDS = 2.0
+
+
+class AgentError(Exception):
+    """An agent run failed; the message is ready to show."""
+
+
+class AgentTimeout(AgentError):
+    """An agent run was killed for taking longer than its timeout."""
+
+
+def agent_env() -> Dict[str, str]:
+    """Environment for agent processes: ours, with ~/.local/bin (where the CLIs install) on PATH."""
+    return {**os.environ, 'PATH': f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"}
+
+
+class AgentBackend:
+    """
+    One agent CLI: how to create a session and run a turn in it.
+
+    Subclasses only say which argv does what; running it is shared. The binary
+    is exec'd directly with `cwd` set (no `cd ... &&` under /bin/sh), with an
+    environment and binary path worked out once when the backend is made. A
+    run that outlives its timeout has its whole process group terminated,
+    then killed `KILL_GRACE_SECONDS` later. A run that fails before
+    producing any output is retried up to `retries` times; timeouts and
+    runs that already streamed output never are.
+
+    With an `admission` controller, every run (or persistent-process turn)
+    holds one of its slots: turns queue fairly per session and may be
+    refused with Overloaded, session creations queue in a lane of their own
+    and are never refused.
+
+    With `persistent`, turns go to an AgentHost keeping one process per
+    session (for CLIs that have such a mode, see `acp_argv`), and fall back
+    to a one-shot run for sessions the host can't take.
+    """
+
+    name = ''
+    binary = ''
+
+    def __init__(self, model: Optional[str] = None, env: Optional[Dict[str, str]] = None, retries: int = 0,
+                 persistent: bool = False, idle_seconds: float = 600, max_processes: int = 16,
+                 shared_sessions: bool = False, admission: Optional[AdmissionController] = None):
+        """
+        Args:
+            model: Model to ask the CLI for (None for the CLI's default)
+            env: Environment of the agent processes (defaults to `agent_env()`)
+            retries: Extra attempts for runs that fail without output
+            persistent: Keep a process per session (see AgentHost), if the CLI can
+            idle_seconds: AgentHost's idle timeout
+            max_processes: AgentHost's process limit
+            shared_sessions: Other worker processes run turns for the same sessions
+            admission: Caps and orders concurrent runs (None: no limit)
+        """
+        self.model = model
+        self.env = agent_env() if env is None else dict(env)
+        self.retries = retries
+        self.admission = admission
+        self.executable = shutil.which(self.binary, path=self.env.get('PATH')) or self.binary
+        acp_argv = self.acp_argv()
+        self.host: Optional[AgentHost] = AgentHost(
+            acp_argv, env=self.env, idle_seconds=idle_seconds, max_processes=max_processes,
+            shared_sessions=shared_sessions) if persistent and acp_argv else None
+
+    # What subclasses define
+
+    def create_argv(self, prompt: str, log_dir: Optional[str]) -> List[str]:
+        raise NotImplementedError
+
+    def ask_argv(self, session_id: str, message: str) -> List[str]:
+        raise NotImplementedError
+
+    def acp_argv(self) -> Optional[List[str]]:
+        """Command starting the CLI as a persistent ACP agent, or None if it has no such mode."""
+        return None
+
+    def _create(self, cwd: str, prompt: str, timeout: float) -> str:
+        """Run the create command and return the new session's id."""
+        output = self.run('create', self.create_argv(prompt, None), cwd, timeout)
+        session_id = output.strip()
+        if not session_id:
+            raise AgentError(f"Failed to retrieve session ID from {self.name}")
+        return session_id
+
+    # The shared path
+
+    def create_session(self, cwd: str, initial_prompt: Optional[str] = None, timeout: float = 180) -> str:
+        """Create a session in `cwd`, primed with `initial_prompt`, and return its id."""
+        with self._slot('new-session', reject=False):
+            return self._create_session(cwd, initial_prompt, timeout)
+
+    def _create_session(self, cwd: str, initial_prompt: Optional[str], timeout: float) -> str:
+        if self.host is not None:
+            try:
+                return self.host.create_session(cwd, initial_prompt, timeout)
+            except TimeoutError:
+                raise AgentTimeout(f"Timeout: {self.name} create-chat took longer than {timeout} seconds")
+            except AgentHostError as e:
+                print(f"Agent host could not create a session, using the CLI: {str(e)}")
+        try:
+            # Use a dummy prompt if none provided
+            return self._create(cwd, initial_prompt or '.', timeout)
+        except AgentTimeout:
+            raise AgentTimeout(f"Timeout: {self.name} create-chat took longer than {timeout} seconds")
+        except AgentError as e:
+            raise AgentError(f"Error creating {self.name} chat: {str(e)}")
+
+    def ask(self, session_id: str, cwd: str, message: str, timeout: float = 600,
+            on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run one turn of `session_id` and return the reply; `on_chunk` gets it as it is produced.
+        Raises Overloaded if the admission queue is full.
+        """
+        with self._slot(session_id):
+            return self._ask(session_id, cwd, message, timeout, on_chunk)
+
+    def _ask(self, session_id: str, cwd: str, message: str, timeout: float,
+             on_chunk: Optional[Callable[[str], None]]) -> str:
+        if self.host is not None:
+            try:
+                return self.host.prompt(session_id, cwd, message, on_chunk, timeout)
+            except AgentHostError as e:
+                print(f"Agent host could not take session {session_id}, using the CLI: {str(e)}")
+            except TimeoutError:
+                raise AgentTimeout(f"Timeout: {self.name} took longer than {timeout} seconds to respond")
+            except Exception as e:
+                raise AgentError(f"Error asking {self.name}: {str(e)}")
+        try:
+            return self.run('stream' if on_chunk else 'ask', self.ask_argv(session_id, message), cwd, timeout,
+                            on_chunk)
+        except AgentTimeout:
+            raise AgentTimeout(f"Timeout: {self.name} took longer than {timeout} seconds to respond")
+        except AgentError as e:
+            raise AgentError(f"Error asking {self.name}: {str(e)}")
+
+    def _slot(self, participant: str, reject: bool = True):
+        return self.admission.slot(participant, reject) if self.admission else nullcontext()
+
+    def run(self, command: str, argv: List[str], cwd: str, timeout: float,
+            on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run `argv` in `cwd` to completion and return its stdout, passing it to `on_chunk`
+        as it arrives. `command` labels the run in the metrics.
+
+        Raises AgentTimeout past `timeout`, AgentError if it can't start or exits non-zero.
+        """
+        attempt = 0
+        while True:
+            streamed = []
+            def on_output(text: str) -> None:
+                streamed.append(text)
+                if on_chunk is not None:
+                    on_chunk(text)
+            try:
+                return self._run_once(command, argv, cwd, timeout, on_output)
+            except AgentTimeout:
+                raise
+            except AgentError:
+                if streamed or attempt >= self.retries:
+                    raise
+                attempt += 1
+                print(f"{self.name} {command} failed, retrying ({attempt}/{self.retries})")
+
+    def _run_once(self, command: str, argv: List[str], cwd: str, timeout: float,
+                  on_output: Callable[[str], None]) -> str:
+        start = time.perf_counter()
+        try:
+            # Own process group, so a kill also reaches tools the CLI started
+            process = subprocess.Popen([self.executable] + argv[1:], stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, env=self.env,
+                                       start_new_session=True)
+        except OSError as e:
+            observe_agent_run(command, time.perf_counter() - start, 'spawn_error')
+            raise AgentError(f"Could not start {self.binary}: {e}")
+
+        # Stop the CLI if it runs past the timeout; drain stderr so a chatty CLI can't block on it
+        timed_out = threading.Event()
+        def _stop():
+            timed_out.set()
+            self._terminate(process)
+        watchdog = threading.Timer(timeout, _stop)
+        watchdog.daemon = True
+        watchdog.start()
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_reader.start()
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        output = []
+        try:
+            while True:
+                data = process.stdout.read1(4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    output.append(text)
+                    on_output(text)
+            text = decoder.decode(b'', final=True)
+            if text:
+                output.append(text)
+                on_output(text)
+            returncode = process.wait()
+            stderr_reader.join()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                self._terminate(process)
+        observe_agent_run(command, time.perf_counter() - start, 'timeout' if timed_out.is_set() else returncode)
+
+        if timed_out.is_set():
+            raise AgentTimeout(f"Timeout: {self.name} took longer than {timeout} seconds")
+        if returncode != 0:
+            stderr = (stderr_chunks[0] if stderr_chunks else b'').decode('utf-8', errors='replace')
+            raise AgentError(f"Failed to {'create chat' if command == 'create' else 'ask ' + self.name}: "
+                             f"{stderr or 'Unknown error'}")
+        return ''.join(output)
+
+    @staticmethod
+    def _terminate(process: subprocess.Popen) -> None:
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                return
+            try:
+                process.wait(KILL_GRACE_SECONDS)
+                return
+            except subprocess.TimeoutExpired:
+                continue
+
+
+class CopilotBackend(AgentBackend):
+    """GitHub Copilot CLI (`copilot`)."""
+
+    name = 'copilot'
+    binary = 'copilot'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Maps each create run to the session it created (see session_resolver.py)
+        self.session_resolver = SessionResolver()
+
+    def _model_args(self) -> List[str]:
+        return ['--model', self.model] if self.model else []
+
+    def create_argv(self, prompt: str, log_dir: Optional[str]) -> List[str]:
+        argv = [self.binary, '-p', prompt] + self._model_args() + ['-s', '--allow-all-tools']
+        return argv + ['--log-dir', log_dir] if log_dir else argv
+
+    def ask_argv(self, session_id: str, message: str) -> List[str]:
+        return [self.binary] + self._model_args() + ['--resume', session_id, '-p', message, '-s', '--allow-all-tools']
+
+    def acp_argv(self) -> Optional[List[str]]:
+        return [self.executable, '--acp'] + self._model_args() + ['--allow-all-tools']
+
+    def _create(self, cwd: str, prompt: str, timeout: float) -> str:
+        # The private log dir identifies the session this run created
+        with self.session_resolver.track() as spawn:
+            self.run('create', self.create_argv(prompt, spawn.log_dir), cwd, timeout)
+        if not spawn.session_id:
+            raise AgentError("Failed to retrieve session ID from copilot")
+        return spawn.session_id
+
+
+class CursorAgentBackend(AgentBackend):
+    """Cursor's CLI (`cursor-agent`); `create-chat` prints the new chat's id."""
+
+    name = 'cursor-agent'
+    binary = 'cursor-agent'
+
+    def create_argv(self, prompt: str, log_dir: Optional[str]) -> List[str]:
+        return [self.binary, 'create-chat']
+
+    def ask_argv(self, session_id: str, message: str) -> List[str]:
+        argv = [self.binary, f'--resume={session_id}', '--print', message]
+        return argv[:1] + ['--model', self.model] + argv[1:] if self.model else argv
+
+    def _create(self, cwd: str, prompt: str, timeout: float) -> str:
+        session_id = super()._create(cwd, prompt, timeout)
+        # create-chat takes no prompt, so prime the chat with a first turn
+        if prompt != '.':
+            self.run('ask', self.ask_argv(session_id, prompt), cwd, timeout)
+        return session_id
+
+
+class StubBackend(AgentBackend):
+    """
+    No CLI at all: replies straight away with a canned answer (set STUB_AGENT_DELAY
+    to add latency). For developing and load-testing the front ends without an agent.
+    """
+
+    name = 'stub'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = float(self.env.get('STUB_AGENT_DELAY', '0'))
+
+    def _create_session(self, cwd: str, initial_prompt: Optional[str], timeout: float) -> str:
+        time.sleep(self.delay)
+        return str(uuidlib.uuid4())
+
+    def _ask(self, session_id: str, cwd: str, message: str, timeout: float,
+             on_chunk: Optional[Callable[[str], None]]) -> str:
+        time.sleep(self.delay)
+        reply = f"Stub answer to: {message}"
+        if on_chunk is not None:
+            on_chunk(reply)
+        return reply
+
+
+BACKENDS = {
+    'copilot': CopilotBackend,
+    'cursor-agent': CursorAgentBackend,
+    'stub': StubBackend,
+}
+
+
+def make_backend(name: str, **kwargs) -> AgentBackend:
+    """The backend called `name` ('copilot', 'cursor-agent' or 'stub'); kwargs go to AgentBackend."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown agent backend {name!r}, expected one of {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,476 @@
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import AGENT_HOST_SPAWNS, AGENT_HOST_TURNS, observe_agent_run
+
+# Agent Client Protocol version spoken with `copilot --acp`
+ACP_PROTOCOL_VERSION = 1
+# How long to wait for a process to start and load a session before giving up on it
+STARTUP_TIMEOUT = 60
+
+
+class AgentHostError(Exception):
+    """The host couldn't start or resume a session in a persistent process; use the one-shot CLI."""
+
+
+def _state_signature(state_dir: str, session_id: str) -> Optional[Tuple]:
+    # copilot keeps a session either as <id>.jsonl or as a <id>/ directory of events
+    for path in (os.path.join(state_dir, session_id + '.jsonl'),
+                 os.path.join(state_dir, session_id, 'events.jsonl'),
+                 os.path.join(state_dir, session_id)):
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        return (path, st.st_mtime_ns, st.st_size)
+    return None
+
+
+class AcpProcess:
+    """
+    One agent process speaking the Agent Client Protocol: JSON-RPC 2.0, one
+    message per line over its stdin/stdout.
+
+    A reader thread routes responses to the waiting `request` and
+    `session/update` notifications to `on_update`. The agent's own requests
+    are answered here: tool permissions are granted (the CLI runs with
+    --allow-all-tools anyway), anything else is refused as unsupported.
+    """
+
+    def __init__(self, argv: List[str], cwd: str, env: Dict[str, str]):
+        self.argv = argv
+        try:
+            # Own process group, so `kill` also takes down tools the agent started
+            self.process = subprocess.Popen(argv, cwd=cwd, env=env, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            start_new_session=True)
+        except OSError as e:
+            raise AgentHostError(f"Could not start {argv[0]}: {e}")
+        self.on_update: Optional[Callable[[Dict], None]] = None
+        # agentCapabilities from the `initialize` reply
+        self.capabilities: Dict = {}
+        self._next_id = 0
+        self._pending: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stderr = deque(maxlen=20)
+        threading.Thread(target=self._read_stdout, name='acp-stdout', daemon=True).start()
+        threading.Thread(target=self._read_stderr, name='acp-stderr', daemon=True).start()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def request(self, method: str, params: Dict, timeout: Optional[float]) -> Dict:
+        """Send a request and wait for its result; raises TimeoutError, or RuntimeError on an error reply."""
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            waiter = self._pending[request_id] = [threading.Event(), None, None]
+        try:
+            self._send({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+            if not waiter[0].wait(timeout):
+                raise TimeoutError(f"{method} took longer than {timeout} seconds")
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+        if waiter[2] is not None:
+            raise RuntimeError(waiter[2])
+        return waiter[1] or {}
+
+    def notify(self, method: str, params: Dict) -> None:
+        self._send({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+
+    def close(self, grace: float = 2.0) -> None:
+        """Close stdin so the agent exits on its own, killing it if it hasn't after `grace` seconds."""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(grace)
+        except subprocess.TimeoutExpired:
+            pass
+        self.kill()
+
+    def stderr_tail(self) -> str:
+        return ''.join(self._stderr).strip()
+
+    def _send(self, message: Dict) -> None:
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self._write_lock:
+            try:
+                self.process.stdin.write(data)
+                self.process.stdin.flush()
+            except (BrokenPipeError, ValueError, OSError):
+                raise RuntimeError(f"agent process exited: {self.stderr_tail() or 'no output'}")
+
+    def _read_stdout(self) -> None:
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if 'method' not in message:
+                with self._lock:
+                    waiter = self._pending.get(message.get('id'))
+                if waiter is not None:
+                    error = message.get('error')
+                    waiter[1] = message.get('result')
+                    waiter[2] = (error.get('message') or str(error)) if isinstance(error, dict) else error
+                    waiter[0].set()
+            elif 'id' in message:
+                self._answer(message)
+            elif message['method'] == 'session/update' and self.on_update is not None:
+                self.on_update(message.get('params') or {})
+        # EOF: the process is gone, fail whatever is still waiting
+        self.process.wait()
+        reason = f"agent process exited: {self.stderr_tail() or 'no output'}"
+        with self._lock:
+            waiters = list(self._pending.values())
+        for waiter in waiters:
+            waiter[2] = reason
+            waiter[0].set()
+
+    def _read_stderr(self) -> None:
+        for line in self.process.stderr:
+            self._stderr.append(line.decode('utf-8', errors='replace'))
+
+    def _answer(self, message: Dict) -> None:
+        reply = {'jsonrpc': '2.0', 'id': message['id']}
+        if message['method'] == 'session/request_permission':
+            options = (message.get('params') or {}).get('options') or []
+            allow = [o for o in options if o.get('kind') in ('allow_always', 'allow_once')]
+            if allow:
+                allow.sort(key=lambda o: o.get('kind') != 'allow_always')
+                reply['result'] = {'outcome': {'outcome': 'selected', 'optionId': allow[0].get('optionId')}}
+            else:
+                reply['result'] = {'outcome': {'outcome': 'cancelled'}}
+        else:
+            reply['error'] = {'code': -32601, 'message': f"Method not supported: {message['method']}"}
+        try:
+            self._send(reply)
+        except RuntimeError:
+            pass
+
+
+class _Session:
+    def __init__(self):
+        # Held for a whole turn (and while the process is being started for it)
+        self.lock = threading.Lock()
+        self.process: Optional[AcpProcess] = None
+        self.last_used = time.monotonic()
+        self.state: Optional[Tuple] = None
+
+
+class AgentHost:
+    """
+    Keeps one long-lived agent process per active chat session.
+
+    `copilot -p ... --resume <uuid>` pays for a shell, the CLI's startup and
+    reloading the session from disk on every message. Here the session's
+    first turn starts `copilot --acp`, loads the session into it, and later
+    turns are sent to that same process over its pipes, so they cost only the
+    model's time. A process idle for `idle_seconds` is closed and the session
+    is loaded again by its next turn; past `max_processes`, the least recently
+    used idle ones are closed first.
+
+    With `shared_sessions` (several worker processes serving the same
+    sessions) a turn taken by another worker leaves our process with an
+    outdated copy of the conversation, so a session whose state on disk
+    changed since our last turn is reloaded in a fresh process.
+    """
+
+    def __init__(self, argv: List[str], env: Optional[Dict[str, str]] = None, idle_seconds: float = 600,
+                 max_processes: int = 16, shared_sessions: bool = False, copilot_home: str = '~/.copilot'):
+        """
+        Args:
+            argv: Command starting an agent in ACP mode, e.g. ['copilot', '--acp', '--model', MODEL]
+            env: Environment of the agent processes (defaults to this process's)
+            idle_seconds: Close a session's process after this long without a turn
+            max_processes: How many processes to keep alive at most (busy ones are never closed)
+            shared_sessions: Other worker processes may run turns for the same sessions
+            copilot_home: Where the CLI keeps its session state
+        """
+        self.argv = list(argv)
+        self.env = dict(os.environ if env is None else env)
+        self.idle_seconds = idle_seconds
+        self.max_processes = max_processes
+        self.shared_sessions = shared_sessions
+        self.state_dir = os.path.join(os.path.expanduser(copilot_home), 'session-state')
+
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._load_supported: Optional[bool] = None
+        self._reaper: Optional[threading.Thread] = None
+
+        self.spawns = 0
+        self.turns = 0
+        self.reused_turns = 0
+        self.recycled: Dict[str, int] = {}
+
+    def create_session(self, project_path: str, initial_prompt: Optional[str] = None,
+                       timeout: float = 180) -> str:
+        """
+        Start a process with a new session (primed with `initial_prompt`) and keep it
+        for the session's first turns. Returns the session id.
+        """
+        self._start_reaper()
+        start = time.perf_counter()
+        process = self._spawn(project_path, 'new')
+        try:
+            result = process.request('session/new', {'cwd': os.path.abspath(project_path), 'mcpServers': []},
+                                     STARTUP_TIMEOUT)
+            session_id = result.get('sessionId')
+            if not session_id:
+                raise RuntimeError('session/new returned no sessionId')
+            if initial_prompt:
+                self._prompt(process, session_id, initial_prompt, None, timeout)
+        except TimeoutError:
+            process.kill()
+            observe_agent_run('acp_create', time.perf_counter() - start, 'timeout')
+            raise
+        except Exception as e:
+            process.kill()
+            observe_agent_run('acp_create', time.perf_counter() - start, 'error')
+            raise AgentHostError(str(e))
+        observe_agent_run('acp_create', time.perf_counter() - start, 0)
+
+        session = _Session()
+        session.process = process
+        session.state = self._state(session_id)
+        with self._lock:
+            self._sessions[session_id] = session
+        self._evict()
+        return session_id
+
+    def prompt(self, session_id: str, project_path: str, message: str,
+               on_chunk: Optional[Callable[[str], None]] = None, timeout: float = 600) -> str:
+        """
+        Run one turn of `session_id` in its process, starting one if it has none.
+
+        Raises AgentHostError if no process could take the session (the caller should
+        fall back to the one-shot CLI), TimeoutError if the turn ran past `timeout`,
+        and RuntimeError if the agent failed it.
+        """
+        self._start_reaper()
+        session = self._checkout(session_id)
+        try:
+            reused = self._ensure_process(session, session_id, project_path)
+            self._count_turn(reused)
+            start = time.perf_counter()
+            try:
+                text = self._prompt(session.process, session_id, message, on_chunk, timeout)
+            except TimeoutError:
+                observe_agent_run('acp_prompt', time.perf_counter() - start, 'timeout')
+                self._recycle(session, 'timeout')
+                raise
+            except Exception:
+                observe_agent_run('acp_prompt', time.perf_counter() - start, 'error')
+                self._recycle(session, 'error')
+                raise
+            observe_agent_run('acp_prompt', time.perf_counter() - start, 0)
+            session.last_used = time.monotonic()
+            session.state = self._state(session_id)
+            return text
+        finally:
+            session.lock.release()
+
+    def close(self, session_id: Optional[str] = None) -> None:
+        """Close the process of `session_id`, or every process (and stop the idle reaper)."""
+        with self._lock:
+            if session_id is None:
+                self._closed.set()
+                sessions = list(self._sessions.values())
+                self._sessions.clear()
+            else:
+                session = self._sessions.pop(session_id, None)
+                sessions = [session] if session else []
+        for session in sessions:
+            with session.lock:
+                self._recycle(session, 'closed')
+
+    def live(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._sessions.values() if s.process is not None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'live_processes': sum(1 for s in self._sessions.values() if s.process is not None),
+                'max_processes': self.max_processes,
+                'idle_seconds': self.idle_seconds,
+                'spawns': self.spawns,
+                'turns': self.turns,
+                'reused_turns': self.reused_turns,
+                'reuse_rate': self.reused_turns / self.turns if self.turns else 0.0,
+                'recycled': dict(self.recycled),
+            }
+
+    def _checkout(self, session_id: str) -> _Session:
+        """The session's entry, with its lock held."""
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    session = self._sessions[session_id] = _Session()
+            session.lock.acquire()
+            with self._lock:
+                if self._sessions.get(session_id) is session:
+                    return session
+            # The reaper dropped this entry while we waited for it
+            session.lock.release()
+
+    def _ensure_process(self, session: _Session, session_id: str, project_path: str) -> bool:
+        """Make sure the session has a live, current process; True if it already had one."""
+        if session.process is not None:
+            if not session.process.alive():
+                self._recycle(session, 'exited')
+            elif self.shared_sessions and self._state(session_id) != session.state:
+                self._recycle(session, 'stale')
+            else:
+                return True
+        if self._load_supported is False:
+            raise AgentHostError('the agent cannot load existing sessions')
+        process = self._spawn(project_path, 'resume')
+        try:
+            if not self._load_supported:
+                self._load_supported = bool(process.capabilities.get('loadSession'))
+                if not self._load_supported:
+                    raise AgentHostError('the agent cannot load existing sessions')
+            # The agent replays the conversation as session/update notifications; nobody listens yet
+            process.request('session/load', {'sessionId': session_id, 'cwd': os.path.abspath(project_path),
+                                             'mcpServers': []}, STARTUP_TIMEOUT)
+        except AgentHostError:
+            process.kill()
+            raise
+        except Exception as e:
+            process.kill()
+            raise AgentHostError(f"Could not load session {session_id}: {e}")
+        session.process = process
+        self._evict()
+        return False
+
+    def _spawn(self, project_path: str, reason: str) -> AcpProcess:
+        process = AcpProcess(self.argv, project_path, self.env)
+        try:
+            result = process.request('initialize', {
+                'protocolVersion': ACP_PROTOCOL_VERSION,
+                'clientCapabilities': {'fs': {'readTextFile': False, 'writeTextFile': False}, 'terminal': False},
+            }, STARTUP_TIMEOUT)
+        except Exception as e:
+            process.kill()
+            raise AgentHostError(f"{self.argv[0]} did not start in ACP mode: {e}")
+        process.capabilities = result.get('agentCapabilities') or {}
+        AGENT_HOST_SPAWNS.inc(reason=reason)
+        with self._lock:
+            self.spawns += 1
+        return process
+
+    def _prompt(self, process: AcpProcess, session_id: str, message: str,
+                on_chunk: Optional[Callable[[str], None]], timeout: float) -> str:
+        output = []
+
+        def on_update(params: Dict) -> None:
+            update = params.get('update') or {}
+            content = update.get('content') or {}
+            if (params.get('sessionId') == session_id and update.get('sessionUpdate') == 'agent_message_chunk'
+                    and content.get('type') == 'text' and content.get('text')):
+                output.append(content['text'])
+                if on_chunk is not None:
+                    on_chunk(content['text'])
+
+        process.on_update = on_update
+        try:
+            try:
+                result = process.request('session/prompt', {
+                    'sessionId': session_id,
+                    'prompt': [{'type': 'text', 'text': message}],
+                }, timeout)
+            except TimeoutError:
+                try:
+                    process.notify('session/cancel', {'sessionId': session_id})
+                except RuntimeError:
+                    pass
+                raise TimeoutError(f"agent took longer than {timeout} seconds to respond")
+        finally:
+            process.on_update = None
+        if result.get('stopReason') in ('refusal', 'cancelled'):
+            raise RuntimeError(f"agent stopped: {result['stopReason']}")
+        return ''.join(output)
+
+    def _recycle(self, session: _Session, reason: str) -> None:
+        """Close the session's process (the caller holds session.lock)."""
+        if session.process is None:
+            return
+        process, session.process = session.process, None
+        process.close()
+        with self._lock:
+            self.recycled[reason] = self.recycled.get(reason, 0) + 1
+
+    def _count_turn(self, reused: bool) -> None:
+        AGENT_HOST_TURNS.inc(reused='true' if reused else 'false')
+        with self._lock:
+            self.turns += 1
+            if reused:
+                self.reused_turns += 1
+
+    def _state(self, session_id: str) -> Optional[Tuple]:
+        return _state_signature(self.state_dir, session_id) if self.shared_sessions else None
+
+    def _evict(self) -> None:
+        """Close the least recently used idle processes while there are too many."""
+        with self._lock:
+            live = sorted((s for s in self._sessions.values() if s.process is not None), key=lambda s: s.last_used)
+        excess = len(live) - self.max_processes
+        for session in live:
+            if excess <= 0:
+                break
+            # A session in a turn is busy, not idle
+            if session.lock.acquire(blocking=False):
+                try:
+                    if session.process is not None:
+                        self._recycle(session, 'evicted')
+                        excess -= 1
+                finally:
+                    session.lock.release()
+
+    def _start_reaper(self) -> None:
+        with self._lock:
+            if self._reaper is None and not self._closed.is_set():
+                self._reaper = threading.Thread(target=self._reap_loop, name='agent-host-reaper', daemon=True)
+                self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(1.0, min(self.idle_seconds / 4, 30.0))
+        while not self._closed.wait(interval):
+            cutoff = time.monotonic() - self.idle_seconds
+            with self._lock:
+                items = list(self._sessions.items())
+            for session_id, session in items:
+                if session.last_used >= cutoff or not session.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if session.last_used < cutoff:
+                        self._recycle(session, 'idle')
+                        with self._lock:
+                            # Forget the session until its next turn
+                            if self._sessions.get(session_id) is session:
+                                del self._sessions[session_id]
+                finally:
+                    session.lock.release()
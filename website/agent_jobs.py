@@ -0,0 +1,239 @@
+import threading
+import time
+import traceback
+import uuid as uuid_lib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# Finished jobs are kept this long so a client that reconnects can still fetch the result
+JOB_RETENTION_SECONDS = 3600
+# With a shared job table, partial output is written through at most this often
+SHARED_OUTPUT_INTERVAL = 0.5
+SHARED_POLL_SECONDS = 0.25
+
+
+class AgentJobQueue:
+    """
+    Runs slow agent turns on a bounded worker pool instead of on the request thread.
+
+    `submit` returns a job id immediately; clients fetch the result with `get`,
+    long-poll with `wait`, which returns as soon as the job finishes or the
+    timeout passes, or follow partial output as it is produced with `stream`.
+
+    With an `admission` controller (see admission.py), a job takes its place in
+    the fair queue at `submit`, which raises Overloaded when the queue is
+    full, and its agent run waits on that place for a slot. The pool then has
+    a thread for every job that can be admitted, so jobs wait in the fair
+    queue rather than in the pool's first-come-first-served one.
+
+    With a `shared` job table (see session_registry.py), job states are also
+    written there, and jobs this process doesn't know are looked up in it, so
+    with several worker processes a client may poll any of them.
+    """
+
+    def __init__(self, max_workers: int = 4, retention: float = JOB_RETENTION_SECONDS,
+                 shared: Optional[Any] = None, admission: Optional[Any] = None):
+        """
+        Args:
+            max_workers: How many agent turns may run at the same time (the admission
+                controller's limit, if there is one)
+            retention: Seconds a finished job stays retrievable
+            shared: Optional SharedJobTable the workers of a multi-worker deployment share
+            admission: Optional AdmissionController handing out agent slots
+        """
+        self.max_workers = admission.limit if admission else max_workers
+        self.retention = retention
+        self.shared = shared
+        self.admission = admission
+        threads = admission.limit + admission.max_queue if admission else max_workers
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='agent-job')
+        self._jobs: Dict[str, Dict] = {}
+        # session id -> jobs of this process that are queued or running
+        self._pending: Dict[str, int] = {}
+        self._saved_at: Dict[str, float] = {}
+        self._save_lock = threading.Lock()
+        self._cond = threading.Condition()
+
+    def submit(self, session_id: str, fn: Callable[[Callable[[str], None]], Dict]) -> str:
+        """
+        Queue `fn` and return the new job id.
+        
+        Args:
+            session_id: The participant the job belongs to
+            fn: Called with an `on_chunk(text)` callback for partial output; returns the response dict
+
+        Raises Overloaded if the admission controller's queue is full.
+        """
+        ticket = self.admission.enqueue(session_id) if self.admission else None
+        job_id = str(uuid_lib.uuid4())
+        with self._cond:
+            self._prune()
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'session_id': session_id,
+                'status': 'queued',
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None,
+                'output': [],
+            }
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._write_through(job_id)
+        self._executor.submit(self._run, job_id, fn, ticket)
+        return job_id
+
+    def pending(self, session_id: str) -> int:
+        """How many of this process's jobs for the session are queued or running."""
+        with self._cond:
+            return self._pending.get(session_id, 0)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a copy of the job's state, or None if unknown (or expired)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job:
+                return _public(job)
+        job = self._remote(job_id)
+        return _public(job) if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Block until the job has finished or `timeout` seconds passed, then return its state."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    break
+                if job['status'] in ('done', 'error'):
+                    return _public(job)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return _public(job)
+                self._cond.wait(remaining)
+        # Submitted on another worker: poll the shared table
+        job = self._remote(job_id, deadline=deadline)
+        return _public(job) if job else None
+
+    def stream(self, job_id: str, heartbeat: float = 15.0) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield ('chunk', text) for the job's output as it arrives, ('heartbeat', None) when
+        nothing arrived for `heartbeat` seconds, and finally ('done', result) or ('error', message).
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    if sent == len(job['output']) and job['status'] not in ('done', 'error'):
+                        self._cond.wait(heartbeat)
+                    chunks = job['output'][sent:]
+                    status, result, error = job['status'], job['result'], job['error']
+            if job is None:
+                job = self._remote(job_id, deadline=time.monotonic() + heartbeat, seen=sent)
+                if job is not None:
+                    chunks = job['output'][sent:]
+                    status, result, error = job['status'], job['result'], job['error']
+            if job is None:
+                yield ('error', 'Unknown job')
+                return
+            sent += len(chunks)
+            for text in chunks:
+                yield ('chunk', text)
+            if status == 'done':
+                yield ('done', result)
+                return
+            if status == 'error':
+                yield ('error', error)
+                return
+            if not chunks:
+                yield ('heartbeat', None)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'error': 0}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return {'max_workers': self.max_workers, **counts}
+
+    def _run(self, job_id: str, fn: Callable[[Callable[[str], None]], Dict], ticket: Optional[Any]) -> None:
+        self._update(job_id, status='running')
+        try:
+            # The run takes its slot with the ticket from submit, once it gets to the agent
+            with self.admission.reserved(ticket) if ticket is not None else nullcontext():
+                result = fn(lambda text: self._append_output(job_id, text))
+            self._update(job_id, status='done', result=result, finished_at=time.time())
+        except Exception as e:
+            print(f"Error in agent job {job_id}: {str(e)}")
+            traceback.print_exc()
+            self._update(job_id, status='error', error=str(e), finished_at=time.time())
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                if fields.get('status') in ('done', 'error') and job['status'] not in ('done', 'error'):
+                    # Finished in the same step it stops counting as pending, so a waiter sees both
+                    session_id = job['session_id']
+                    self._pending[session_id] -= 1
+                    if not self._pending[session_id]:
+                        del self._pending[session_id]
+                job.update(fields)
+            self._cond.notify_all()
+        self._write_through(job_id)
+
+    def _append_output(self, job_id: str, text: str) -> None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['output'].append(text)
+            self._cond.notify_all()
+        if time.monotonic() - self._saved_at.get(job_id, 0.0) >= SHARED_OUTPUT_INTERVAL:
+            self._write_through(job_id)
+
+    def _write_through(self, job_id: str) -> None:
+        """Copy the job's current state to the shared table, if there is one."""
+        if self.shared is None:
+            return
+        # Snapshots are written in the order they were taken, so a late partial-output
+        # write can't overwrite the final state
+        with self._save_lock:
+            with self._cond:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                snapshot, output = dict(job), list(job['output'])
+                self._saved_at[job_id] = time.monotonic()
+            self.shared.save(snapshot, output)
+
+    def _remote(self, job_id: str, deadline: Optional[float] = None, seen: Optional[int] = None) -> Optional[Dict]:
+        """
+        Look the job up in the shared table. With a `deadline`, poll until it has finished,
+        has more than `seen` output chunks (if given), or the deadline passes.
+        """
+        if self.shared is None:
+            return None
+        while True:
+            job = self.shared.load(job_id)
+            if (job is None or deadline is None or job['status'] in ('done', 'error')
+                    or (seen is not None and len(job['output']) > seen)
+                    or time.monotonic() >= deadline):
+                return job
+            time.sleep(min(SHARED_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+    def _prune(self) -> None:
+        """Drop finished jobs older than the retention window. Caller holds the condition."""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._saved_at.pop(job_id, None)
+        if self.shared is not None:
+            self.shared.prune(cutoff)
+
+
+def _public(job: Dict) -> Dict:
+    """Copy of a job without its raw output chunks (those are read through `stream`)."""
+    return {key: value for key, value in job.items() if key != 'output'}
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import ANSWER_CACHE_LOOKUPS
+
+# Directories that aren't part of the project as the agent sees it
+SNAPSHOT_EXCLUDE = ('.git', '.hg', '.svn', '__pycache__', 'node_modules')
+
+
+class ProjectSnapshot:
+    """
+    Content hash of a project tree.
+
+    Every file's bytes are hashed, but a file is only read again when its
+    (size, mtime, inode) changed, so after the first walk a new snapshot
+    costs one stat per file. The tree is walked at most every `interval`
+    seconds; in between the last hash is reused.
+    """
+
+    def __init__(self, root: str, interval: float = 30.0):
+        """
+        Args:
+            root: The project directory
+            interval: Seconds to reuse a hash before walking the tree again
+        """
+        self.root = root
+        self.interval = interval
+        self._files: Dict[str, Tuple[Tuple, str]] = {}
+        self._digest: Optional[str] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def digest(self) -> str:
+        with self._lock:
+            if self._digest is None or time.monotonic() - self._checked >= self.interval:
+                self._digest = self._walk()
+                self._checked = time.monotonic()
+            return self._digest
+
+    def _walk(self) -> str:
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if d not in SNAPSHOT_EXCLUDE)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                relpath = os.path.relpath(path, self.root)
+                try:
+                    st = os.lstat(path)
+                    signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+                    known = self._files.get(relpath)
+                    if known is not None and known[0] == signature:
+                        files[relpath] = known
+                    else:
+                        files[relpath] = (signature, self._hash_file(path))
+                except OSError:
+                    # Removed while walking
+                    continue
+        self._files = files
+        tree = hashlib.sha256()
+        for relpath in sorted(files):
+            tree.update(f"{relpath}\0{files[relpath][1]}\n".encode('utf-8', errors='surrogateescape'))
+        return tree.hexdigest()
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        if os.path.islink(path):
+            return hashlib.sha256(os.readlink(path).encode('utf-8', errors='surrogateescape')).hexdigest()
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.answer: Optional[str] = None
+
+
+class AnswerCache:
+    """
+    Agent answers to context-free questions, keyed by what they depend on.
+
+    Only a session's first question qualifies: at that point the session has
+    seen nothing but the instruction prompt every session is primed with, so
+    the answer depends only on the project (its content hash, see
+    ProjectSnapshot), the model and the question. Questions are compared
+    after case-folding and collapsing whitespace. Entries expire after `ttl`
+    seconds and the `capacity` most recently used are kept.
+
+    A question already being answered for another participant isn't asked
+    again: the second caller waits for the first run's answer.
+    """
+
+    def __init__(self, capacity: int = 256, ttl: float = 86400, snapshot_interval: float = 30.0):
+        """
+        Args:
+            capacity: How many answers to keep
+            ttl: Seconds an answer stays valid
+            snapshot_interval: How often to re-hash a project tree (see ProjectSnapshot)
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.snapshot_interval = snapshot_interval
+        self._snapshots: Dict[str, ProjectSnapshot] = {}
+        self._answers: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return re.sub(r'\s+', ' ', question).strip().casefold()
+
+    def key(self, project_path: str, model: str, question: str) -> str:
+        with self._lock:
+            snapshot = self._snapshots.get(project_path)
+            if snapshot is None:
+                snapshot = self._snapshots[project_path] = ProjectSnapshot(project_path, self.snapshot_interval)
+        parts = (snapshot.digest(), model, self.normalize(question))
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, project_path: str, model: str, question: str, compute: Callable[[], str],
+                       timeout: float = 600) -> Tuple[str, bool]:
+        """
+        Return (answer, cached): the cached answer, the answer of an identical run in
+        progress, or `compute()`'s (stored if it succeeds and isn't empty).
+        """
+        key = self.key(project_path, model, question)
+        with self._lock:
+            entry = self._answers.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._answers.move_to_end(key)
+                self.hits += 1
+                ANSWER_CACHE_LOOKUPS.inc(result='hit')
+                return entry[1], True
+            if entry is not None:
+                del self._answers[key]
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight()
+                leader = True
+                self.misses += 1
+            else:
+                leader = False
+                self.coalesced += 1
+        ANSWER_CACHE_LOOKUPS.inc(result='miss' if leader else 'coalesced')
+
+        if not leader:
+            # If the other run fails or takes too long, ask for ourselves
+            if flight.done.wait(timeout) and flight.answer is not None:
+                return flight.answer, True
+            return compute(), False
+
+        try:
+            answer = compute()
+            if answer.strip():
+                flight.answer = answer
+                with self._lock:
+                    self._answers[key] = (time.time() + self.ttl, answer)
+                    self._answers.move_to_end(key)
+                    while len(self._answers) > self.capacity:
+                        self._answers.popitem(last=False)
+            return answer, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / total if total else 0.0,
+                'answers': len(self._answers),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,159 @@
+import heapq
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_CAPACITY = 2
+
+
+class BatchAllocator:
+    """
+    Assigns each new participant a batch and indexes who is in which batch.
+
+    Occupancy is kept in memory: a heap of the batches that still have room,
+    ordered by their position in the configured priority list, so picking a
+    batch is O(log batches) instead of recounting every assignment; and a
+    (participant, batch) -> 1-based position map, so participant-index lookups
+    are O(1). Assignments are persisted through the response store (one
+    journaled/transactional write each). Assignments other workers wrote are
+    picked up from the store's `changed_since`; the in-memory state is only
+    rebuilt when the file was replaced (clear_all_data), a participant was
+    reassigned, or the config changed.
+
+    The config (see batch_allocation.json) is a dict:
+        batches:        batch numbers in priority order (default: every batch, in order)
+        capacity:       participants per batch (default 2)
+        capacities:     {batch: capacity} overrides
+        fallback_batch: batch given out once all are full (default: the least occupied)
+    """
+
+    def __init__(self, store: Any, filepath: str, load_config: Callable[[], Dict],
+                 total_batches: Callable[[], int]):
+        """
+        Args:
+            store: The response store holding the assignments
+            filepath: The assignments file in the store (uuid -> [batch, ...])
+            load_config: Returns the allocation config; called on every lookup, so it should be cached
+            total_batches: Number of batches in NFR.json, for the default priority list
+        """
+        self.store = store
+        self.filepath = filepath
+        self.load_config = load_config
+        self.total_batches = total_batches
+
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._raw_config: Any = None
+        self._config: Dict = {}
+        self._batches_of: Dict[str, List[int]] = {}
+        self._participants: Dict[int, List[str]] = {}
+        self._positions: Dict[Tuple[str, int], int] = {}
+        self._open: List[Tuple[int, int]] = []
+        self._priority: List[int] = []
+        self._capacity: Dict[int, int] = {}
+
+    def assign(self, uuid: str) -> List[int]:
+        """Return the participant's batches, assigning one first if they have none."""
+        with self._lock:
+            self._sync()
+            if uuid in self._batches_of:
+                return self._batches_of[uuid]
+
+            # Full batches are dropped lazily (their capacity may have been lowered in the config)
+            while self._open and self._is_full(self._open[0][1]):
+                heapq.heappop(self._open)
+            batch = self._open[0][1] if self._open else self._fallback()
+
+            assigned = [batch]
+            self.store.put(self.filepath, uuid, assigned)
+            self._add(uuid, assigned)
+            if self._is_full(batch) and self._open and self._open[0][1] == batch:
+                heapq.heappop(self._open)
+            return assigned
+
+    def batches_of(self, uuid: str) -> Optional[List[int]]:
+        """The participant's batches, or None if they have none yet."""
+        with self._lock:
+            self._sync()
+            return self._batches_of.get(uuid)
+
+    def participant_index(self, uuid: str, batch: int) -> Optional[int]:
+        """1-based position of the participant among those assigned to `batch`."""
+        with self._lock:
+            self._sync()
+            return self._positions.get((uuid, batch))
+
+    def participants(self, batch: int) -> List[str]:
+        """Participants of `batch` in the order they were assigned."""
+        with self._lock:
+            self._sync()
+            return list(self._participants.get(batch, []))
+
+    def occupancy(self) -> Dict:
+        with self._lock:
+            self._sync()
+            return {
+                'participants': len(self._batches_of),
+                'open_batches': sorted(batch for _, batch in self._open if not self._is_full(batch)),
+                'batches': {batch: {'assigned': len(self._participants.get(batch, [])),
+                                    'capacity': self._capacity.get(batch, DEFAULT_CAPACITY)}
+                            for batch in self._priority},
+            }
+
+    def _sync(self) -> None:
+        """Catch up with the store if the file or the config changed behind our back. Caller holds the lock."""
+        config = self.load_config()
+        version = self.store.version(self.filepath)
+        if version == self._version and config == self._raw_config:
+            return
+        changed = None
+        if self._version is not None and config == self._raw_config:
+            changed = self.store.changed_since(self.filepath, self._version)
+        for uuid in changed or ():
+            batches = self.store.get(self.filepath, uuid)
+            if batches == self._batches_of.get(uuid):
+                continue  # our own write
+            if uuid in self._batches_of or not isinstance(batches, list):
+                changed = None  # reassigned: positions shift, so start over
+                break
+            self._add(uuid, batches)
+        if changed is None:
+            self._rebuild(config)
+        self._version = version
+
+    def _rebuild(self, config: Any) -> None:
+        self._raw_config = config
+        self._config = config if isinstance(config, dict) else {}
+        self._batches_of = {}
+        self._participants = {}
+        self._positions = {}
+        for uuid, batches in self.store.load(self.filepath).items():
+            if isinstance(batches, list):
+                self._add(uuid, batches)
+
+        priority = self._config.get('batches') or list(range(1, self.total_batches() + 1))
+        self._priority = [int(batch) for batch in priority]
+        default_capacity = int(self._config.get('capacity', DEFAULT_CAPACITY))
+        overrides = {int(batch): int(cap) for batch, cap in (self._config.get('capacities') or {}).items()}
+        self._capacity = {batch: overrides.get(batch, default_capacity) for batch in self._priority}
+        self._open = [(rank, batch) for rank, batch in enumerate(self._priority) if not self._is_full(batch)]
+        heapq.heapify(self._open)
+
+    def _add(self, uuid: str, batches: List[int]) -> None:
+        self._batches_of[uuid] = batches
+        for batch in batches:
+            if (uuid, batch) in self._positions:
+                continue
+            members = self._participants.setdefault(batch, [])
+            members.append(uuid)
+            self._positions[(uuid, batch)] = len(members)
+
+    def _is_full(self, batch: int) -> bool:
+        return len(self._participants.get(batch, ())) >= self._capacity.get(batch, DEFAULT_CAPACITY)
+
+    def _fallback(self) -> int:
+        if self._config.get('fallback_batch') is not None:
+            return int(self._config['fallback_batch'])
+        if not self._priority:
+            return 1
+        # Least occupied, earliest in priority on ties
+        return min(self._priority, key=lambda batch: len(self._participants.get(batch, ())))
@@ -1,27 +1,79 @@
-import subprocess
 import os
-import shlex
-import re
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
-STATIC_PROJECT_PATH = "/Users/neo/Desktop/NFR/new/website-server-copy/iTrust/iTrust"
+from admission import AdmissionController, Overloaded
+from agent_backend import make_backend
+from answer_cache import AnswerCache
+from metrics import SESSION_CREATE_SECONDS
+
+STATIC_PROJECT_PATH = os.environ.get("COPILOT_PROJECT_PATH", "/Users/neo/Desktop/NFR/new/website-server-copy/iTrust/iTrust")
 #STATIC_PROJECT_PATH = "/root/iTrust/iTrust"
 MODEL = f"gpt-5.1-codex-max"
 MODEL = f"gpt-5-mini"
+
+# AGENT_BACKEND picks the CLI behind the chatbot: copilot, cursor-agent, or stub (canned
+# replies, for working on the site without an agent). See agent_backend.py.
+AGENT_BACKEND = os.environ.get('AGENT_BACKEND', 'copilot')
+# AGENT_HOST=1 keeps one `copilot --acp` process per active session and sends every turn
+# to it instead of starting the CLI per message (see agent_host.py); sessions the host
+# can't take fall back to `copilot --resume`
+AGENT_HOST = os.environ.get('AGENT_HOST') == '1'
+AGENT_HOST_IDLE_SECONDS = float(os.environ.get('AGENT_HOST_IDLE_SECONDS', '600'))
+AGENT_HOST_MAX_PROCESSES = int(os.environ.get('AGENT_HOST_MAX_PROCESSES', '16'))
+# At most AGENT_CONCURRENCY agent runs at once (with MULTI_WORKER, across all worker
+# processes), handed out round-robin between participants; past AGENT_QUEUE_MAX waiting
+# runs, or AGENT_QUEUE_PER_PARTICIPANT for one participant, requests get a 429 (see admission.py)
+AGENT_CONCURRENCY = int(os.environ.get('AGENT_CONCURRENCY', os.environ.get('AGENT_WORKERS', '4')))
+admission = AdmissionController(
+    limit=AGENT_CONCURRENCY,
+    max_queue=int(os.environ.get('AGENT_QUEUE_MAX', '32')),
+    max_per_participant=int(os.environ.get('AGENT_QUEUE_PER_PARTICIPANT', '3')),
+    lock_dir=os.path.join(os.environ.get('LOCK_DIR', 'responses/locks'), 'agent-slots')
+    if os.environ.get('MULTI_WORKER') == '1' else None,
+)
+backend = make_backend(
+    AGENT_BACKEND,
+    model=MODEL,
+    persistent=AGENT_HOST,
+    idle_seconds=AGENT_HOST_IDLE_SECONDS,
+    max_processes=AGENT_HOST_MAX_PROCESSES,
+    shared_sessions=os.environ.get('MULTI_WORKER') == '1',
+    admission=admission,
+)
+agent_host = backend.host
+
+# ANSWER_CACHE=1 answers a session's first question from earlier identical ones asked
+# against the same project snapshot and model (see answer_cache.py)
+ANSWER_CACHE = os.environ.get('ANSWER_CACHE') == '1'
+answer_cache = AnswerCache(
+    capacity=int(os.environ.get('ANSWER_CACHE_SIZE', '256')),
+    ttl=float(os.environ.get('ANSWER_CACHE_TTL', '86400')),
+    snapshot_interval=float(os.environ.get('ANSWER_CACHE_SNAPSHOT_SECONDS', '30')),
+) if ANSWER_CACHE else None
+
 class Chatbot:
-    def __init__(self, project_path: str = STATIC_PROJECT_PATH, uuid: Optional[str] = None):
+    def __init__(self, project_path: str = STATIC_PROJECT_PATH, uuid: Optional[str] = None,
+                 history_loader: Optional[Callable[[], List[Dict]]] = None):
         """
         Initialize the chatbot with copilot CLI integration.
         
         Args:
             project_path: Path to the project directory
             uuid: Optional existing UUID to resume a session
+            history_loader: Returns the stored history of a resumed session; only called
+                the first time `chat_history` is read
         """
         print(f"Initializing chatbot with project path: {project_path} and uuid: {uuid}")
         self.project_path = project_path
         self.uuid = uuid
-        self.chat_history: List[Dict] = []
+        self._history: Optional[List[Dict]] = [] if history_loader is None else None
+        self._history_loader = history_loader
+        self.last_turn: Optional[Dict] = None
+        # Held for a whole turn so two messages never resume the same session at once
+        self.turn_lock = threading.Lock()
         
         # Load initial prompt if it exists
         initial_prompt = None
@@ -35,43 +87,15 @@ class Chatbot:
         if not self.uuid:
             self.uuid = self.create_chat(initial_prompt=initial_prompt)
     
-    def _extract_uuid_from_text(self, text: str) -> Optional[str]:
-        uuid_match = re.search(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}', text)
-        return uuid_match.group(0) if uuid_match else None
-
-    def _latest_session_state_uuid(self) -> Optional[str]:
-        # ls -t ~/.copilot/session-state | head -n1
-        session_state_dir = os.path.expanduser('~/.copilot/session-state')
-        if not os.path.isdir(session_state_dir):
-            return None
-        entries = [os.path.join(session_state_dir, name) for name in os.listdir(session_state_dir)
-                   if not name.startswith('process')]
-        entries = [e for e in entries if os.path.isfile(e) or os.path.isdir(e)]
-        if not entries:
-            return None
-        latest = max(entries, key=os.path.getmtime)
-        base = os.path.basename(latest)
-        if base.endswith('.jsonl'):
-            base = base[:-6]
-        return base
+    @property
+    def chat_history(self) -> List[Dict]:
+        if self._history is None:
+            self._history = list(self._history_loader() or [])
+        return self._history
 
-    def _latest_process_log_uuid(self) -> Optional[str]:
-        logs_dir = os.path.expanduser('~/.copilot/logs')
-        if not os.path.isdir(logs_dir):
-            return None
-        logs = [os.path.join(logs_dir, name) for name in os.listdir(logs_dir) if name.startswith('process-')]
-        if not logs:
-            return None
-        latest = max(logs, key=os.path.getmtime)
-        try:
-            with open(latest, 'r') as f:
-                content = f.read()
-            uuid = self._extract_uuid_from_text(content)
-            if uuid and uuid.startswith('session-'):
-                uuid = uuid[8:]
-            return uuid
-        except Exception:
-            return None
+    @chat_history.setter
+    def chat_history(self, history: List[Dict]) -> None:
+        self._history = history
 
     def create_chat(self, initial_prompt: Optional[str] = None, timeout: int = 180) -> str:
         """
@@ -84,57 +108,19 @@ class Chatbot:
         Returns:
             The session UUID from copilot
         """
-        # Use a dummy prompt if none provided
-        prompt = initial_prompt if initial_prompt else "."
-        
-        # Properly escape the prompt for shell command
-        escaped_prompt = shlex.quote(prompt)
-        escaped_path = shlex.quote(self.project_path)
-        
-        # Create a new session by running a command and extracting the session ID
-        shell_command = (
-            f'cd {escaped_path} && '
-            f'copilot -p {escaped_prompt} --model {MODEL} -s --allow-all-tools'
-        )
-        
+        start = time.perf_counter()
         try:
-            result = subprocess.run(
-                shell_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=self.project_path,
-                env={**os.environ, 'PATH': f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"},
-                timeout=timeout
-            )
-            print('here')
-            
-            if result.returncode == 0:
-                '''
-                # Prefer UUID from CLI output if available
-                uuid = self._extract_uuid_from_text(result.stdout or '') or self._extract_uuid_from_text(result.stderr or '')
-                if not uuid:
-                    # Fallback to session-state (works on both folder and .jsonl formats)
-                    uuid = self._latest_session_state_uuid()
-                print('here2')
-                if not uuid:
-                    # Final fallback: scrape newest process log
-                    uuid = self._latest_process_log_uuid()
-                print('here3')
-                '''
-                uuid = self._latest_session_state_uuid()
-                if uuid:
-                    self.chat_history = []
-                    return uuid
-                raise Exception("Failed to retrieve session ID from copilot")
-            else:
-                error_msg = result.stderr if result.stderr else "Unknown error"
-                raise Exception(f"Failed to create chat: {error_msg}")
-        
-        except subprocess.TimeoutExpired:
-            raise Exception(f"Timeout: copilot create-chat took longer than {timeout} seconds")
-        except Exception as e:
-            raise Exception(f"Error creating copilot chat: {str(e)}")
+            uuid = self._create_chat(initial_prompt, timeout)
+        except Exception:
+            SESSION_CREATE_SECONDS.observe(time.perf_counter() - start, outcome='error')
+            raise
+        SESSION_CREATE_SECONDS.observe(time.perf_counter() - start, outcome='ok')
+        return uuid
+
+    def _create_chat(self, initial_prompt: Optional[str], timeout: int) -> str:
+        uuid = backend.create_session(self.project_path, initial_prompt, timeout)
+        self.chat_history = []
+        return uuid
     
     def ask_cursor_agent(self, message: str, timeout: int = 600) -> str:
         """
@@ -149,62 +135,66 @@ class Chatbot:
         """
         if not self.uuid:
             raise Exception("UUID not initialized. Cannot ask copilot.")
-        
-        # Properly escape the message for shell command
-        # Use shlex.quote to safely escape special characters
-        escaped_message = shlex.quote(message)
-        escaped_uuid = shlex.quote(self.uuid)
-        escaped_path = shlex.quote(self.project_path)
         print(f"Executing copilot command with session UUID: {self.uuid}")
-        print(f"Executing copilot command with session UUID: {escaped_uuid}")
-        
-        shell_command = (
-            f'cd {escaped_path} && '
-            f'copilot --model {MODEL} --resume {escaped_uuid} -p {escaped_message} -s --allow-all-tools'
-        )
+        return backend.ask(self.uuid, self.project_path, message, timeout)
+    
+    def stream_cursor_agent(self, message: str, on_chunk: Callable[[str], None], timeout: int = 600) -> str:
+        """
+        Like ask_cursor_agent, but passes copilot's output on as it is produced.
         
-        try:
-            result = subprocess.run(
-                shell_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=self.project_path,
-                env={**os.environ, 'PATH': f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"},
-                timeout=timeout
-            )
+        Args:
+            message: The message/question to ask
+            on_chunk: Called with each piece of output as soon as it arrives
+            timeout: Maximum time to wait for response
             
-            if result.returncode == 0:
-                return result.stdout
-            else:
-                error_msg = result.stderr if result.stderr else "Unknown error"
-                raise Exception(f"Failed to ask copilot: {error_msg}")
-        
-        except subprocess.TimeoutExpired:
-            raise Exception(f"Timeout: copilot took longer than {timeout} seconds to respond")
-        except Exception as e:
-            raise Exception(f"Error asking copilot: {str(e)}")
+        Returns:
+            The full response from copilot
+        """
+        if not self.uuid:
+            raise Exception("UUID not initialized. Cannot ask copilot.")
+        print(f"Streaming copilot command with session UUID: {self.uuid}")
+        return backend.ask(self.uuid, self.project_path, message, timeout, on_chunk)
     
     def get_uuid(self) -> str:
         """Return the unique identifier for this chatbot instance."""
         return self.uuid
     
-    def ask_chatbot(self, request: str) -> Dict:
+    def ask_chatbot(self, request: str, on_chunk: Optional[Callable[[str], None]] = None) -> Dict:
         """
         Process a user request and return the response from copilot.
         
         Args:
             request: The user's message/question
+            on_chunk: If given, the reply is streamed and passed here piece by piece
             
         Returns:
             Dictionary containing the bot's response with timestamp
         """
         user_time = datetime.now().isoformat()
+        cached = False
         
-        try:
+        def ask(message: str) -> str:
             # Ask copilot CLI
-            bot_reply = self.ask_cursor_agent(request)
+            if on_chunk is not None:
+                return self.stream_cursor_agent(message, on_chunk)
+            return self.ask_cursor_agent(message)
+        
+        try:
+            if answer_cache is not None and not self.chat_history:
+                # Nothing but the shared instruction prompt precedes a first question
+                bot_reply, cached = answer_cache.get_or_compute(
+                    self.project_path, f"{backend.name}:{MODEL}", request, lambda: ask(request))
+                if cached and on_chunk is not None:
+                    on_chunk(bot_reply)
+            elif answer_cache is not None:
+                bot_reply = ask(self._with_cached_turns(request))
+            else:
+                # No cached turns to replay, so a resumed session's history stays unloaded
+                bot_reply = ask(request)
             bot_reply = bot_reply.strip()
+        except Overloaded:
+            # Not an answer: the caller turns it into a 429
+            raise
         except Exception as e:
             bot_reply = f"Error: {str(e)}"
         
@@ -217,13 +207,38 @@ class Chatbot:
             'user_time': user_time,
             'bot_time': bot_time
         }
-        self.chat_history.append(chat_entry)
+        if cached:
+            chat_entry['cached'] = True
+        self.last_turn = chat_entry
+        # Not hydrated yet: the turn is persisted by the caller and shows up when history is loaded
+        if self._history is not None:
+            self._history.append(chat_entry)
         
         return {
             'response': bot_reply,
             'timestamp': bot_time
         }
     
+    def _with_cached_turns(self, request: str) -> str:
+        """
+        Prefix the request with the turns answered from the answer cache since the
+        agent's last live turn: its own session never saw them.
+        """
+        unseen = []
+        for entry in reversed(self.chat_history):
+            if not entry.get('cached'):
+                break
+            unseen.append(entry)
+        if not unseen:
+            return request
+        lines = ["Earlier in this conversation I already asked the following, and this was your answer:"]
+        for entry in reversed(unseen):
+            lines.append(f"Question: {entry['user_message']}")
+            lines.append(f"Answer: {entry['bot_reply']}")
+        lines.append("")
+        lines.append(request)
+        return '\n'.join(lines)
+    
     def get_chat_history(self) -> List[Dict]:
         """Return the full chat history."""
         return self.chat_history
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class ChatbotRegistry:
+    """
+    Bounded, least-recently-used map of session id -> Chatbot.
+
+    Holds at most `capacity` chatbots and drops any that went unused for
+    `idle_ttl` seconds, so memory stays flat however many participants a
+    long-running server has seen. An evicted chatbot is cheap to bring back:
+    it resumes the same copilot session and its history is read again from
+    the response store on demand. Entries for which `is_busy` returns True
+    (e.g. mid-turn) are never evicted.
+    """
+
+    def __init__(self, capacity: int = 256, idle_ttl: float = 3600.0,
+                 is_busy: Optional[Callable[[Any], bool]] = None):
+        """
+        Args:
+            capacity: Maximum number of chatbots kept; 0 keeps none between requests
+            idle_ttl: Seconds after the last use at which a chatbot is dropped
+            is_busy: Returns True for a chatbot that must not be evicted right now
+        """
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl
+        self.is_busy = is_busy or (lambda item: False)
+
+        self._items: 'OrderedDict[str, Any]' = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the chatbot for `key` (marking it recently used), or None."""
+        with self._lock:
+            self._expire(time.monotonic())
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return item
+
+    def add(self, key: str, item: Any) -> Any:
+        """
+        Register `item` under `key` unless another request got there first.
+
+        Returns:
+            The chatbot now registered under `key`
+        """
+        with self._lock:
+            existing = self._items.get(key)
+            if existing is not None:
+                self._touch(key)
+                return existing
+            self._items[key] = item
+            self._touch(key)
+            self._evict_over_capacity()
+            return item
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._last_used.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': len(self._items),
+                'capacity': self.capacity,
+                'idle_ttl': self.idle_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _touch(self, key: str) -> None:
+        self._items.move_to_end(key)
+        self._last_used[key] = time.monotonic()
+
+    def _drop(self, key: str) -> None:
+        del self._items[key]
+        del self._last_used[key]
+        self.evictions += 1
+
+    def _expire(self, now: float) -> None:
+        """Drop idle entries. Least recently used come first, so stop at the first fresh one."""
+        cutoff = now - self.idle_ttl
+        for key in list(self._items):
+            if self._last_used[key] > cutoff:
+                break
+            if not self.is_busy(self._items[key]):
+                self._drop(key)
+
+    def _evict_over_capacity(self) -> None:
+        excess = len(self._items) - self.capacity
+        if excess <= 0:
+            return
+        for key in list(self._items):
+            if excess <= 0:
+                break
+            if not self.is_busy(self._items[key]):
+                self._drop(key)
+                excess -= 1
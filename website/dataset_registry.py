@@ -0,0 +1,105 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from json_cache import JsonFileCache
+from results_service import RESULT_SECTIONS, ResultsService
+
+# Stage directories of past rounds: data/2.pilot, data/7.valid-data-ordered, ...
+DATASET_DIR_RE = re.compile(r'^\d+\.')
+
+# Some stages name a file differently (8.annotated_data has conversations.json)
+FILENAME_ALIASES = {
+    'conversations': ('conversations.json',),
+}
+
+
+class DatasetRegistry:
+    """
+    Named, read-only datasets from the `data/N.*` stage directories, for the results viewer.
+
+    Directories are discovered by name; nothing is parsed until a section of a
+    dataset is requested, and then only that section's file. The `capacity`
+    most recently used datasets keep their parsed files (and participant
+    order) in memory, so flipping between rounds doesn't re-parse them;
+    older ones are dropped and reloaded on demand.
+    """
+
+    def __init__(self, root: str, nfr_text_map: Callable[[], Dict], capacity: int = 3):
+        """
+        Args:
+            root: Directory holding the stage directories (the repo's `data/`)
+            nfr_text_map: Returns {nfr_id: description}, shared by every dataset
+            capacity: How many datasets keep their parsed files in memory
+        """
+        self.root = root
+        self.nfr_text_map = nfr_text_map
+        self.capacity = capacity
+
+        self._loaded: 'OrderedDict[str, ResultsService]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def names(self) -> List[str]:
+        """Stage directories that hold at least one response file, in stage order."""
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        names = [name for name in entries
+                 if DATASET_DIR_RE.match(name) and self._files(name) is not None]
+        return sorted(names, key=lambda name: (int(name.split('.', 1)[0]), name))
+
+    def get(self, name: str) -> Optional[ResultsService]:
+        """Results service for dataset `name`, or None if there is no such dataset."""
+        with self._lock:
+            service = self._loaded.get(name)
+            if service is not None:
+                self._loaded.move_to_end(name)
+                self.hits += 1
+                return service
+
+        if not DATASET_DIR_RE.match(name) or os.sep in name or name in ('.', '..'):
+            return None
+        files = self._files(name)
+        if files is None:
+            return None
+        # Each dataset gets its own file cache, so evicting the dataset frees its parsed files
+        service = ResultsService(JsonFileCache().load, files, self.nfr_text_map)
+
+        with self._lock:
+            self.misses += 1
+            service = self._loaded.setdefault(name, service)
+            self._loaded.move_to_end(name)
+            while len(self._loaded) > self.capacity:
+                self._loaded.popitem(last=False)
+            return service
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'loaded': list(self._loaded),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _files(self, name: str) -> Optional[Dict[str, str]]:
+        """Path of each section's file in the dataset, or None if it holds none of them."""
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            return None
+        files = {}
+        found = False
+        for section, filename in RESULT_SECTIONS.items():
+            path = os.path.join(directory, filename)
+            for alias in FILENAME_ALIASES.get(section, ()):
+                if not os.path.exists(path):
+                    path = os.path.join(directory, alias)
+            found = found or os.path.exists(path)
+            # Missing sections load as {}
+            files[section] = path
+        return files if found else None
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+QUESTIONS = ('q1', 'q2', 'q3')
+
+# One row per NFR response, joined with the participant's Prolific id and gate answer
+EXPORT_COLUMNS = [
+    'participant', 'prolific_pid', 'batch', 'nfr_id', 'timestamp',
+    'q1_agreement', 'q1_own_assessment',
+    'q2_agreement', 'q2_own_assessment',
+    'q3_agreement', 'q3_own_assessment',
+    'undecided_reason', 'forced_own_assessment', 'nfr_acknowledged',
+    'satisfaction_level', 'reasoning', 'code_location',
+    'gate_answer', 'gate_answer_timestamp',
+]
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Rows are sent in chunks of about this size rather than one write per row
+CHUNK_BYTES = 64 * 1024
+
+
+def parse_time(value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """
+    Parse a ?since= / ?until= bound (ISO date or datetime). A bare date as an upper
+    bound means the end of that day. Raises ValueError if it isn't ISO 8601.
+    """
+    if not value:
+        return None
+    parsed = _parse_timestamp(value)
+    if parsed is None:
+        raise ValueError(f"Not an ISO date or datetime: {value!r}")
+    if end_of_day and len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max)
+    return parsed
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """Naive datetime for an ISO timestamp; aware ones (the browser's '...Z') are converted to UTC."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def export_records(store: Any, mapping_file: str, gate_file: str, batch: Any = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Yield one flat record per NFR response, in EXPORT_COLUMNS order.
+
+    Responses are pulled from `store.iter_feedback` one at a time, grouped by
+    participant, and each participant's Prolific id and gate answers are looked
+    up once when their first response comes by, so memory use stays flat however
+    much has been collected.
+
+    Args:
+        store: The response store
+        mapping_file: The session_id -> PROLIFIC_PID file in the store
+        gate_file: The gate answers file in the store (session_id -> batch -> nfr_id -> answer)
+        batch: Only responses to this (actual) batch
+        since: Only responses timestamped at or after this (naive, UTC for browser times)
+        until: Only responses timestamped at or before this
+    """
+    current = None
+    prolific_pid, gates = None, {}
+    for session_id, entry in store.iter_feedback(batch):
+        if since is not None or until is not None:
+            ts = _parse_timestamp(entry.get('timestamp'))
+            if ts is None or (since is not None and ts < since) or (until is not None and ts > until):
+                continue
+        if session_id != current:
+            current = session_id
+            prolific_pid = store.get(mapping_file, session_id)
+            gates = store.get(gate_file, session_id) or {}
+        gate = (gates.get(str(entry.get('batch'))) or {}).get(str(entry.get('nfr_id'))) or {}
+        record = {column: entry.get(column) for column in EXPORT_COLUMNS}
+        record.update({
+            'participant': session_id,
+            'prolific_pid': prolific_pid,
+            'gate_answer': gate.get('answer'),
+            'gate_answer_timestamp': gate.get('timestamp'),
+        })
+        yield record
+
+
+def ndjson_chunks(records: Iterable[Dict]) -> Iterator[str]:
+    """One JSON object per line."""
+    return _chunked(json.dumps(record) + '\n' for record in records)
+
+
+def csv_chunks(records: Iterable[Dict]) -> Iterator[str]:
+    """CSV with a header row; lists and dicts are written as JSON."""
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for record in records:
+            writer.writerow(['' if value is None else json.dumps(value) if isinstance(value, (list, dict)) else value
+                             for value in (record[column] for column in EXPORT_COLUMNS)])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    return _chunked(lines())
+
+
+def _chunked(pieces: Iterable[str]) -> Iterator[str]:
+    chunk, size = [], 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from metrics import observe_json
+
+
+class JsonFileCache:
+    """
+    Read-through cache of parsed JSON files keyed by path.
+
+    An entry is reused while the file's (mtime, size, inode) are unchanged, so a
+    repeated read costs one stat and a dict lookup instead of a json.load. Edits
+    made outside the server are picked up on the next read; the server's own
+    writes call `invalidate`. Cached objects are shared between requests and
+    must not be mutated by callers.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, filepath: str) -> Any:
+        """Return the parsed contents of `filepath`, or an empty dict if it doesn't exist."""
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            self.invalidate(filepath)
+            return {}
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        start = time.perf_counter()
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        observe_json('load', filepath, time.perf_counter() - start, st.st_size)
+        with self._lock:
+            self._entries[filepath] = (signature, data)
+        return data
+
+    def invalidate(self, filepath: str) -> None:
+        with self._lock:
+            self._entries.pop(filepath, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+            }
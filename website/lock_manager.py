@@ -0,0 +1,197 @@
+import fcntl
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, Optional, Tuple
+
+from metrics import LOCK_WAIT_SECONDS
+
+
+class RWLock:
+    """
+    Readers-writer lock: any number of readers, or one writer.
+
+    Writers are preferred (new readers wait while a writer is queued) so a
+    stream of readers can't starve them. Both modes are re-entrant for the
+    thread holding them, and a writer may also take the read side; upgrading
+    a read hold to a write hold raises instead of deadlocking.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self) -> bool:
+        """Take the read side; returns False if this thread already held the lock."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return False
+            if me in self._readers:
+                self._readers[me] += 1
+                return False
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers[me] = 1
+            return True
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._release_write_hold()
+                return
+            self._readers[me] -= 1
+            if not self._readers[me]:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self) -> bool:
+        """Take the write side; returns False if this thread already held it."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return False
+            if me in self._readers:
+                raise RuntimeError('Cannot upgrade a read lock to a write lock')
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+            return True
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._release_write_hold()
+
+    def _release_write_hold(self) -> None:
+        self._writer_depth -= 1
+        if not self._writer_depth:
+            self._writer = None
+            self._cond.notify_all()
+
+
+class LockManager:
+    """
+    Named readers-writer locks at two levels: a whole file, or one key (e.g. a
+    session id) within a file.
+
+    `write(file, key)` holds the file shared and the key exclusive, so writes
+    for different participants run in parallel while `write(file)` (e.g. the
+    batch allocator, which looks at every participant) excludes them all.
+    Locks are created on first use and dropped once nobody holds or waits for
+    them, so the table doesn't grow with the number of participants.
+
+    With a `lock_dir`, every outermost hold is also taken as an flock(2) on a
+    file there, so the locks hold across worker processes too: `<name>.lock`
+    for the file level, and one of `stripes` files per name for keys (two
+    keys may share a stripe and then wait for each other, but never deadlock
+    since no request holds two keys of one file).
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None, stripes: int = 64):
+        """
+        Args:
+            lock_dir: Directory for the inter-process lock files (None: this process only)
+            stripes: Lock files per name that keys are hashed onto
+        """
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        self._locks: Dict[Hashable, RWLock] = {}
+        self._refs: Dict[Hashable, int] = {}
+        self._guard = threading.Lock()
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    @contextmanager
+    def read(self, name: str, key: Optional[str] = None) -> Iterator[None]:
+        """Shared hold on `name` (or on one key of it)."""
+        with self._hold(name, key, exclusive=False):
+            yield
+
+    @contextmanager
+    def write(self, name: str, key: Optional[str] = None) -> Iterator[None]:
+        """Exclusive hold on `name` (or on one key of it)."""
+        with self._hold(name, key, exclusive=True):
+            yield
+
+    def held(self) -> int:
+        """Number of locks currently held or waited for."""
+        with self._guard:
+            return len(self._locks)
+
+    @contextmanager
+    def _hold(self, name: str, key: Optional[str], exclusive: bool) -> Iterator[None]:
+        if key is None:
+            with self._acquire((name,), exclusive):
+                yield
+            return
+        with self._acquire((name,), False):
+            with self._acquire((name, key), exclusive):
+                yield
+
+    @contextmanager
+    def _acquire(self, lock_id: Tuple, exclusive: bool) -> Iterator[None]:
+        rwlock = self._checkout(lock_id)
+        try:
+            start = time.perf_counter()
+            outermost = rwlock.acquire_write() if exclusive else rwlock.acquire_read()
+            fd = None
+            try:
+                if outermost and self.lock_dir:
+                    fd = self._flock(lock_id, exclusive)
+                LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, lock=os.path.basename(lock_id[0]),
+                                          level='key' if len(lock_id) > 1 else 'file',
+                                          mode='write' if exclusive else 'read')
+                yield
+            finally:
+                if fd is not None:
+                    os.close(fd)  # drops the flock
+                if exclusive:
+                    rwlock.release_write()
+                else:
+                    rwlock.release_read()
+        finally:
+            self._checkin(lock_id)
+
+    def _flock(self, lock_id: Tuple, exclusive: bool) -> int:
+        """Open the lock file for `lock_id` and flock it; closing the fd releases it."""
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', lock_id[0])
+        if len(lock_id) > 1:
+            filename += '.%d' % (zlib.crc32(str(lock_id[1]).encode()) % self.stripes)
+        # A fresh open file description per hold, so threads of this process contend like processes do
+        fd = os.open(os.path.join(self.lock_dir, filename + '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def _checkout(self, lock_id: Tuple) -> RWLock:
+        with self._guard:
+            rwlock = self._locks.get(lock_id)
+            if rwlock is None:
+                rwlock = self._locks[lock_id] = RWLock()
+            self._refs[lock_id] = self._refs.get(lock_id, 0) + 1
+            return rwlock
+
+    def _checkin(self, lock_id: Tuple) -> None:
+        with self._guard:
+            self._refs[lock_id] -= 1
+            if not self._refs[lock_id]:
+                del self._refs[lock_id]
+                del self._locks[lock_id]
@@ -0,0 +1,198 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Request-scale latencies, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# copilot CLI runs take seconds to minutes
+AGENT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def expose(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A value that only goes up, per label set."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, per label set, with their sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="%s"' % ('+Inf' if bound == float('inf') else _format_value(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read from `fn` at scrape time: a number, or {label value: number} for one label."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], object], labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def _samples(self) -> List[str]:
+        value = self.fn()
+        if isinstance(value, dict):
+            return [f'{self.name}{_format_labels(self.label_names, (key,))} {_format_value(v)}'
+                    for key, v in sorted(value.items())]
+        return [f'{self.name} {_format_value(value)}']
+
+
+class Registry:
+    """Metrics of this process, rendered in the Prometheus text format by `expose`."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], object], labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, fn, labels))
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering (e.g. a module imported twice) keeps the first
+            return self._metrics.setdefault(metric.name, metric)
+
+
+# Shared by every module of the process; served at /api/admin/metrics
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'website_request_duration_seconds', 'Request latency by route', ['route', 'method', 'status'])
+AGENT_SECONDS = registry.histogram(
+    'website_copilot_subprocess_seconds', 'Wall time of copilot CLI runs', ['command'], buckets=AGENT_BUCKETS)
+AGENT_EXITS = registry.counter(
+    'website_copilot_subprocess_exits_total', 'copilot CLI runs by exit code (or "timeout")', ['command', 'code'])
+SESSION_CREATE_SECONDS = registry.histogram(
+    'website_session_create_seconds', 'Time to create and prime a copilot session', ['outcome'],
+    buckets=AGENT_BUCKETS)
+JSON_SECONDS = registry.histogram(
+    'website_json_io_seconds', 'Time to parse or write a JSON file', ['op', 'file'])
+JSON_BYTES = registry.counter(
+    'website_json_io_bytes_total', 'Bytes of JSON files parsed or written', ['op', 'file'])
+LOCK_WAIT_SECONDS = registry.histogram(
+    'website_lock_wait_seconds', 'Time spent waiting for a LockManager lock', ['lock', 'level', 'mode'])
+AGENT_HOST_SPAWNS = registry.counter(
+    'website_agent_host_spawns_total', 'Persistent agent processes started, for a new or a resumed session',
+    ['reason'])
+ANSWER_CACHE_LOOKUPS = registry.counter(
+    'website_answer_cache_lookups_total', 'First questions answered from the cache, by an identical run, or live',
+    ['result'])
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    'website_agent_queue_wait_seconds', 'Time agent runs waited for a slot', buckets=AGENT_BUCKETS)
+ADMISSION_REJECTED = registry.counter(
+    'website_agent_admission_rejected_total', 'Agent requests refused with 429, by reason', ['reason'])
+AGENT_HOST_TURNS = registry.counter(
+    'website_agent_host_turns_total', 'Turns run by the agent host, by whether the process was reused', ['reused'])
+
+
+def observe_agent_run(command: str, seconds: float, code: Optional[object]) -> None:
+    """Record one copilot CLI run; `code` is its exit status, or 'timeout'."""
+    AGENT_SECONDS.observe(seconds, command=command)
+    AGENT_EXITS.inc(command=command, code=code)
+
+
+def observe_json(op: str, filepath: str, seconds: float, size: int) -> None:
+    """Record one JSON file parsed ('load'), written ('save') or journal record appended ('append')."""
+    name = os.path.basename(filepath)
+    JSON_SECONDS.observe(seconds, op=op, file=name)
+    JSON_BYTES.inc(size, op=op, file=name)
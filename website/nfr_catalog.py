@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional
+
+
+class NFRCatalog:
+    """
+    Immutable, pre-indexed view of NFR.json (a list of batches, each a list of NFR dicts).
+
+    Built once per version of the file and shared by every request, so the
+    requirement endpoints never re-read the file, re-count NFRs or re-serialize a
+    batch. The NFR dicts themselves are shared and must not be mutated.
+    """
+
+    def __init__(self, batches: List[List[Dict]]):
+        if not isinstance(batches, list):
+            batches = []
+        self.batches = tuple(tuple(n for n in b if isinstance(n, dict)) if isinstance(b, list) else ()
+                             for b in batches)
+        self.total_batches = len(self.batches)
+        self.total_nfrs = sum(len(b) for b in self.batches)
+
+        by_id = {}
+        batch_of = {}
+        text_map = {}
+        for batch_num, batch in enumerate(self.batches, start=1):
+            for nfr in batch:
+                nfr_id = nfr.get('id')
+                if nfr_id is None:
+                    continue
+                by_id[nfr_id] = nfr
+                batch_of[nfr_id] = batch_num
+                if nfr.get('description'):
+                    text_map[str(nfr_id)] = nfr['description']
+        self.by_id = MappingProxyType(by_id)
+        self.batch_of = MappingProxyType(batch_of)
+        self.text_map = MappingProxyType(text_map)
+
+        # Ready-to-send JSON for each batch (index 0 is batch 1)
+        self._batch_json = tuple(json.dumps(list(b)) for b in self.batches)
+
+    def batch(self, batch_num: int) -> tuple:
+        """NFRs of a 1-based batch, or an empty tuple if it doesn't exist."""
+        if 1 <= batch_num <= self.total_batches:
+            return self.batches[batch_num - 1]
+        return ()
+
+    def batch_json(self, batch_num: int) -> str:
+        """Pre-serialized JSON array for a 1-based batch."""
+        if 1 <= batch_num <= self.total_batches:
+            return self._batch_json[batch_num - 1]
+        return '[]'
+
+
+class AssessmentIndex:
+    """
+    Precomputed agent assessments (precompute.py's output, a list of GT-schema
+    records) indexed by NFR id. Records are shared and must not be mutated.
+    """
+
+    def __init__(self, records: List[Dict]):
+        if not isinstance(records, list):
+            records = []
+        self.by_id = MappingProxyType({r['id']: r for r in records
+                                       if isinstance(r, dict) and r.get('id') is not None})
+
+    def get(self, nfr_id: Any, description: Optional[str] = None) -> Optional[Dict]:
+        """The assessment of an NFR, or None if there is none for this `description` of it."""
+        record = self.by_id.get(nfr_id)
+        if record is None or (description is not None and record.get('description') != description):
+            return None
+        return record
+
+
+class CatalogLoader:
+    """
+    Holds the current NFRCatalog and rebuilds it when NFR.json changes on disk.
+
+    The file is stat'ed at most once per `check_interval` seconds, so edits to
+    NFR.json are picked up without restarting the server. `build` turns the
+    parsed file into the object handed out (NFRCatalog by default, e.g.
+    AssessmentIndex for precomputed assessments).
+    """
+
+    def __init__(self, filepath: str, check_interval: float = 1.0, build: Callable[[Any], Any] = NFRCatalog):
+        self.filepath = filepath
+        self.check_interval = check_interval
+        self.build = build
+        self._lock = threading.Lock()
+        self._catalog: Optional[NFRCatalog] = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def get(self) -> Any:
+        now = time.monotonic()
+        if self._catalog is not None and now - self._checked_at < self.check_interval:
+            return self._catalog
+        with self._lock:
+            self._checked_at = now
+            try:
+                st = os.stat(self.filepath)
+                signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except FileNotFoundError:
+                signature = None
+            if self._catalog is None or signature != self._signature:
+                data = []
+                if signature is not None:
+                    try:
+                        with open(self.filepath, 'r') as f:
+                            data = json.load(f)
+                    except ValueError as e:
+                        # Half-written edit; keep serving the previous catalog until it parses
+                        print(f"Error loading {self.filepath}: {str(e)}")
+                        if self._catalog is not None:
+                            return self._catalog
+                self._catalog = self.build(data)
+                self._signature = signature
+            return self._catalog
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import markdown
+
+
+def _signature(path: str) -> Optional[Tuple]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def render_markdown(text: str) -> str:
+    # Extensions for proper list rendering
+    try:
+        return markdown.markdown(text, extensions=['extra', 'nl2br'])
+    except Exception:
+        # Fallback if extensions not available
+        return markdown.markdown(text)
+
+
+class PageCache:
+    """
+    Rendered HTML pages, reused until one of their source files changes.
+
+    A page is cached under a key (template name and arguments) together with
+    the (mtime, size, inode) of every file it was rendered from, so serving
+    it again costs a few stats and a dict lookup instead of a markdown and
+    Jinja render. Each page carries a strong ETag (a hash of its bytes) for
+    conditional requests. Markdown sources are cached the same way on their
+    own, so pages that embed the same document share one conversion. The
+    `capacity` most recently used pages are kept.
+    """
+
+    def __init__(self, capacity: int = 256):
+        """
+        Args:
+            capacity: How many rendered pages to keep
+        """
+        self.capacity = capacity
+        self._pages: 'OrderedDict[Tuple, Tuple]' = OrderedDict()
+        self._markdown: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def markdown(self, path: str) -> str:
+        """HTML of the markdown file at `path`."""
+        signature = _signature(path)
+        with self._lock:
+            entry = self._markdown.get(path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+        with open(path, 'r') as f:
+            html = render_markdown(f.read())
+        with self._lock:
+            self._markdown[path] = (signature, html)
+        return html
+
+    def page(self, key: Tuple, sources: Iterable[str], render: Callable[[], str]) -> Tuple[bytes, str]:
+        """
+        Return (body, etag) of the page for `key`, calling `render` if it isn't cached
+        or one of `sources` changed since it was rendered.
+        """
+        signatures = tuple(_signature(path) for path in sources)
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[0] == signatures:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+
+        body = render().encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._pages[key] = (signatures, body, etag)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.capacity:
+                self._pages.popitem(last=False)
+        return body, etag
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'pages': len(self._pages),
+                'capacity': self.capacity,
+            }
@@ -0,0 +1,108 @@
+import threading
+from typing import Any, Dict, FrozenSet, List, Set, Tuple
+
+QUESTIONS = ('q1', 'q2', 'q3')
+
+
+def _disagreements(entries: List[Dict]) -> Dict[Tuple[Any, str], FrozenSet]:
+    """(batch, question) -> NFR ids a participant disagreed with but gave no own assessment for."""
+    found: Dict[Tuple[Any, str], set] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        nfr_id = entry.get('nfr_id')
+        if nfr_id is None:
+            continue
+        for q_key in QUESTIONS:
+            agreement = entry.get(f"{q_key}_agreement")
+            own_assessment = (entry.get(f"{q_key}_own_assessment") or '').strip()
+            if agreement and agreement != 'Agree' and not own_assessment:
+                found.setdefault((entry.get('batch'), q_key), set()).add(nfr_id)
+    return {key: frozenset(ids) for key, ids in found.items()}
+
+
+class PeerDisagreementIndex:
+    """
+    Materialized view of unexplained disagreements, keyed by (batch, question).
+
+    `_view[(batch, question)][session_id]` holds the NFR ids the participant
+    disagreed with on that question without an own assessment, which is what
+    the second participant of a batch has to address. The feedback handlers
+    call `update` after each write, which recomputes just that participant
+    and counts the write as seen. The whole view is rebuilt from the store at
+    startup and by `rebuild` after bulk changes. A read that finds writes the
+    `update`s didn't account for (another worker process sharing the store, or
+    a write still on its way to `update`) recomputes only the participants
+    written since (see the store's `changed_since`).
+    """
+
+    def __init__(self, store: Any, filepath: str):
+        """
+        Args:
+            store: The response store
+            filepath: The NFR responses file in the store (session_id -> [response, ...])
+        """
+        self.store = store
+        self.filepath = filepath
+        self._view: Dict[Tuple[Any, str], Dict[str, FrozenSet]] = {}
+        self._keys_of: Dict[str, List[Tuple[Any, str]]] = {}
+        # Every write up to _version is in the view; _seen holds versions of later ones `update` applied
+        self._version = 0
+        self._seen: Set[int] = set()
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Recompute the whole view from the store."""
+        with self._lock:
+            self._version = self.store.version(self.filepath)
+            self._seen = set()
+            self._view = {}
+            self._keys_of = {}
+            for session_id, entries in self.store.load(self.filepath).items():
+                self._set(session_id, entries)
+
+    def update(self, session_id: str) -> None:
+        """Recompute one participant after their responses were written. Call while holding their write lock."""
+        with self._lock:
+            self._set(session_id, self.store.get(self.filepath, session_id, []))
+            # The write lock means the participant's last change is the caller's write
+            version = self.store.key_version(self.filepath, session_id)
+            if version > self._version:
+                self._seen.add(version)
+                while self._version + 1 in self._seen:
+                    self._version += 1
+                    self._seen.discard(self._version)
+
+    def required(self, session_id: str, batch: Any) -> Dict[str, List]:
+        """{question: sorted NFR ids} the participant left unexplained in `batch`."""
+        with self._lock:
+            self._sync()
+            return {q_key: sorted(self._view.get((batch, q_key), {}).get(session_id, ()))
+                    for q_key in QUESTIONS}
+
+    def _sync(self) -> None:
+        version = self.store.version(self.filepath)
+        if version == self._version:
+            return
+        changed = self.store.changed_since(self.filepath, self._version)
+        if changed is None:
+            self.rebuild()
+            return
+        for session_id in changed:
+            self._set(session_id, self.store.get(self.filepath, session_id, []))
+        self._version = version
+        self._seen = {v for v in self._seen if v > version}
+
+    def _set(self, session_id: str, entries: Any) -> None:
+        for key in self._keys_of.pop(session_id, ()):
+            participants = self._view.get(key)
+            if participants is not None:
+                participants.pop(session_id, None)
+                if not participants:
+                    del self._view[key]
+        found = _disagreements(entries if isinstance(entries, list) else [])
+        for key, ids in found.items():
+            self._view.setdefault(key, {})[session_id] = ids
+        if found:
+            self._keys_of[session_id] = list(found)
@@ -0,0 +1,163 @@
+"""
+Precompute the agent's assessment of every NFR in NFR.json, offline.
+
+Runs the agent backend (see agent_backend.py) over each NFR, at most
+--workers at a time in a process pool, and writes the results in the GT
+schema (GT/GT_resolved.json: id, title, description, legacy_id,
+satisfaction_level, reasoning, code_location). The output file doubles as
+the checkpoint: it is rewritten after every finished NFR, and a rerun skips
+NFRs it already holds (unless their description changed), so an
+interrupted run resumes where it stopped and failed NFRs are retried.
+The website serves the file at /api/nfr_assessment/<nfr_id>, and with each
+batch from /api/get_requirements.
+
+    python precompute.py [--workers 4] [--backend copilot] [--only 1,2,3] [--force]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from agent_backend import make_backend
+from chatbot import MODEL, STATIC_PROJECT_PATH
+from response_store import _atomic_write_json
+
+DEFAULT_OUTPUT = os.environ.get('PRECOMPUTED_ASSESSMENTS_FILE', 'precomputed_assessments.json')
+SATISFACTION_LEVELS = ('Satisfied', 'Weakly Satisfied', 'Weakly Denied', 'Denied', 'NA')
+GT_FIELDS = ('id', 'title', 'description', 'legacy_id', 'satisfaction_level', 'reasoning', 'code_location')
+
+ASSESSMENT_PROMPT = (
+    "You are assessing whether the codebase in the current directory satisfies a non-functional "
+    "requirement (NFR). Review the files in the codebase, then answer with one JSON object and nothing else:\n"
+    '{"satisfaction_level": one of "Satisfied", "Weakly Satisfied", "Weakly Denied", "Denied", "NA", '
+    '"reasoning": a short explanation, '
+    '"code_location": a list of "<File> <start line>-<end line>" strings backing it up}'
+)
+
+# Set in each pool process by _init_worker
+_backend = None
+_project_path = None
+
+
+def _init_worker(backend_name: str, model: Optional[str], project_path: str, retries: int) -> None:
+    global _backend, _project_path
+    _backend = make_backend(backend_name, model=model, retries=retries)
+    _project_path = project_path
+
+
+def parse_assessment(reply: str) -> Dict:
+    """The satisfaction_level/reasoning/code_location of an agent reply; raises ValueError if it has none."""
+    # The object may be wrapped in prose or a ```json fence
+    match = re.search(r'\{.*\}', reply, re.DOTALL)
+    if not match:
+        raise ValueError('no JSON object in the reply')
+    data = json.loads(match.group(0))
+    level = data.get('satisfaction_level')
+    # Tolerate case and spacing differences ("weakly satisfied")
+    levels = {re.sub(r'\s+', ' ', l).strip().lower(): l for l in SATISFACTION_LEVELS}
+    level = levels.get(re.sub(r'\s+', ' ', str(level)).strip().lower())
+    if level is None:
+        raise ValueError(f"unknown satisfaction_level {data.get('satisfaction_level')!r}")
+    locations = data.get('code_location') or []
+    if isinstance(locations, str):
+        locations = [locations]
+    return {
+        'satisfaction_level': level,
+        'reasoning': str(data.get('reasoning') or '').strip(),
+        'code_location': [str(l) for l in locations],
+    }
+
+
+def assess(nfr: Dict, timeout: float) -> Dict:
+    """Run one NFR through the agent in a fresh session. Runs in a pool process."""
+    session_id = _backend.create_session(_project_path, ASSESSMENT_PROMPT, timeout)
+    reply = _backend.ask(session_id, _project_path, f"NFR {nfr.get('id')}: {nfr.get('title', '')}\n"
+                                                      f"{nfr.get('description', '')}", timeout)
+    assessment = parse_assessment(reply)
+    record = {field: nfr.get(field) for field in ('id', 'title', 'description', 'legacy_id') if field in nfr}
+    record.update(assessment)
+    return record
+
+
+def load_nfrs(path: str) -> List[Dict]:
+    """Every NFR of NFR.json (a list of batches), in order."""
+    with open(path, 'r') as f:
+        batches = json.load(f)
+    return [nfr for batch in batches if isinstance(batch, list)
+            for nfr in batch if isinstance(nfr, dict) and nfr.get('id') is not None]
+
+
+def load_done(path: str, force: bool) -> Dict:
+    """Assessments already in the output file, by NFR id."""
+    if force or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        records = json.load(f)
+    return {r['id']: r for r in records if isinstance(r, dict) and r.get('id') is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nfrs', default='NFR.json', help='NFR file (list of batches)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Results in the GT schema; also the checkpoint')
+    parser.add_argument('--workers', type=int, default=4, help='Agent runs in flight at once')
+    parser.add_argument('--backend', default=os.environ.get('AGENT_BACKEND', 'copilot'))
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--project', default=STATIC_PROJECT_PATH)
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds per agent run')
+    parser.add_argument('--retries', type=int, default=1, help='Extra attempts for agent runs that fail')
+    parser.add_argument('--only', help='Comma-separated NFR ids to (re)assess')
+    parser.add_argument('--force', action='store_true', help='Ignore results already in --output')
+    args = parser.parse_args()
+
+    nfrs = load_nfrs(args.nfrs)
+    order = {n['id']: i for i, n in enumerate(nfrs)}
+    done = load_done(args.output, args.force)
+    if args.only:
+        # Named NFRs are rerun even if assessed; their old result stays until the new one is in
+        only = {int(i) for i in args.only.split(',')}
+        nfrs = [n for n in nfrs if n['id'] in only]
+        todo = nfrs
+    else:
+        # A result only counts if it was made for the NFR's current wording
+        todo = [n for n in nfrs if n['id'] not in done or done[n['id']].get('description') != n.get('description')]
+    print(f"{len(nfrs)} NFRs, {len(nfrs) - len(todo)} already assessed, {len(todo)} to run "
+          f"with {args.workers} workers ({args.backend}, {args.model})")
+
+    def save():
+        records = sorted(done.values(), key=lambda r: order.get(r['id'], len(order)))
+        _atomic_write_json(args.output, [{f: r[f] for f in GT_FIELDS if f in r} for r in records])
+
+    failures = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.backend, args.model, args.project, args.retries)) as pool:
+        futures = {pool.submit(assess, nfr, args.timeout): nfr for nfr in todo}
+        try:
+            for i, future in enumerate(as_completed(futures), start=1):
+                nfr = futures[future]
+                try:
+                    done[nfr['id']] = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f"[{i}/{len(todo)}] NFR {nfr['id']} failed: {str(e)}")
+                    continue
+                save()
+                print(f"[{i}/{len(todo)}] NFR {nfr['id']}: {done[nfr['id']]['satisfaction_level']} "
+                      f"({time.time() - start:.0f}s)")
+        except KeyboardInterrupt:
+            print('Interrupted; finished assessments are saved, rerun to resume')
+            pool.shutdown(wait=False, cancel_futures=True)
+            sys.exit(130)
+
+    print(f"Wrote {len(done)} assessments to {args.output}" +
+          (f" ({failures} failed, rerun to retry them)" if failures else ''))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
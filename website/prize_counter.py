@@ -0,0 +1,52 @@
+import threading
+from typing import Any, Optional
+
+
+def _length(emails: Any) -> int:
+    return len(emails) if isinstance(emails, list) else 0
+
+
+class EmailPrizeCounter:
+    """
+    Number of prize emails collected, so the prize page needn't load the prize file.
+
+    `/api/submit_prize` calls `record` after appending an email, which bumps the
+    count without reading anything. When the file's version moved by more
+    than the `record`s it saw, the store's `changed_since` tells what was
+    written: Prolific prize entries leave the count alone, an `emails` write
+    (another worker process appending) re-reads just that list, and only a
+    replaced file (clear_all_data) means loading the whole file.
+    """
+
+    def __init__(self, store: Any, filepath: str):
+        """
+        Args:
+            store: The response store
+            filepath: The prize file in the store ({'prolific': {...}, 'emails': [...]})
+        """
+        self.store = store
+        self.filepath = filepath
+        self._count = 0
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        with self._lock:
+            version = self.store.version(self.filepath)
+            if version != self._version:
+                changed = None if self._version is None else self.store.changed_since(self.filepath, self._version)
+                if changed is None:
+                    self._count = _length(self.store.load(self.filepath).get('emails'))
+                elif 'emails' in changed:
+                    self._count = _length(self.store.get(self.filepath, 'emails'))
+                self._version = version
+            return self._count
+
+    def record(self) -> None:
+        """Count one email just appended to the file."""
+        with self._lock:
+            version = self.store.version(self.filepath)
+            # Only our own append moved the version; otherwise leave it for `count` to recount
+            if self._version is not None and version == self._version + 1:
+                self._count += 1
+                self._version = version
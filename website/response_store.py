@@ -0,0 +1,412 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from metrics import observe_json
+
+# Compact at least this often, or sooner once the journal grows past COMPACT_BYTES
+COMPACT_INTERVAL = 5.0
+COMPACT_BYTES = 4 * 1024 * 1024
+# Latest writes per file remembered for `changed_since`
+RECENT_CHANGES = 1024
+
+# File holding {session_id: [nfr response, ...]}; see feedback_for / replace_feedback / replace_batch_feedback
+FEEDBACK_FILENAME = 'nfr_responses.json'
+
+
+class ResponseStore:
+    """
+    Append-only journaled store for the `responses/*.json` files.
+
+    Every write is appended to a journal as one JSON line and fsynced, so the
+    cost of a write does not depend on how much data has been collected. The
+    store lock only covers the append and the in-memory update; the fsync runs
+    outside it, and writers that arrive while one is in flight share the next
+    one (group commit), so participants don't queue behind each other's disk
+    flushes. A write returns once its record is on disk (other requests may
+    read it from memory a moment earlier). The current state of every file is
+    kept in memory and rebuilt on startup from the last compacted files plus
+    the journal. A background thread periodically rewrites the compacted
+    `responses/*.json` files (same layout as before, so the analysis notebooks
+    keep working) and truncates the journal.
+
+    Stored values are never mutated in place: writers replace the top-level
+    entry with a new object (copying only that entry, so a write costs the
+    same however many participants there are), and the snapshots handed out
+    by `load` stay stable while other requests write.
+    """
+
+    def __init__(self, filepaths: List[str], journal_path: str,
+                 compact_interval: float = COMPACT_INTERVAL, compact_bytes: int = COMPACT_BYTES):
+        """
+        Args:
+            filepaths: The JSON files managed by the store (each holds a dict)
+            journal_path: Where to keep the append-only journal
+            compact_interval: Seconds between background compactions
+            compact_bytes: Journal size that triggers an early compaction
+        """
+        self.filepaths = list(filepaths)
+        self.journal_path = journal_path
+        self.compact_interval = compact_interval
+        self.compact_bytes = compact_bytes
+
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # Journal records written / known to be fsynced, and whether a writer is fsyncing for the others
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._sync_cond = threading.Condition()
+
+        self._data: Dict[str, Dict] = {}
+        self._versions: Dict[str, int] = {}
+        # filepath -> {top-level key: version it last changed at}, and the version of the last `replace`
+        self._key_versions: Dict[str, Dict[str, int]] = {}
+        self._replaced_at: Dict[str, int] = {}
+        # filepath -> (version, key) of the latest writes, so `changed_since` a recent version walks only those
+        self._recent: Dict[str, Deque[Tuple[int, str]]] = {}
+        self._dirty = set()
+        self._names = {os.path.basename(p): p for p in self.filepaths}
+        self.feedback_file = self._names.get(FEEDBACK_FILENAME)
+
+        for filepath in self.filepaths:
+            self._data[filepath] = self._read_file(filepath)
+            self._versions[filepath] = 0
+            self._key_versions[filepath] = {}
+            self._replaced_at[filepath] = 0
+            self._recent[filepath] = deque(maxlen=RECENT_CHANGES)
+        self._replay()
+
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        self._journal = open(journal_path, 'a', encoding='utf-8')
+        self._journal_bytes = self._journal.tell()
+
+    # ------------------------------------------------------------------ reads
+
+    def load(self, filepath: str) -> Dict:
+        """Return a shallow snapshot of a whole file (safe to iterate while others write)."""
+        with self._lock:
+            return dict(self._data[filepath])
+
+    def get(self, filepath: str, key: str, default: Any = None) -> Any:
+        """Return one top-level entry of a file. The value must be treated as read-only."""
+        with self._lock:
+            return self._data[filepath].get(key, default)
+
+    def contains(self, filepath: str, key: str) -> bool:
+        with self._lock:
+            return key in self._data[filepath]
+
+    def version(self, filepath: str) -> int:
+        """Monotonic counter bumped on every write to the file."""
+        with self._lock:
+            return self._versions[filepath]
+
+    def key_version(self, filepath: str, key: str) -> int:
+        """The file version at which a top-level entry was last written (0 if not since startup)."""
+        with self._lock:
+            return self._key_versions[filepath].get(key, 0)
+
+    def changed_since(self, filepath: str, version: int) -> Optional[List[str]]:
+        """Top-level keys written after `version`, in the order they were last written, or None if the whole file was replaced since."""
+        with self._lock:
+            if self._replaced_at[filepath] > version:
+                return None
+            recent = self._recent[filepath]
+            if not recent or recent[0][0] > version + 1:
+                # Older than what's kept: check every key
+                changed = {key: v for key, v in self._key_versions[filepath].items() if v > version}
+            else:
+                changed = {}
+                for v, key in reversed(recent):
+                    if v <= version:
+                        break
+                    changed.setdefault(key, v)
+            return sorted(changed, key=changed.get)
+
+    # ----------------------------------------------------------------- writes
+
+    def put(self, filepath: str, key: str, value: Any) -> None:
+        """Set a top-level entry, e.g. surveys[session_id] = data."""
+        self.set_in(filepath, [key], value)
+
+    def set_in(self, filepath: str, keys: List[str], value: Any) -> None:
+        """Set a nested entry, creating intermediate dicts, e.g. gate_answers[sid][batch][nfr]."""
+        record = {'f': os.path.basename(filepath), 'op': 'set', 'k': list(keys), 'v': value}
+        self._commit(filepath, lambda: record)
+
+    def append(self, filepath: str, key: str, value: Any) -> None:
+        """Append to the list stored under a top-level key, e.g. conversations[session_id]."""
+        def record():
+            current = self._data[filepath].get(key)
+            index = len(current) if isinstance(current, list) else 0
+            return {'f': os.path.basename(filepath), 'op': 'append', 'k': [key], 'i': index, 'v': value}
+        self._commit(filepath, record)
+
+    def replace(self, filepath: str, data: Dict) -> None:
+        """Replace a whole file, e.g. when the admin clears all data."""
+        record = {'f': os.path.basename(filepath), 'op': 'replace', 'v': data}
+        self._commit(filepath, lambda: record)
+
+    # ----------------------------------------------------------- nfr feedback
+
+    def feedback_for(self, session_id: str, batch: Any) -> List[Dict]:
+        """Return a participant's NFR responses for one batch."""
+        return [r for r in self.get(self.feedback_file, session_id, []) if r.get('batch') == batch]
+
+    def iter_feedback(self, batch: Any = None) -> Iterator[Tuple[str, Dict]]:
+        """Yield (session_id, response) for every NFR response (or those of one batch), grouped by participant."""
+        for session_id, entries in self.load(self.feedback_file).items():
+            for entry in entries if isinstance(entries, list) else []:
+                if isinstance(entry, dict) and (batch is None or entry.get('batch') == batch):
+                    yield session_id, entry
+
+    def replace_feedback(self, session_id: str, batch: Any, entries: List[Dict], nfr_id: Any) -> None:
+        """
+        Replace a participant's NFR response for one NFR of a batch with `entries`.
+
+        Args:
+            session_id: The participant
+            batch: Actual batch number the entries belong to
+            entries: New response dicts, appended after the participant's remaining responses
+            nfr_id: The NFR whose existing response is replaced (None matches responses without one)
+        """
+        self._replace_feedback(session_id, entries,
+                               lambda r: r.get('batch') == batch and r.get('nfr_id') == nfr_id)
+
+    def replace_batch_feedback(self, session_id: str, batch: Any, entries: List[Dict]) -> None:
+        """Replace all of a participant's NFR responses for a batch with `entries`."""
+        self._replace_feedback(session_id, entries, lambda r: r.get('batch') == batch)
+
+    def _replace_feedback(self, session_id: str, entries: List[Dict], replaced: Callable[[Dict], bool]) -> None:
+        def record():
+            kept = [r for r in self._data[self.feedback_file].get(session_id, []) if not replaced(r)]
+            return {'f': os.path.basename(self.feedback_file), 'op': 'set', 'k': [session_id], 'v': kept + list(entries)}
+        self._commit(self.feedback_file, record)
+
+    # ------------------------------------------------------------- compaction
+
+    def start(self) -> None:
+        """Start the background compaction thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._compact_loop, name='response-store-compactor', daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the compactor and write out everything still in the journal."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.compact()
+        with self._lock:
+            self._journal.close()
+
+    def compact(self) -> None:
+        """Rewrite dirty files from memory and drop the journal entries they cover."""
+        with self._compact_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = {filepath: dict(self._data[filepath]) for filepath in self._dirty}
+                self._dirty = set()
+                self._journal.flush()
+                offset = self._journal.tell()
+
+            try:
+                for filepath, data in snapshot.items():
+                    _atomic_write_json(filepath, data)
+            except Exception as e:
+                print(f"Error compacting response store: {str(e)}")
+                with self._lock:
+                    self._dirty.update(snapshot)
+                return
+
+            with self._lock:
+                # Keep whatever was journaled while the files were being written
+                self._journal.flush()
+                with open(self.journal_path, 'r', encoding='utf-8') as f:
+                    f.seek(offset)
+                    tail = f.read()
+                tmp_path = self.journal_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal.close()
+                os.replace(tmp_path, self.journal_path)
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                self._journal_bytes = self._journal.tell()
+
+    def _compact_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.compact_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error in response store compactor: {str(e)}")
+
+    # -------------------------------------------------------------- internals
+
+    def _commit(self, filepath: str, build: Callable[[], Dict]) -> None:
+        """
+        Journal and apply the record returned by `build`, then wait until it is on disk.
+
+        `build` runs under the lock, so records derived from the current state
+        (appends, feedback replacement) see every earlier write.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            record = build()
+            line = json.dumps(record) + '\n'
+            self._journal.write(line)
+            self._journal_bytes += len(line)
+            self._written += 1
+            seq = self._written
+            self._apply(filepath, record)
+            if self._journal_bytes >= self.compact_bytes:
+                self._wakeup.set()
+        self._sync(seq)
+        observe_json('append', self.journal_path, time.perf_counter() - start, len(line))
+
+    def _sync(self, seq: int) -> None:
+        """
+        Return once journal record `seq` has been fsynced.
+
+        One writer at a time fsyncs everything journaled so far, outside the
+        store lock; writers arriving meanwhile wait for it and, if their record
+        came in after it started, one of them fsyncs the next group.
+        """
+        with self._sync_cond:
+            while self._syncing and self._synced < seq:
+                self._sync_cond.wait()
+            if self._synced >= seq:
+                return
+            self._syncing = True
+        synced = 0
+        try:
+            with self._lock:
+                target = self._written
+                self._journal.flush()
+                # Compaction may swap the journal while we fsync; the old file's tail is fsynced there
+                fd = os.dup(self._journal.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            synced = target
+        finally:
+            with self._sync_cond:
+                self._synced = max(self._synced, synced)
+                self._syncing = False
+                self._sync_cond.notify_all()
+
+    def _apply(self, filepath: str, record: Dict) -> None:
+        """
+        Apply a journal record to the in-memory state. Caller holds the lock.
+
+        Records are idempotent so replaying a journal on top of files that were
+        already compacted (crash between the rewrite and the truncate) is safe:
+        `set`/`replace` converge, and `append` carries the list index it wrote.
+        """
+        op = record['op']
+        version = self._versions[filepath] + 1
+        if op == 'replace':
+            self._data[filepath] = dict(record['v']) if isinstance(record['v'], dict) else {}
+            self._key_versions[filepath] = {}
+            self._replaced_at[filepath] = version
+            self._recent[filepath].clear()
+        else:
+            keys = record['k']
+            if op == 'append':
+                current = self._data[filepath].get(keys[0])
+                items = current if isinstance(current, list) else []
+                if len(items) > record['i']:
+                    return
+                value = items + [record['v']]
+            else:
+                value = record['v']
+            # The file dict itself is updated in place; only the entry written is copied
+            data = self._data[filepath]
+            if len(keys) == 1:
+                data[keys[0]] = value
+            else:
+                child = data.get(keys[0])
+                data[keys[0]] = _copy_set(child if isinstance(child, dict) else {}, keys[1:], value)
+            self._key_versions[filepath][keys[0]] = version
+            self._recent[filepath].append((version, keys[0]))
+        self._versions[filepath] = version
+        self._dirty.add(filepath)
+
+    def _replay(self) -> None:
+        """Rebuild in-memory state by applying the journal on top of the compacted files."""
+        if not os.path.exists(self.journal_path):
+            return
+        count = 0
+        good_bytes = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line from a crash mid-write; everything before it is intact
+                    print(f"Skipping unreadable journal line in {self.journal_path}")
+                    break
+                good_bytes += len(line)
+                filepath = self._names.get(record.get('f'))
+                if filepath is None:
+                    continue
+                self._apply(filepath, record)
+                count += 1
+        if good_bytes < os.path.getsize(self.journal_path):
+            # Drop the torn tail so new records don't get glued onto it
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_bytes)
+        if count:
+            print(f"Replayed {count} journal entries from {self.journal_path}")
+
+    @staticmethod
+    def _read_file(filepath: str) -> Dict:
+        if os.path.exists(filepath):
+            start = time.perf_counter()
+            with open(filepath, 'r') as f:
+                data = json.load(f)
+                size = os.fstat(f.fileno()).st_size
+            observe_json('load', filepath, time.perf_counter() - start, size)
+            return data if isinstance(data, dict) else {}
+        return {}
+
+
+def _copy_set(data: Dict, keys: List[str], value: Any) -> Dict:
+    """Return a copy of `data` with value set at the key path, copying only the dicts along the path."""
+    updated = dict(data)
+    if len(keys) == 1:
+        updated[keys[0]] = value
+    else:
+        child = data.get(keys[0])
+        updated[keys[0]] = _copy_set(child if isinstance(child, dict) else {}, keys[1:], value)
+    return updated
+
+
+def _atomic_write_json(filepath: str, data: Any) -> None:
+    """Write JSON next to the target and rename it in place, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    start = time.perf_counter()
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+    os.replace(tmp_path, filepath)
+    observe_json('save', filepath, time.perf_counter() - start, size)
@@ -0,0 +1,171 @@
+import bisect
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Payload keys of the show_results viewers -> name of the response file they come from
+RESULT_SECTIONS = {
+    'conversations': 'conversation.json',
+    'nfr_responses': 'nfr_responses.json',
+    'surveys': 'satisfaction_survey.json',
+    'demographics': 'demographics.json',
+    'batch_assignments': 'user_batch_assignments.json',
+    'prolific_uuid_mapping': 'prolific_uuid_mapping.json',
+}
+# Everything a payload can hold: the file sections plus the derived ones
+PAYLOAD_SECTIONS = ('participants', 'nfr_text_map') + tuple(RESULT_SECTIONS)
+
+
+def _parse_ts(ts: Any) -> Optional[datetime]:
+    if not ts or not isinstance(ts, str):
+        return None
+    try:
+        # Handle ISO strings ending with 'Z' (UTC)
+        if ts.endswith('Z'):
+            ts = ts[:-1] + '+00:00'
+        return datetime.fromisoformat(ts)
+    except Exception:
+        return None
+
+
+def _earliest(turns: List, min_ts: Optional[datetime]) -> Optional[datetime]:
+    """Earliest user_time/bot_time among `turns`, starting from `min_ts`."""
+    for msg in turns:
+        if not isinstance(msg, dict):
+            continue
+        for key in ('user_time', 'bot_time'):
+            t = _parse_ts(msg.get(key))
+            if t and (min_ts is None or t < min_ts):
+                min_ts = t
+    return min_ts
+
+
+def _sort_key(min_ts: Optional[datetime], uuid: str) -> Tuple:
+    # UUIDs without timestamps go last, but stable by UUID
+    return (min_ts is None, min_ts or datetime.max, uuid)
+
+
+class FirstSeenIndex:
+    """
+    Participants ordered by their earliest conversation timestamp, kept up to date
+    incrementally.
+
+    Conversations only grow by appended turns, so `sync` remembers how many turns
+    of each participant it has looked at and parses just the new ones; the
+    sorted order is maintained with bisect. Reading the order is then
+    O(participants) instead of re-parsing every timestamp of every turn. A
+    participant whose turn list got shorter (rewritten) is rescanned.
+
+    Over a live response store, `sync_store` goes further and only looks at
+    the participants written since the previous call (the store's
+    `changed_since`), so other workers' writes don't mean reloading every
+    conversation.
+    """
+
+    def __init__(self):
+        self._seen: Dict[str, Tuple[int, Optional[datetime]]] = {}
+        self._order: List[Tuple] = []
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def sync(self, conversations: Dict) -> List[str]:
+        """Bring the index up to date with `conversations` and return the participant order."""
+        with self._lock:
+            self._sync_all(conversations)
+            return [key[2] for key in self._order]
+
+    def sync_store(self, store: Any, filepath: str) -> List[str]:
+        """Bring the index up to date with the conversations file of a response store and return the participant order."""
+        with self._lock:
+            version = store.version(filepath)
+            if version != self._version:
+                changed = None if self._version is None else store.changed_since(filepath, self._version)
+                if changed is None:
+                    self._sync_all(store.load(filepath))
+                else:
+                    for uuid in changed:
+                        self._update(uuid, store.get(filepath, uuid))
+                self._version = version
+            return [key[2] for key in self._order]
+
+    def _sync_all(self, conversations: Dict) -> None:
+        if not isinstance(conversations, dict):
+            conversations = {}
+        for uuid in [uuid for uuid in self._seen if uuid not in conversations]:
+            self._remove(uuid)
+        for uuid, turns in conversations.items():
+            self._update(uuid, turns)
+
+    def _update(self, uuid: str, turns: Any) -> None:
+        if turns is None:
+            if uuid in self._seen:
+                self._remove(uuid)
+            return
+        if not isinstance(turns, list):
+            turns = []
+        seen = self._seen.get(uuid)
+        if seen is not None and seen[0] == len(turns):
+            return
+        if seen is None or seen[0] > len(turns):
+            count, min_ts = 0, None
+        else:
+            count, min_ts = seen
+        new_min = _earliest(turns[count:], min_ts)
+        if seen is None or new_min != seen[1]:
+            if seen is not None:
+                self._remove(uuid)
+            bisect.insort(self._order, _sort_key(new_min, uuid))
+        self._seen[uuid] = (len(turns), new_min)
+
+    def _remove(self, uuid: str) -> None:
+        _, min_ts = self._seen.pop(uuid)
+        key = _sort_key(min_ts, uuid)
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+
+
+class ResultsService:
+    """
+    Data for the show_results viewers over one set of response files.
+
+    `load(filepath)` reads one file (the live response store, or the JSON file
+    cache for a frozen round); `files` maps each of RESULT_SECTIONS to its path.
+    """
+
+    def __init__(self, load: Callable[[str], Dict], files: Dict[str, str],
+                 nfr_text_map: Callable[[], Dict], store: Any = None):
+        """
+        Args:
+            load: Returns the parsed contents of a response file
+            files: Path of each section in RESULT_SECTIONS
+            nfr_text_map: Returns {nfr_id: description}
+            store: The live response store behind `load`, if any; lets the participant order follow its changes
+        """
+        self.load = load
+        self.files = files
+        self.nfr_text_map = nfr_text_map
+        self.store = store
+        self.first_seen = FirstSeenIndex()
+
+    def payload(self, sections: Optional[Iterable[str]] = None) -> Dict:
+        """
+        JSON body of /api/show_results*/data.
+
+        Args:
+            sections: Which of PAYLOAD_SECTIONS to include (default all); only their files are read
+        """
+        sections = set(PAYLOAD_SECTIONS if sections is None else sections)
+        body = {'status': 'success'}
+        if 'participants' in sections:
+            # Only UUIDs that have conversations, by their earliest timestamp (user_time/bot_time)
+            if self.store is not None:
+                body['participants'] = self.first_seen.sync_store(self.store, self.files['conversations'])
+            else:
+                body['participants'] = self.first_seen.sync(self.load(self.files['conversations']))
+        if 'nfr_text_map' in sections:
+            body['nfr_text_map'] = self.nfr_text_map()
+        for section in RESULT_SECTIONS:
+            if section in sections:
+                body[section] = self.load(self.files[section])
+        return body
@@ -1,34 +1,97 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from flask_caching import Cache
 import json
 import os
-import markdown
-from chatbot import Chatbot
+from chatbot import Chatbot, admission, agent_host, answer_cache
+from admission import Overloaded
+from response_store import ResponseStore
+from sqlite_store import SqliteResponseStore
+from json_cache import JsonFileCache
+from nfr_catalog import AssessmentIndex, CatalogLoader
+from agent_jobs import AgentJobQueue
+from session_pool import SessionPool
+from chatbot_registry import ChatbotRegistry
+from lock_manager import LockManager
+from results_service import PAYLOAD_SECTIONS, ResultsService
+from dataset_registry import DatasetRegistry
+from batch_allocator import BatchAllocator
+from peer_index import PeerDisagreementIndex
+from page_cache import PageCache
+from prize_counter import EmailPrizeCounter
+from export import EXPORT_FORMATS, csv_chunks, export_records, ndjson_chunks, parse_time
+from metrics import REQUEST_SECONDS, observe_json, registry as metrics_registry
+from session_registry import SessionRegistry, SharedJobTable
 from datetime import datetime
 import hashlib
+import time
+import gzip
 import math
 import random
+import atexit
+from contextlib import ExitStack, nullcontext
 from functools import wraps
 
 app = Flask(__name__, template_folder='html_files', static_folder='static')
 app.secret_key = 'your-secret-key-change-in-production'  # Change this in production
 
-# Configure cache
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+# MULTI_WORKER=1 lets several worker processes (e.g. `gunicorn -w 4 server:app`) serve the
+# same responses/ directory: responses go to the SQLite store, locks also hold across
+# processes (flock on files in LOCK_DIR), and chat sessions and agent jobs are registered
+# in the database so any worker can serve any UUID (see session_registry.py)
+MULTI_WORKER = os.environ.get('MULTI_WORKER') == '1'
+LOCK_DIR = os.environ.get('LOCK_DIR', 'responses/locks')
 
-# Initialize chatbot instances (stored by session ID)
-chatbots = {}
+# Configure cache
+if MULTI_WORKER:
+    cache = Cache(app, config={'CACHE_TYPE': 'FileSystemCache',
+                               'CACHE_DIR': os.environ.get('CACHE_DIR', 'responses/cache')})
+else:
+    cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+
+# Chatbot instances by session ID; idle ones are dropped and restored on demand
+CHATBOT_CACHE_SIZE = int(os.environ.get('CHATBOT_CACHE_SIZE', '256'))
+CHATBOT_IDLE_SECONDS = float(os.environ.get('CHATBOT_IDLE_SECONDS', '3600'))
+# A chatbot with a turn queued or running is kept: evicting it would let the next request
+# create a second instance for the session, with its own turn lock and history
+chatbots = ChatbotRegistry(capacity=CHATBOT_CACHE_SIZE, idle_ttl=CHATBOT_IDLE_SECONDS,
+                           is_busy=lambda chatbot: chatbot.turn_lock.locked()
+                           or agent_jobs.pending(chatbot.get_uuid()) > 0)
+
+# Agent turns run on the job queue rather than on the request thread (see /api/ask_chatbot);
+# how many run at once is AGENT_CONCURRENCY (see chatbot.py)
+CHATBOT_JOB_MAX_WAIT = 25  # seconds a /api/chatbot_job poll may block
+
+# Copilot sessions created and primed with instruction_prompt.txt ahead of time,
+# so a new participant doesn't wait for `create_chat` (SESSION_POOL_SIZE=0 disables)
+SESSION_POOL_SIZE = int(os.environ.get('SESSION_POOL_SIZE', '2'))
+SESSION_POOL_REFILL_SECONDS = float(os.environ.get('SESSION_POOL_REFILL_SECONDS', '5'))
+session_pool = SessionPool(Chatbot, size=SESSION_POOL_SIZE, refill_interval=SESSION_POOL_REFILL_SECONDS)
+
+@app.before_request
+def _start_session_pool():
+    # Started by the first request rather than at import, so processes that only import this
+    # module (the debug reloader's parent, test scripts) don't create sessions nobody uses
+    session_pool.start()
+
+if agent_host:
+    atexit.register(agent_host.close)
 
 # Admin authentication
 # Get admin password from environment variable or use default (CHANGE IN PRODUCTION!)
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'perc123Perclab')  # Change this default!
 ADMIN_PASSWORD_HASH = hashlib.sha256(ADMIN_PASSWORD.encode()).hexdigest()
 
+def _basic_auth_is_admin():
+    """HTTP Basic auth with the admin password (any user name), for scrapers that can't log in."""
+    auth = request.authorization
+    password = auth.password if auth and auth.type == 'basic' else None
+    return bool(password) and hashlib.sha256(password.encode()).hexdigest() == ADMIN_PASSWORD_HASH
+
 def require_admin(f):
     """Decorator to require admin authentication."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get('admin_authenticated'):
+        if not session.get('admin_authenticated') and not _basic_auth_is_admin():
             if request.path.startswith('/api/'):
                 return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
             return redirect(url_for('admin_login', next=request.url))
@@ -45,33 +108,37 @@ PRIZE_FILE = 'responses/prize.json'
 DEMOGRAPHICS_FILE = 'responses/demographics.json'
 BATCH_ASSIGNMENTS_FILE = 'responses/user_batch_assignments.json'
 FORCED_NFRS_FILE = 'forced.json'
+BATCH_ALLOCATION_FILE = 'batch_allocation.json'  # batch priority and capacity for new participants
 GATE_ANSWERS_FILE = 'responses/gate_answers.json'
+# The agent's assessment of each NFR in the GT schema, written offline by precompute.py
+PRECOMPUTED_ASSESSMENTS_FILE = os.environ.get('PRECOMPUTED_ASSESSMENTS_FILE', 'precomputed_assessments.json')
+JOURNAL_FILE = 'responses/journal.log'
+
+# Participant data lives in a journaled store: writes append to JOURNAL_FILE and the
+# files above are rewritten in the background (see response_store.py).
+# RESPONSE_BACKEND=sqlite keeps it in one SQLite database instead (see sqlite_store.py);
+# export it with `python sqlite_store.py export responses/responses.db <dir>`.
+# The journaled store keeps its state in process memory, so MULTI_WORKER requires sqlite.
+RESPONSE_BACKEND = os.environ.get('RESPONSE_BACKEND', 'sqlite' if MULTI_WORKER else 'journal')
+RESPONSE_DB_FILE = os.environ.get('RESPONSE_DB_FILE', 'responses/responses.db')
+if MULTI_WORKER and RESPONSE_BACKEND != 'sqlite':
+    raise RuntimeError('MULTI_WORKER=1 needs RESPONSE_BACKEND=sqlite')
+RESPONSE_FILES = [
+    CONVERSATION_FILE,
+    NFR_RESPONSES_FILE,
+    PROLIFIC_UUID_MAPPING_FILE,
+    SATISFACTION_FILE,
+    PRIZE_FILE,
+    DEMOGRAPHICS_FILE,
+    BATCH_ASSIGNMENTS_FILE,
+    GATE_ANSWERS_FILE,
+]
 
 # How many NFRs should force an independent assessment per participant
 FORCED_ASSESSMENT_RATIO = 0.2  # 40% of NFRs in the batch
 MIN_FORCED_ASSESSMENTS = 1     # Always force at least one
 
 
-def build_batch_participants(assignments):
-    """Return mapping of actual batch -> ordered list of participant UUIDs."""
-    participants_by_batch = {}
-    for user_uuid, batches in assignments.items():
-        for batch_num in batches:
-            participants_by_batch.setdefault(batch_num, [])
-            if user_uuid not in participants_by_batch[batch_num]:
-                participants_by_batch[batch_num].append(user_uuid)
-    return participants_by_batch
-
-
-def get_participant_index(uuid, actual_batch, assignments):
-    """Return 1-based participant index (1 or 2) within a batch for a UUID."""
-    participants_by_batch = build_batch_participants(assignments)
-    participants = participants_by_batch.get(actual_batch, [])
-    if uuid in participants:
-        return participants.index(uuid) + 1
-    return None
-
-
 def compute_forced_assessment_nfrs(nfr_list, actual_batch, uuid, participant_index):
     """Deterministically pick a subset of NFR IDs that must include independent assessments."""
     if not nfr_list or not uuid:
@@ -85,100 +152,99 @@ def compute_forced_assessment_nfrs(nfr_list, actual_batch, uuid, participant_ind
     return [nfr.get('id') for nfr in selected if isinstance(nfr, dict) and 'id' in nfr]
 
 
-def compute_peer_required_nfrs(actual_batch, participant_index, assignments):
+def compute_peer_required_nfrs(actual_batch, participant_index):
     """If current user is participant 2, find NFRs where participant 1 disagreed but gave no assessment."""
     empty = {'q1': [], 'q2': [], 'q3': []}
     if participant_index != 2:
         return empty
 
-    participants_by_batch = build_batch_participants(assignments)
-    participants = participants_by_batch.get(actual_batch, [])
+    participants = batch_allocator.participants(actual_batch)
     if not participants:
         return empty
 
     primary_uuid = participants[0]
-    responses = load_json_file(NFR_RESPONSES_FILE)
-    peer_responses = responses.get(primary_uuid, [])
-    peer_required = {'q1': set(), 'q2': set(), 'q3': set()}
+    return peer_index.required(primary_uuid, actual_batch)
 
-    for entry in peer_responses:
-        if entry.get('batch') != actual_batch:
-            continue
-        nfr_id = entry.get('nfr_id')
-        for q_key in ('q1', 'q2', 'q3'):
-            agreement = entry.get(f"{q_key}_agreement")
-            own_assessment = (entry.get(f"{q_key}_own_assessment") or '').strip()
-            if agreement and agreement != 'Agree' and not own_assessment:
-                peer_required[q_key].add(nfr_id)
+# Writes lock only the file, or the participant within it, that they touch (see lock_manager.py);
+# with MULTI_WORKER the locks are shared by every worker process
+locks = LockManager(lock_dir=LOCK_DIR if MULTI_WORKER else None)
 
-    return {k: sorted([n for n in v if n is not None]) for k, v in peer_required.items()}
+# Parsed JSON shared across requests; revalidated against the file's mtime/size on every read
+json_cache = JsonFileCache()
 
-from threading import Lock
-lock = Lock()
+# NFR.json indexed once and rebuilt when the file changes
+nfr_catalog = CatalogLoader(NFR_FILE)
+# precompute.py's output, indexed by NFR id and reloaded when the file is rewritten
+precomputed_assessments = CatalogLoader(PRECOMPUTED_ASSESSMENTS_FILE, build=AssessmentIndex)
 
 def load_json_file(filepath):
-    """Load JSON file, return empty dict if file doesn't exist."""
-    if os.path.exists(filepath):
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    return {}
+    """Load JSON file (cached, do not mutate the result), return empty dict if file doesn't exist."""
+    return json_cache.load(filepath)
 
 def save_json_file(filepath, data):
     """Save data to JSON file."""
     os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else '.', exist_ok=True)
+    start = time.perf_counter()
     with open(filepath, 'w') as f:
         json.dump(data, f, indent=2)
+        size = f.tell()
+    observe_json('save', filepath, time.perf_counter() - start, size)
+    json_cache.invalidate(filepath)
+
+def _normalize_prizes(prizes):
+    """Ensure prizes has 'prolific' (dict keyed by session_id) and 'emails' (list)."""
+    if isinstance(prizes, dict) and 'prolific' in prizes and 'emails' in prizes:
+        return prizes
+    # Old format: whole dict was keyed by session_id (prolific only)
+    return {'prolific': prizes if isinstance(prizes, dict) else {}, 'emails': []}
+
+# Workers starting together must not both import the JSON files into a new database
+with locks.write(RESPONSE_DB_FILE):
+    if RESPONSE_BACKEND == 'sqlite':
+        _new_db = not os.path.exists(RESPONSE_DB_FILE)
+        store = SqliteResponseStore(RESPONSE_FILES, RESPONSE_DB_FILE)
+        if _new_db:
+            store.import_directory(os.path.dirname(CONVERSATION_FILE))
+    else:
+        store = ResponseStore(RESPONSE_FILES, JOURNAL_FILE)
+    # Prize writes below assume the {'prolific': ..., 'emails': ...} layout; migrate old files once
+    _prizes = store.load(PRIZE_FILE)
+    if _normalize_prizes(_prizes) is not _prizes:
+        store.replace(PRIZE_FILE, _normalize_prizes(_prizes))
+store.start()
+atexit.register(store.close)
+
+# Which worker is running a turn for each chat session, and agent jobs any worker can poll
+session_registry = SessionRegistry(RESPONSE_DB_FILE) if MULTI_WORKER else None
+agent_jobs = AgentJobQueue(admission=admission,
+                           shared=SharedJobTable(RESPONSE_DB_FILE) if MULTI_WORKER else None)
+
+# Participant 1's unexplained disagreements per (batch, question), kept current by the
+# feedback handlers (see peer_index.py)
+peer_index = PeerDisagreementIndex(store, NFR_RESPONSES_FILE)
+
+# Prize emails collected so far, counted as they are submitted (see prize_counter.py)
+EMAIL_PRIZE_LIMIT = 15
+email_prizes = EmailPrizeCounter(store, PRIZE_FILE)
+
+# Batch occupancy and participant order, kept in memory (see batch_allocator.py)
+batch_allocator = BatchAllocator(store, BATCH_ASSIGNMENTS_FILE,
+                                 lambda: load_json_file(BATCH_ALLOCATION_FILE),
+                                 lambda: nfr_catalog.get().total_batches)
 
 def assign_batches_to_user(uuid):
-    """Assign 1 batch to a new user, ensuring each batch has exactly 2 users.
-    Picks the first available batch (lowest batch number among those with < 2 users)."""
-    with lock:
-        assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
-
-        if uuid in assignments:
-            return assignments[uuid]
-
-        with open(NFR_FILE, 'r') as f:
-            all_batches = json.load(f)
-        total_batches = len(all_batches)
-
-        batch_user_count = {}
-        for user_uuid, user_batches in assignments.items():
-            for batch_num in user_batches:
-                batch_user_count[batch_num] = batch_user_count.get(batch_num, 0) + 1
-
-        # First available batch, with preferred batches taking priority
-        preferred_batches = [2, 10, 5, 9, 12, 8]
-        candidate_batches = [
-            b for b in preferred_batches if 1 <= b <= total_batches
-        ] + [
-            b for b in range(1, total_batches + 1) if b not in preferred_batches
-        ]
-        candidate_batches = [7, 12, 13, 15]
-
-        selected_batch = None
-        for batch_num in candidate_batches:
-            if batch_user_count.get(batch_num, 0) < 2:
-                selected_batch = batch_num
-                break
-
-        if selected_batch is None:
-            selected_batch = 7
-
-        assigned = [selected_batch]
-        assignments[uuid] = assigned
-        save_json_file(BATCH_ASSIGNMENTS_FILE, assignments)
-        return assigned
+    """Assign 1 batch to a new user: the first batch in batch_allocation.json's priority
+    order that is below its capacity."""
+    with locks.write(BATCH_ASSIGNMENTS_FILE):
+        return batch_allocator.assign(uuid)
 
 def get_user_assigned_batch(uuid, requested_batch_num):
     """Get the actual batch number for a user's requested batch (1, 2, or 3)."""
-    assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
-    
-    if uuid not in assignments:
-        # No assignments yet, assign them
-        assignments[uuid] = assign_batches_to_user(uuid)
+    user_batches = batch_allocator.batches_of(uuid)
     
-    user_batches = assignments[uuid]
+    if user_batches is None:
+        # No assignments yet, assign them (takes the write lock itself)
+        user_batches = assign_batches_to_user(uuid)
     
     # requested_batch_num is 1-indexed (1, 2, or 3)
     if 1 <= requested_batch_num <= len(user_batches):
@@ -191,97 +257,100 @@ def get_chatbot(uuid=None):
     """Get or create chatbot instance. If UUID provided, restore that chatbot."""
     if uuid:
         # Restore chatbot with provided UUID
-        if uuid not in chatbots:
-            # Pass UUID to constructor to resume the existing copilot session
-            chatbot = Chatbot(uuid=uuid)
-            chatbots[uuid] = chatbot
-            # Load chat history from JSON file
-            conversations = load_json_file(CONVERSATION_FILE)
-            if uuid in conversations:
-                chatbot.chat_history = conversations[uuid]
-        return chatbots[uuid]
-    else:
-        # Create new chatbot (only when no UUID provided)
-        chatbot = Chatbot()
-        new_uuid = chatbot.get_uuid()
-        chatbots[new_uuid] = chatbot
+        chatbot = chatbots.get(uuid)
+        if chatbot is None:
+            # Pass UUID to constructor to resume the existing copilot session; its
+            # history is read from the response store only if something asks for it
+            chatbot = Chatbot(uuid=uuid, history_loader=lambda: store.get(CONVERSATION_FILE, uuid, []))
+            chatbot = chatbots.add(uuid, chatbot)
+            if session_registry:
+                session_registry.register(uuid)
         return chatbot
+    else:
+        # Create new chatbot (only when no UUID provided), preferably one already primed
+        chatbot = session_pool.acquire()
+        if session_registry:
+            session_registry.register(chatbot.get_uuid())
+        return chatbots.add(chatbot.get_uuid(), chatbot)
 
 def get_session_id(uuid=None):
     """Get session ID from chatbot UUID."""
     chatbot = get_chatbot(uuid)
     return chatbot.get_uuid()
 
+# Rendered participant pages, reused until their template or markdown changes (see page_cache.py)
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', '256'))
+page_cache = PageCache(capacity=PAGE_CACHE_SIZE)
+# Templates every page is rendered from besides its own
+BASE_TEMPLATES = ['base.html', 'tutorial_modal.html']
+
+def cached_page(template, markdown_files=None, **context):
+    """Render `template` through the page cache and serve it with a strong ETag (304 if unchanged).
+    `markdown_files` maps template variables to markdown files rendered into them.
+    `context` is part of the cache key, so it may only hold values with a few possible settings
+    (flags, batch numbers); per-participant values such as the PROLIFIC_PID or the tutorial page
+    are never rendered in, the page's own script reads them from the URL or localStorage."""
+    markdown_files = markdown_files or {}
+    sources = [os.path.join(app.root_path, app.template_folder, name) for name in [template] + BASE_TEMPLATES]
+    sources += markdown_files.values()
+
+    def render():
+        rendered = {name: page_cache.markdown(path) for name, path in markdown_files.items()}
+        return render_template(template, **rendered, **context)
+
+    key = (template, tuple(sources), tuple(sorted(context.items())))
+    body, etag = page_cache.page(key, sources, render)
+    response = app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    # Revalidate every time, so an edited consent form shows up on the next visit
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def consent_response():
+    prolific = bool(request.args.get('PROLIFIC_PID'))
+    consent_file = 'consent_forms/consent_prolific.md' if prolific else 'consent_forms/consent_um.md'
+    return cached_page('consent.html', markdown_files={'consent_html': consent_file}, prolific_id=prolific)
+
 @app.route('/')
 def index():
     """Show consent form."""
-    prolific_pid = request.args.get('PROLIFIC_PID')
-    prolific = bool(prolific_pid)
-    consent_file = 'consent_forms/consent_prolific.md' if prolific else 'consent_forms/consent_um.md'
-    
-    with open(consent_file, 'r') as f:
-        consent_text = f.read()
-    
-    # Convert markdown to HTML with extensions for proper list rendering
-    try:
-        consent_html = markdown.markdown(consent_text, extensions=['extra', 'nl2br'])
-    except:
-        # Fallback if extensions not available
-        consent_html = markdown.markdown(consent_text)
-    return render_template('consent.html', consent_html=consent_html, prolific_id=prolific, prolific_pid=prolific_pid)
+    return consent_response()
 
 @app.route('/consent')
 def consent_page():
     """Show consent form."""
-    prolific_pid = request.args.get('PROLIFIC_PID')
-    prolific = bool(prolific_pid)
-    consent_file = 'consent_forms/consent_prolific.md' if prolific else 'consent_forms/consent_um.md'
-    
-    with open(consent_file, 'r') as f:
-        consent_text = f.read()
-    
-    # Convert markdown to HTML with extensions for proper list rendering
-    try:
-        consent_html = markdown.markdown(consent_text, extensions=['extra', 'nl2br'])
-    except:
-        # Fallback if extensions not available
-        consent_html = markdown.markdown(consent_text)
-    return render_template('consent.html', consent_html=consent_html, prolific_id=prolific, prolific_pid=prolific_pid)
+    return consent_response()
 
 @app.route('/tutorial')
 def tutorial():
-    """Tutorial page."""
-    page = request.args.get('page', '1')
-    # Open tutorial modal if requested
-    show_modal = request.args.get('modal') == 'true'
-    return render_template('tutorial.html', page=page, show_modal=show_modal)
+    """Tutorial page (its script restores the page from localStorage and reads modal=true from the URL)."""
+    return cached_page('tutorial.html')
 
 @app.route('/evaluation')
 def evaluation():
     """Evaluation page with chatbot and NFR form."""
     batch = int(request.args.get('batch', 1))
-    return render_template('evaluation.html', batch=batch)
+    return cached_page('evaluation.html', batch=batch)
 
 @app.route('/survey')
 def survey():
     """Satisfaction survey page."""
-    return render_template('survey.html')
+    return cached_page('survey.html')
 
 @app.route('/prize')
 def prize():
-    """Prize collection page. Non-Prolific: show email form only if fewer than 15 emails collected."""
+    """Prize collection page. Non-Prolific: show email form only if fewer than EMAIL_PRIZE_LIMIT emails collected."""
     prolific = request.args.get('id') == 'prolific'
     email_prize_available = True
     if not prolific:
-        prizes = _normalize_prizes(load_json_file(PRIZE_FILE))
-        email_prize_available = len(prizes.get('emails', [])) < 15
-    return render_template('prize.html', prolific_id=prolific, email_prize_available=email_prize_available)
+        email_prize_available = email_prizes.count() < EMAIL_PRIZE_LIMIT
+    return cached_page('prize.html', prolific_id=prolific, email_prize_available=email_prize_available)
 
 @app.route('/complete')
 def complete():
     """Study completion page."""
     prolific = request.args.get('id') == 'prolific'
-    return render_template('completion.html', prolific_id=prolific)
+    return cached_page('completion.html', prolific_id=prolific)
 
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -326,15 +395,10 @@ def get_requirements():
     requested_batch = int(request.args.get('batch', 1))
     uuid = request.args.get('uuid')
     
-    # Get user's assigned batches
-    assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
+    # Get user's assigned batches (assigning them on first contact)
+    user_batches = None
     if uuid:
-        if uuid not in assignments:
-            # Assign batches to new user
-            assign_batches_to_user(uuid)
-            assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
-        
-        user_batches = assignments.get(uuid, [])
+        user_batches = batch_allocator.batches_of(uuid) or assign_batches_to_user(uuid)
         
         # Map requested batch (1-3) to actual assigned batch
         if 1 <= requested_batch <= len(user_batches):
@@ -345,232 +409,269 @@ def get_requirements():
         # No UUID provided, use requested batch directly
         actual_batch = requested_batch
     
-    with open(NFR_FILE, 'r') as f:
-        all_batches = json.load(f)
-    
-    # NFR.json is now an array of batches (each batch is an array of NFRs)
-    if actual_batch <= len(all_batches):
-        batch_nfrs = all_batches[actual_batch - 1].copy()  # Make a copy to avoid modifying original
-    else:
-        batch_nfrs = []
+    catalog = nfr_catalog.get()
+    batch_nfrs = catalog.batch(actual_batch)
 
-    participant_index = get_participant_index(uuid, actual_batch, assignments) if uuid else None
+    participant_index = batch_allocator.participant_index(uuid, actual_batch) if uuid else None
     forced_assessment_nfr_ids = compute_forced_assessment_nfrs(batch_nfrs, actual_batch, uuid, participant_index)
-    peer_required_by_question = compute_peer_required_nfrs(actual_batch, participant_index, assignments) if uuid else {'q1': [], 'q2': [], 'q3': []}
+    peer_required_by_question = compute_peer_required_nfrs(actual_batch, participant_index) if uuid else {'q1': [], 'q2': [], 'q3': []}
     forced_nfrs = load_json_file(FORCED_NFRS_FILE)
     if not isinstance(forced_nfrs, list):
         forced_nfrs = []
+    # The agent's precomputed assessments of the batch's NFRs (see /api/nfr_assessment), so the
+    # page needn't ask for each one; NFRs without one are left out
+    assessments = precomputed_assessments.get()
+    batch_assessments = {}
+    for nfr in batch_nfrs:
+        record = assessments.get(nfr.get('id'), nfr.get('description'))
+        if record is not None:
+            batch_assessments[nfr['id']] = record
     
-    # Calculate total NFRs
-    total_nfrs = sum(len(b) for b in all_batches)
-    
-    return jsonify({
-        'nfrs': batch_nfrs,
+    # The batch's NFRs are spliced in pre-serialized from the catalog
+    body = json.dumps({
         'batch': requested_batch,  # Return requested batch (1-3) for display
         'actual_batch': actual_batch,  # Return actual batch number
-        'total_batches': len(user_batches) if uuid and uuid in assignments else len(all_batches),
-        'total_nfrs': total_nfrs,
-        'assigned_batches': user_batches if uuid and uuid in assignments else [],
+        'total_batches': len(user_batches) if user_batches is not None else catalog.total_batches,
+        'total_nfrs': catalog.total_nfrs,
+        'assigned_batches': user_batches if user_batches is not None else [],
         'participant_index': participant_index,
         'force_assessment_nfr_ids': forced_assessment_nfr_ids,
         'peer_required_by_question': peer_required_by_question,
-        'forced_nfrs': forced_nfrs
+        'forced_nfrs': forced_nfrs,
+        'assessments': batch_assessments
     })
+    body = '{"nfrs": ' + catalog.batch_json(actual_batch) + ', ' + body[1:]
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/nfr_assessment/<int:nfr_id>', methods=['GET'])
+def get_nfr_assessment(nfr_id):
+    """The agent's precomputed assessment of an NFR (satisfaction_level, reasoning, code_location),
+    so opening an NFR needn't wait for a live agent turn. 404 until precompute.py has assessed it."""
+    nfr = nfr_catalog.get().by_id.get(nfr_id)
+    # None if it was assessed before the NFR was reworded
+    record = precomputed_assessments.get().get(nfr_id, nfr.get('description') if nfr is not None else None)
+    if record is not None:
+        return jsonify({'status': 'success', 'assessment': record})
+    return jsonify({'status': 'error', 'message': 'No precomputed assessment for this NFR'}), 404
 
 @app.route('/api/submit_nfr_feedback', methods=['POST'])
 def submit_nfr_feedback():
     """Save NFR feedback. Accepts either single feedback or batch of feedbacks."""
 
-    with lock:
-        try:
-            data = request.json
-            if not data:
-                return jsonify({'status': 'error', 'message': 'No data provided'}), 400
-            
-            uuid = data.get('uuid')
-            if not uuid:
-                return jsonify({'status': 'error', 'message': 'UUID is required'}), 400
-            
-            session_id = get_session_id(uuid)
-            
-            # Load existing responses
-            responses = load_json_file(NFR_RESPONSES_FILE)
-            
-            if session_id not in responses:
-                responses[session_id] = []
-            
-            # Check if this is a batch submission (array) or single submission
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+        
+        uuid = data.get('uuid')
+        if not uuid:
+            return jsonify({'status': 'error', 'message': 'UUID is required'}), 400
+        
+        session_id = get_session_id(uuid)
+        
+        # Check if this is a batch submission (array) or single submission
+        with locks.write(NFR_RESPONSES_FILE, session_id):
             if isinstance(data, list):
-                # Batch submission - process all items
+                # Batch submission - replace all existing entries for this batch
                 batch = data[0].get('batch') if data else None
-                # Remove all existing entries for this batch
-                responses[session_id] = [
-                    r for r in responses[session_id] 
-                    if r.get('batch') != batch
-                ]
-                # Add all new entries
-                responses[session_id].extend(data)
+                store.replace_batch_feedback(session_id, batch, data)
             else:
-                # Single submission
-                nfr_id = data.get('nfr_id')
-                batch = data.get('batch')
-                
-                # Remove existing entry for this NFR in this batch if it exists
-                responses[session_id] = [
-                    r for r in responses[session_id] 
-                    if not (r.get('nfr_id') == nfr_id and r.get('batch') == batch)
-                ]
-                
-                # Add new entry
-                responses[session_id].append(data)
-            
-            save_json_file(NFR_RESPONSES_FILE, responses)
-            
-            if isinstance(data, list):
-                return jsonify({'status': 'success', 'count': len(data)})
-            else:
-                return jsonify({'status': 'success', 'nfr_id': data.get('nfr_id')})
-        except Exception as e:
-            print(f"Error in submit_nfr_feedback: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+                # Single submission - replace existing entry for this NFR in this batch if it exists
+                store.replace_feedback(session_id, data.get('batch'), [data], nfr_id=data.get('nfr_id'))
+            peer_index.update(session_id)
+        
+        if isinstance(data, list):
+            return jsonify({'status': 'success', 'count': len(data)})
+        else:
+            return jsonify({'status': 'success', 'nfr_id': data.get('nfr_id')})
+    except Exception as e:
+        print(f"Error in submit_nfr_feedback: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/submit_batch_feedback', methods=['POST'])
 def submit_batch_feedback():
     """Save batch of NFR feedbacks in one request to avoid race conditions."""
 
-    with lock:
-        try:
-            data_list = request.json
-            if not data_list or not isinstance(data_list, list):
-                return jsonify({'status': 'error', 'message': 'Array of feedback data required'}), 400
-            
-            if not data_list:
-                return jsonify({'status': 'error', 'message': 'Empty array'}), 400
-            
-            uuid = data_list[0].get('uuid')
-            if not uuid:
-                return jsonify({'status': 'error', 'message': 'UUID is required'}), 400
-            
-            session_id = get_session_id(uuid)
-            requested_batch = data_list[0].get('batch')  # This is 1, 2, or 3
-            
-            # Get actual batch number from assignments
-            assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
-            if uuid in assignments:
-                user_batches = assignments[uuid]
-                if 1 <= requested_batch <= len(user_batches):
-                    actual_batch = user_batches[requested_batch - 1]
-                else:
-                    actual_batch = user_batches[0] if user_batches else requested_batch
+    try:
+        data_list = request.json
+        if not data_list or not isinstance(data_list, list):
+            return jsonify({'status': 'error', 'message': 'Array of feedback data required'}), 400
+        
+        if not data_list:
+            return jsonify({'status': 'error', 'message': 'Empty array'}), 400
+        
+        uuid = data_list[0].get('uuid')
+        if not uuid:
+            return jsonify({'status': 'error', 'message': 'UUID is required'}), 400
+        
+        session_id = get_session_id(uuid)
+        requested_batch = data_list[0].get('batch')  # This is 1, 2, or 3
+        
+        # Get actual batch number from assignments
+        user_batches = batch_allocator.batches_of(uuid)
+        if user_batches is not None:
+            if 1 <= requested_batch <= len(user_batches):
+                actual_batch = user_batches[requested_batch - 1]
+            else:
+                actual_batch = user_batches[0] if user_batches else requested_batch
+        else:
+            actual_batch = requested_batch
+        
+        # Update all entries to use actual batch number
+        for entry in data_list:
+            entry['batch'] = actual_batch
+        
+        # Replace all existing entries for this actual batch with the new ones
+        with locks.write(NFR_RESPONSES_FILE, session_id):
+            store.replace_batch_feedback(session_id, actual_batch, data_list)
+            peer_index.update(session_id)
+
+        # Update forced NFRs: force when user disagrees on Q2 or Q3 and leaves that question without an assessment
+        #TODO
+        '''
+        loaded_forced = load_json_file(FORCED_NFRS_FILE)
+        forced_nfrs = set(loaded_forced) if isinstance(loaded_forced, list) else set()
+        additions = 0
+
+        for entry in data_list:
+            nfr_id = entry.get('nfr_id')
+            if nfr_id is None:
+                continue
+
+            q2_agree = entry.get('q2_agreement')
+            q3_agree = entry.get('q3_agreement')
+            q2_own = (entry.get('q2_own_assessment') or '').strip()
+            q3_own = (entry.get('q3_own_assessment') or '').strip()
+
+            disagree_q2 = bool(q2_agree and q2_agree != 'Agree')
+            disagree_q3 = bool(q3_agree and q3_agree != 'Agree')
+            disagrees = disagree_q2 or disagree_q3
+            misssing = not q2_own or not q3_own
+            #missing_q2 = disagree_q2 and not q2_own
+            #missing_q3 = disagree_q3 and not q3_own
+
+            should_force = disagrees and misssing
+
+            if should_force:
+                if additions < 2 and nfr_id not in forced_nfrs:
+                    forced_nfrs.add(nfr_id)
+                    additions += 1
             else:
-                actual_batch = requested_batch
-            
-            # Load existing responses
-            responses = load_json_file(NFR_RESPONSES_FILE)
-            
-            if session_id not in responses:
-                responses[session_id] = []
-            
-            # Remove all existing entries for this actual batch
-            responses[session_id] = [
-                r for r in responses[session_id] 
-                if r.get('batch') != actual_batch
-            ]
-            
-            # Update all entries to use actual batch number
-            for entry in data_list:
-                entry['batch'] = actual_batch
-            
-            # Add all new entries
-            responses[session_id].extend(data_list)
-            save_json_file(NFR_RESPONSES_FILE, responses)
-
-            # Update forced NFRs: force when user disagrees on Q2 or Q3 and leaves that question without an assessment
-            #TODO
-            '''
-            loaded_forced = load_json_file(FORCED_NFRS_FILE)
-            forced_nfrs = set(loaded_forced) if isinstance(loaded_forced, list) else set()
-            additions = 0
-
-            for entry in data_list:
-                nfr_id = entry.get('nfr_id')
-                if nfr_id is None:
-                    continue
-
-                q2_agree = entry.get('q2_agreement')
-                q3_agree = entry.get('q3_agreement')
-                q2_own = (entry.get('q2_own_assessment') or '').strip()
-                q3_own = (entry.get('q3_own_assessment') or '').strip()
-
-                disagree_q2 = bool(q2_agree and q2_agree != 'Agree')
-                disagree_q3 = bool(q3_agree and q3_agree != 'Agree')
-                disagrees = disagree_q2 or disagree_q3
-                misssing = not q2_own or not q3_own
-                #missing_q2 = disagree_q2 and not q2_own
-                #missing_q3 = disagree_q3 and not q3_own
-
-                should_force = disagrees and misssing
-
-                if should_force:
-                    if additions < 2 and nfr_id not in forced_nfrs:
-                        forced_nfrs.add(nfr_id)
-                        additions += 1
-                else:
-                    forced_nfrs.discard(nfr_id)
-
-            # Enforce a hard cap of 2 forced NFRs
-            if len(forced_nfrs) > 2:
-                forced_nfrs = set(sorted(forced_nfrs)[:2])
-
-            save_json_file(FORCED_NFRS_FILE, sorted(forced_nfrs))
-            '''
-            
-            
-            return jsonify({'status': 'success', 'count': len(data_list)})
-        except Exception as e:
-            print(f"Error in submit_batch_feedback: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+                forced_nfrs.discard(nfr_id)
+
+        # Enforce a hard cap of 2 forced NFRs
+        if len(forced_nfrs) > 2:
+            forced_nfrs = set(sorted(forced_nfrs)[:2])
+
+        save_json_file(FORCED_NFRS_FILE, sorted(forced_nfrs))
+        '''
+        
+        
+        return jsonify({'status': 'success', 'count': len(data_list)})
+    except Exception as e:
+        print(f"Error in submit_batch_feedback: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+def run_chatbot_turn(chatbot, user_message, on_chunk=None):
+    """Ask the agent and persist the turn to the conversation file. Runs on an agent worker."""
+    session_id = chatbot.get_uuid()
+    # Other worker processes may hold the same session; the lease keeps their turns apart
+    with chatbot.turn_lock, (session_registry.turn(session_id) if session_registry else nullcontext()):
+        response = chatbot.ask_chatbot(user_message, on_chunk=on_chunk)
+        
+        # Save conversation - get the last entry from chat history which has both timestamps
+        with locks.write(CONVERSATION_FILE, session_id):
+            # The turn just taken has the correct timestamps
+            last_entry = chatbot.last_turn
+            if last_entry:
+                entry = {
+                    'user_message': last_entry['user_message'],
+                    'bot_reply': last_entry['bot_reply'],
+                    'user_time': last_entry['user_time'],
+                    'bot_time': last_entry['bot_time']
+                }
+                # Answered from the answer cache; the next live turn replays it to the agent
+                if last_entry.get('cached'):
+                    entry['cached'] = True
+                store.append(CONVERSATION_FILE, session_id, entry)
+            elif not store.contains(CONVERSATION_FILE, session_id):
+                store.put(CONVERSATION_FILE, session_id, [])
+    
+    # Return response with UUID
+    response['uuid'] = session_id
+    return response
+
 @app.route('/api/ask_chatbot', methods=['POST'])
 def ask_chatbot():
-    """Handle chatbot requests."""
+    """Queue a chatbot request and return its job id; poll /api/chatbot_job/<job_id> for the reply."""
     data = request.json
     user_message = data.get('message', '')
     uuid = data.get('uuid')
     
     chatbot = get_chatbot(uuid)
-    response = chatbot.ask_chatbot(user_message)
-    
-    # Save conversation - get the last entry from chat history which has both timestamps
     session_id = chatbot.get_uuid()
+    job_id = agent_jobs.submit(session_id, lambda on_chunk: run_chatbot_turn(chatbot, user_message))
+    return jsonify({'status': 'queued', 'job_id': job_id, 'uuid': session_id}), 202
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_chatbot_job(job_id):
+    """Server-sent events for a chatbot job: `job`, then `chunk`s, then `done` or `error`."""
+    job = agent_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+
+    def generate():
+        yield _sse('job', {'job_id': job_id, 'uuid': job['session_id']})
+        for event, payload in agent_jobs.stream(job_id):
+            if event == 'chunk':
+                yield _sse('chunk', {'text': payload})
+            elif event == 'heartbeat':
+                yield ': keep-alive\n\n'
+            elif event == 'done':
+                yield _sse('done', {'status': 'done', 'job_id': job_id, **payload})
+            else:
+                yield _sse('error', {'status': 'error', 'job_id': job_id, 'message': payload})
 
-    with lock:
-        conversations = load_json_file(CONVERSATION_FILE)
-        
-        if session_id not in conversations:
-            conversations[session_id] = []
-        
-        # Get the last chat entry which has the correct timestamps
-        chat_history = chatbot.get_chat_history()
-        if chat_history:
-            last_entry = chat_history[-1]
-            conversations[session_id].append({
-                'user_message': last_entry['user_message'],
-                'bot_reply': last_entry['bot_reply'],
-                'user_time': last_entry['user_time'],
-                'bot_time': last_entry['bot_time']
-            })
-        
-        save_json_file(CONVERSATION_FILE, conversations)
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/ask_chatbot/stream', methods=['POST'])
+def ask_chatbot_stream():
+    """Like /api/ask_chatbot, but streams copilot's output back as server-sent events.
+    The turn runs on the job queue, so it is persisted even if the client disconnects."""
+    data = request.json
+    user_message = data.get('message', '')
+    uuid = data.get('uuid')
     
-    # Return response with UUID
-    response['uuid'] = session_id
-    return jsonify(response)
+    chatbot = get_chatbot(uuid)
+    session_id = chatbot.get_uuid()
+    job_id = agent_jobs.submit(session_id, lambda on_chunk: run_chatbot_turn(chatbot, user_message, on_chunk))
+    return _stream_chatbot_job(job_id)
+
+@app.route('/api/chatbot_job/<job_id>/stream', methods=['GET'])
+def stream_chatbot_job(job_id):
+    """Re-attach to a running chatbot job's event stream (replays the output so far)."""
+    return _stream_chatbot_job(job_id)
+
+@app.route('/api/chatbot_job/<job_id>', methods=['GET'])
+def get_chatbot_job(job_id):
+    """Return a queued chatbot turn. With ?wait=N, block up to N seconds for it to finish."""
+    wait = min(float(request.args.get('wait', 0) or 0), CHATBOT_JOB_MAX_WAIT)
+    job = agent_jobs.wait(job_id, wait) if wait > 0 else agent_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    if job['status'] == 'done':
+        return jsonify({'status': 'done', 'job_id': job_id, **job['result']})
+    if job['status'] == 'error':
+        return jsonify({'status': 'error', 'job_id': job_id, 'message': job['error']})
+    return jsonify({'status': job['status'], 'job_id': job_id, 'uuid': job['session_id']})
 
 @app.route('/api/submit_survey', methods=['POST'])
 def submit_survey():
@@ -579,37 +680,26 @@ def submit_survey():
     uuid = data.get('uuid')
     session_id = get_session_id(uuid)
     
-    with lock:
-        surveys = load_json_file(SATISFACTION_FILE)
-        surveys[session_id] = data
-        save_json_file(SATISFACTION_FILE, surveys)    
+    with locks.write(SATISFACTION_FILE, session_id):
+        store.put(SATISFACTION_FILE, session_id, data)
     
     return jsonify({'status': 'success'})
 
-def _normalize_prizes(prizes):
-    """Ensure prizes has 'prolific' (dict keyed by session_id) and 'emails' (list)."""
-    if isinstance(prizes, dict) and 'prolific' in prizes and 'emails' in prizes:
-        return prizes
-    # Old format: whole dict was keyed by session_id (prolific only)
-    return {'prolific': prizes if isinstance(prizes, dict) else {}, 'emails': []}
-
-
 @app.route('/api/submit_prize', methods=['POST'])
 def submit_prize():
     """Save prize collection information. Prolific: keyed by session_id. Non-Prolific: email appended to list (no uuid)."""
     data = request.json
-    prizes = _normalize_prizes(load_json_file(PRIZE_FILE))
 
     if data.get('type') == 'prolific_id':
         uuid = data.get('uuid')
         session_id = get_session_id(uuid)
-        prizes['prolific'][session_id] = data
+        store.set_in(PRIZE_FILE, ['prolific', session_id], data)
     else:
         # Non-Prolific: save email in list only, do not assign uuid
         email = (data.get('identifier') or '').strip()
         if email:
-            prizes.setdefault('emails', []).append(email)
-    save_json_file(PRIZE_FILE, prizes)
+            store.append(PRIZE_FILE, 'emails', email)
+            email_prizes.record()
     return jsonify({'status': 'success'})
 
 @app.route('/api/submit_demographics', methods=['POST'])
@@ -618,13 +708,11 @@ def submit_demographics():
     data = request.json
     uuid = data.get('uuid')
     session_id = get_session_id(uuid)
-    with lock:
-        demographics = load_json_file(DEMOGRAPHICS_FILE)
-        demographics[session_id] = {
+    with locks.write(DEMOGRAPHICS_FILE, session_id):
+        store.put(DEMOGRAPHICS_FILE, session_id, {
             **data,
             'timestamp': datetime.now().isoformat()
-        }
-        save_json_file(DEMOGRAPHICS_FILE, demographics)
+        })
     
     return jsonify({'status': 'success'})
 
@@ -632,10 +720,8 @@ def _save_prolific_mapping(uuid, prolific_pid):
     """Save uuid -> PROLIFIC_PID mapping to JSON file and cache."""
     if not prolific_pid:
         return
-    with lock:
-        mapping = load_json_file(PROLIFIC_UUID_MAPPING_FILE)
-        mapping[uuid] = prolific_pid
-        save_json_file(PROLIFIC_UUID_MAPPING_FILE, mapping)
+    with locks.write(PROLIFIC_UUID_MAPPING_FILE, uuid):
+        store.put(PROLIFIC_UUID_MAPPING_FILE, uuid, prolific_pid)
     cache.set(f'prolific:{uuid}', prolific_pid)
 
 
@@ -678,8 +764,7 @@ def load_chat_history():
     if not uuid:
         return jsonify({'history': []})
     
-    conversations = load_json_file(CONVERSATION_FILE)
-    history = conversations.get(uuid, [])
+    history = store.get(CONVERSATION_FILE, uuid, [])
     return jsonify({'history': history})
 
 
@@ -687,37 +772,31 @@ def load_chat_history():
 def submit_gate_answer():
     """Save the gate question answer (user's explanation of a random NFR)."""
 
-    with lock:
-        try:
-            data = request.json
-            uuid_val = data.get('uuid')
-            batch = data.get('batch')
-            nfr_id = data.get('nfr_id')
-            answer = (data.get('answer') or '').strip()
-            if not uuid_val:
-                return jsonify({'status': 'error', 'message': 'UUID is required'}), 400
-            if answer == '':
-                return jsonify({'status': 'error', 'message': 'Answer is required'}), 400
-            session_id = get_session_id(uuid_val)
-            gate_answers = load_json_file(GATE_ANSWERS_FILE)
-            if session_id not in gate_answers:
-                gate_answers[session_id] = {}
-            batch_key = str(batch)
-            if batch_key not in gate_answers[session_id]:
-                gate_answers[session_id][batch_key] = {}
-            gate_answers[session_id][batch_key][str(nfr_id)] = {
+    try:
+        data = request.json
+        uuid_val = data.get('uuid')
+        batch = data.get('batch')
+        nfr_id = data.get('nfr_id')
+        answer = (data.get('answer') or '').strip()
+        if not uuid_val:
+            return jsonify({'status': 'error', 'message': 'UUID is required'}), 400
+        if answer == '':
+            return jsonify({'status': 'error', 'message': 'Answer is required'}), 400
+        session_id = get_session_id(uuid_val)
+        batch_key = str(batch)
+        with locks.write(GATE_ANSWERS_FILE, session_id):
+            store.set_in(GATE_ANSWERS_FILE, [session_id, batch_key, str(nfr_id)], {
                 'nfr_id': nfr_id,
                 'batch': batch,
                 'answer': answer,
                 'timestamp': datetime.now().isoformat()
-            }
-            save_json_file(GATE_ANSWERS_FILE, gate_answers)
-            return jsonify({'status': 'success'})
-        except Exception as e:
-            print(f"Error in submit_gate_answer: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+            })
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        print(f"Error in submit_gate_answer: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @app.route('/api/admin/data', methods=['GET'])
@@ -726,41 +805,17 @@ def get_admin_data():
     """Get all admin data for the dashboard."""
     try:
         # Load all data files
-        conversations = load_json_file(CONVERSATION_FILE)
-        nfr_responses = load_json_file(NFR_RESPONSES_FILE)
-        surveys = load_json_file(SATISFACTION_FILE)
-        demographics = load_json_file(DEMOGRAPHICS_FILE)
-        prizes = load_json_file(PRIZE_FILE)
+        conversations = store.load(CONVERSATION_FILE)
+        nfr_responses = store.load(NFR_RESPONSES_FILE)
+        surveys = store.load(SATISFACTION_FILE)
+        demographics = store.load(DEMOGRAPHICS_FILE)
+        prizes = store.load(PRIZE_FILE)
         prizes = _normalize_prizes(prizes)
-        batch_assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
-        gate_answers = load_json_file(GATE_ANSWERS_FILE)
-        
-        # Calculate statistics
-        # Get unique participants from all data sources (prolific prizes keyed by session_id; emails are a list)
-        all_uuids = set()
-        all_uuids.update(conversations.keys())
-        all_uuids.update(nfr_responses.keys())
-        all_uuids.update(surveys.keys())
-        all_uuids.update(demographics.keys())
-        all_uuids.update(prizes.get('prolific', {}).keys())
-        all_uuids.update(batch_assignments.keys())
-        all_uuids.update(gate_answers.keys())
+        batch_assignments = store.load(BATCH_ASSIGNMENTS_FILE)
+        gate_answers = store.load(GATE_ANSWERS_FILE)
         
-        total_conversations = sum(len(msgs) for msgs in conversations.values())
-        total_nfr_responses = sum(len(responses) for responses in nfr_responses.values())
-        total_prizes_count = len(prizes.get('prolific', {})) + len(prizes.get('emails', []))
-        
-        stats = {
-            'total_participants': len(all_uuids),
-            'total_conversations': len(conversations),
-            'total_conversation_messages': total_conversations,
-            'total_nfr_responses': total_nfr_responses,
-            'total_surveys': len(surveys),
-            'total_demographics': len(demographics),
-            'total_prizes': total_prizes_count,
-            'total_batch_assignments': len(batch_assignments),
-            'total_gate_answers': len(gate_answers)
-        }
+        stats = build_admin_stats(conversations, nfr_responses, surveys, demographics,
+                                  prizes, batch_assignments, gate_answers)
         
         return jsonify({
             'status': 'success',
@@ -779,20 +834,290 @@ def get_admin_data():
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def build_admin_stats(conversations, nfr_responses, surveys, demographics, prizes, batch_assignments, gate_answers):
+    """Dashboard counters over the loaded response files."""
+    # Get unique participants from all data sources (prolific prizes keyed by session_id; emails are a list)
+    all_uuids = set()
+    all_uuids.update(conversations.keys())
+    all_uuids.update(nfr_responses.keys())
+    all_uuids.update(surveys.keys())
+    all_uuids.update(demographics.keys())
+    all_uuids.update(prizes.get('prolific', {}).keys())
+    all_uuids.update(batch_assignments.keys())
+    all_uuids.update(gate_answers.keys())
+    
+    total_conversations = sum(len(msgs) for msgs in conversations.values())
+    total_nfr_responses = sum(len(responses) for responses in nfr_responses.values())
+    total_prizes_count = len(prizes.get('prolific', {})) + len(prizes.get('emails', []))
+    
+    return {
+        'total_participants': len(all_uuids),
+        'total_conversations': len(conversations),
+        'total_conversation_messages': total_conversations,
+        'total_nfr_responses': total_nfr_responses,
+        'total_surveys': len(surveys),
+        'total_demographics': len(demographics),
+        'total_prizes': total_prizes_count,
+        'total_batch_assignments': len(batch_assignments),
+        'total_gate_answers': len(gate_answers)
+    }
+
+# /api/admin/data split by section, so the dashboard can page through one section and
+# skip sections that didn't change (ETags are derived from the store's version counters)
+ADMIN_SECTIONS = {
+    'conversations': CONVERSATION_FILE,
+    'nfr_responses': NFR_RESPONSES_FILE,
+    'surveys': SATISFACTION_FILE,
+    'demographics': DEMOGRAPHICS_FILE,
+    'prizes': PRIZE_FILE,
+    'batch_assignments': BATCH_ASSIGNMENTS_FILE,
+    'gate_answers': GATE_ANSWERS_FILE,
+}
+ADMIN_PAGE_SIZE = 200
+ADMIN_MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024
+# Part of every ETag: the journal store's version counters start over on restart
+STORE_EPOCH = os.urandom(4).hex()
+
+# section -> (version, keys in file order, key -> position); rebuilt when the file changes
+_admin_section_keys = {}
+# (versions of every section) -> stats
+_admin_stats_cache = {}
+
+def _conditional_json(etag, build):
+    """Return 304 if the client already has `etag`, else build() as JSON, gzipped if accepted."""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        body = json.dumps(build()).encode('utf-8')
+        response = app.response_class(body, mimetype='application/json')
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+            response.set_data(gzip.compress(body, compresslevel=5))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag, weak=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _section_keys(section, version):
+    """Keys of a section in file order plus their positions, cached per store version."""
+    cached = _admin_section_keys.get(section)
+    if cached is None or cached[0] != version:
+        keys = list(store.load(ADMIN_SECTIONS[section]).keys())
+        cached = (version, keys, {key: i for i, key in enumerate(keys)})
+        _admin_section_keys[section] = cached
+    return cached
+
+@app.route('/api/admin/data/stats', methods=['GET'])
+@require_admin
+def get_admin_stats():
+    """Dashboard counters; 304 while no response file has changed."""
+    versions = tuple(store.version(filepath) for filepath in ADMIN_SECTIONS.values())
+    etag = f"stats-{STORE_EPOCH}-{'.'.join(map(str, versions))}"
+
+    def build():
+        stats = _admin_stats_cache.get(versions)
+        if stats is None:
+            stats = build_admin_stats(*(
+                _normalize_prizes(store.load(filepath)) if filepath == PRIZE_FILE else store.load(filepath)
+                for filepath in ADMIN_SECTIONS.values()
+            ))
+            _admin_stats_cache.clear()
+            _admin_stats_cache[versions] = stats
+        return {'status': 'success', 'stats': stats}
+
+    return _conditional_json(etag, build)
+
+@app.route('/api/admin/data/<section>', methods=['GET'])
+@require_admin
+def get_admin_section(section):
+    """
+    One section of the admin data, a page at a time: ?limit=N&cursor=<next_cursor of the previous page>.
+    Answers 304 to If-None-Match while the section is unchanged.
+    """
+    filepath = ADMIN_SECTIONS.get(section)
+    if filepath is None:
+        return jsonify({'status': 'error', 'message': f'Unknown section: {section}'}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', ADMIN_PAGE_SIZE)), 1), ADMIN_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+    cursor = request.args.get('cursor') or None
+
+    version = store.version(filepath)
+    cursor_tag = hashlib.sha1(cursor.encode('utf-8')).hexdigest()[:12] if cursor else ''
+    etag = f"{section}-{STORE_EPOCH}-{version}-{limit}-{cursor_tag}"
+
+    if section == 'prizes':
+        # Small and not keyed by participant alone (emails are a list): always one page
+        return _conditional_json(etag, lambda: {
+            'status': 'success', 'section': section, 'total': 1, 'next_cursor': None,
+            'items': _normalize_prizes(store.load(PRIZE_FILE)),
+        })
+
+    _, keys, positions = _section_keys(section, version)
+    if cursor is not None and cursor not in positions:
+        return jsonify({'status': 'error', 'message': 'Unknown cursor'}), 400
+
+    def build():
+        start = positions[cursor] + 1 if cursor is not None else 0
+        page_keys = keys[start:start + limit]
+        items = {}
+        for key in page_keys:
+            value = store.get(filepath, key)
+            if value is not None:
+                items[key] = value
+        has_more = start + limit < len(keys)
+        return {
+            'status': 'success',
+            'section': section,
+            'total': len(keys),
+            'items': items,
+            'next_cursor': page_keys[-1] if has_more and page_keys else None,
+        }
+
+    return _conditional_json(etag, build)
+
+###### metrics ######
+# Per-route latency; the other metrics are recorded where the work happens (see metrics.py)
+@app.errorhandler(Overloaded)
+def agent_overloaded(e):
+    """Too many agent requests queued: 429 with an estimate of when to try again."""
+    response = jsonify({'status': 'error', 'message': str(e), 'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    start = g.get('request_start')
+    if start is not None:
+        # Streamed responses are timed until their headers are ready
+        REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                route=request.url_rule.rule if request.url_rule else 'unmatched',
+                                method=request.method, status=response.status_code)
+    return response
+
+metrics_registry.gauge('website_active_chatbots', 'Chatbot instances held by this worker',
+                       lambda: len(chatbots))
+metrics_registry.gauge('website_agent_jobs', 'Agent jobs known to this worker by state',
+                       lambda: {state: count for state, count in agent_jobs.stats().items() if state != 'max_workers'},
+                       ['state'])
+metrics_registry.gauge('website_session_pool_ready', 'Pre-created copilot sessions ready to hand out',
+                       session_pool.depth)
+metrics_registry.gauge('website_locks_held', 'Locks currently held or waited for', locks.held)
+metrics_registry.gauge('website_agent_queue_length', 'Agent runs waiting for a slot', admission.queue_length)
+metrics_registry.gauge('website_agent_slots_busy', 'Agent slots in use by this worker', admission.running)
+if agent_host:
+    metrics_registry.gauge('website_agent_host_processes', 'Persistent agent processes alive in this worker',
+                           agent_host.live)
+
+@app.route('/api/admin/metrics', methods=['GET'])
+@require_admin
+def get_metrics():
+    """This worker's metrics in the Prometheus text format (log in, or use HTTP Basic auth with the admin password)."""
+    return Response(metrics_registry.expose(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/export', methods=['GET'])
+@require_admin
+def export_responses():
+    """Stream every NFR response joined with its participant's Prolific id and gate answer, as
+    ?format=ndjson (default) or csv, optionally filtered by ?batch= (actual batch) and
+    ?since= / ?until= (ISO date or datetime). Rows are produced as they are sent (see export.py)."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    batch = request.args.get('batch')
+    try:
+        batch = int(batch) if batch else None
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'), end_of_day=True)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    records = export_records(store, PROLIFIC_UUID_MAPPING_FILE, GATE_ANSWERS_FILE,
+                             batch=batch, since=since, until=until)
+    body = ndjson_chunks(records) if fmt == 'ndjson' else csv_chunks(records)
+    filename = f"nfr_responses-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Accel-Buffering': 'no'})
+
+@app.route('/api/admin/cache_stats', methods=['GET'])
+@require_admin
+def get_cache_stats():
+    """Hit/miss counters of the shared JSON file cache, the rendered page cache and (with
+    ANSWER_CACHE=1) the agent answer cache."""
+    body = {'status': 'success', 'json_cache': json_cache.stats(), 'page_cache': page_cache.stats()}
+    if answer_cache is not None:
+        body['answer_cache'] = answer_cache.stats()
+    return jsonify(body)
+
+@app.route('/api/admin/session_pool', methods=['GET'])
+@require_admin
+def get_session_pool_stats():
+    """Depth and hit/miss counters of the pre-created session pool."""
+    return jsonify({'status': 'success', 'session_pool': session_pool.stats()})
+
+@app.route('/api/admin/admission', methods=['GET'])
+@require_admin
+def get_admission_stats():
+    """Agent slots in use, queue length and admit/reject counters of this worker's admission control."""
+    return jsonify({'status': 'success', 'admission': admission.stats()})
+
+@app.route('/api/admin/agent_host', methods=['GET'])
+@require_admin
+def get_agent_host_stats():
+    """Live processes and spawn/reuse counters of the persistent agent host (AGENT_HOST=1)."""
+    if agent_host is None:
+        return jsonify({'status': 'success', 'enabled': False})
+    return jsonify({'status': 'success', 'enabled': True, 'agent_host': agent_host.stats()})
+
+@app.route('/api/admin/chatbots', methods=['GET'])
+@require_admin
+def get_chatbot_registry_stats():
+    """Size and hit/miss/eviction counters of this worker's chatbot registry, and with
+    MULTI_WORKER the sessions registered by every worker."""
+    body = {'status': 'success', 'chatbots': chatbots.stats()}
+    if session_registry:
+        body['sessions'] = session_registry.stats()
+    return jsonify(body)
+
+@app.route('/api/admin/batch_allocation', methods=['GET'])
+@require_admin
+def get_batch_allocation():
+    """Per-batch occupancy and capacity as seen by the batch allocator."""
+    return jsonify({'status': 'success', 'allocation': batch_allocator.occupancy()})
+
+@app.route('/api/admin/results_datasets', methods=['GET'])
+@require_admin
+def get_results_dataset_stats():
+    """Which data/N.* datasets the results viewer currently keeps parsed."""
+    return jsonify({'status': 'success', 'datasets': datasets.stats()})
+
 @app.route('/api/admin/clear_all_data', methods=['POST'])
 @require_admin
 def clear_all_data():
     """Clear all response data files. This is a destructive operation."""
     try:
-        # Clear all response files by saving empty dictionaries
-        save_json_file(CONVERSATION_FILE, {})
-        save_json_file(NFR_RESPONSES_FILE, {})
-        save_json_file(SATISFACTION_FILE, {})
-        save_json_file(DEMOGRAPHICS_FILE, {})
-        save_json_file(PRIZE_FILE, {'prolific': {}, 'emails': []})
-        save_json_file(BATCH_ASSIGNMENTS_FILE, {})
-        save_json_file(GATE_ANSWERS_FILE, {})
-        save_json_file(PROLIFIC_UUID_MAPPING_FILE, {})
+        # Clear all response files by saving empty dictionaries, with every writer shut out
+        with ExitStack() as held:
+            for filepath in RESPONSE_FILES:
+                held.enter_context(locks.write(filepath))
+            store.replace(CONVERSATION_FILE, {})
+            store.replace(NFR_RESPONSES_FILE, {})
+            store.replace(SATISFACTION_FILE, {})
+            store.replace(DEMOGRAPHICS_FILE, {})
+            store.replace(PRIZE_FILE, {'prolific': {}, 'emails': []})
+            store.replace(BATCH_ASSIGNMENTS_FILE, {})
+            store.replace(GATE_ANSWERS_FILE, {})
+            store.replace(PROLIFIC_UUID_MAPPING_FILE, {})
+            peer_index.rebuild()
+        store.compact()
         
         # Clear in-memory chatbot instances
         chatbots.clear()
@@ -819,26 +1144,38 @@ BATCH_ASSIGNMENTS_FILE_2 = os.path.join(RESPONSES2_DIR, 'user_batch_assignments.
 
 def build_nfr_text_map():
     """
-    Build {nfr_id: description} from NFR.json.
+    Return {nfr_id: description} from NFR.json (precomputed by the catalog).
     NFR.json is a list of batches; each batch is a list of NFR dicts.
     """
-    nfr_map = {}
-    nfr_batches = load_json_file(NFR_FILE)
-    if not isinstance(nfr_batches, list):
-        return nfr_map
-
-    for batch in nfr_batches:
-        if not isinstance(batch, list):
-            continue
-        for nfr in batch:
-            if not isinstance(nfr, dict):
-                continue
-            nfr_id = nfr.get('id')
-            desc = nfr.get('description')
-            if nfr_id is None or not desc:
-                continue
-            nfr_map[str(nfr_id)] = desc
-    return nfr_map
+    return dict(nfr_catalog.get().text_map)
+
+# One results service per set of files; each keeps its participants' first-seen order
+live_results = ResultsService(store.load, {
+    'conversations': CONVERSATION_FILE,
+    'nfr_responses': NFR_RESPONSES_FILE,
+    'surveys': SATISFACTION_FILE,
+    'demographics': DEMOGRAPHICS_FILE,
+    'batch_assignments': BATCH_ASSIGNMENTS_FILE,
+    'prolific_uuid_mapping': PROLIFIC_UUID_MAPPING_FILE,
+}, build_nfr_text_map, store=store)
+pilot_results = ResultsService(load_json_file, {
+    'conversations': CONVERSATION_FILE_2,
+    'nfr_responses': NFR_RESPONSES_FILE_2,
+    'surveys': SATISFACTION_FILE_2,
+    'demographics': DEMOGRAPHICS_FILE_2,
+    'batch_assignments': BATCH_ASSIGNMENTS_FILE_2,
+    'prolific_uuid_mapping': PROLIFIC_UUID_MAPPING_FILE_2,
+}, build_nfr_text_map)
+
+# Past rounds (data/N.*) browsable in the viewer; only the most recently used stay parsed
+RESULTS_DATA_DIR = os.environ.get('RESULTS_DATA_DIR', os.path.join('..', 'data'))
+RESULTS_DATASET_CACHE = int(os.environ.get('RESULTS_DATASET_CACHE', '3'))
+datasets = DatasetRegistry(RESULTS_DATA_DIR, build_nfr_text_map, capacity=RESULTS_DATASET_CACHE)
+# Datasets that aren't stage directories
+BUILTIN_DATASETS = {
+    'live': live_results,
+    'responses2': pilot_results,
+}
 
 @app.route('/show_results')
 def show_results():
@@ -849,66 +1186,26 @@ def show_results():
 def api_show_results_data():
     """
     JSON backing for the `show_results.html` viewer.
-    Reads from `website/responses2/*` and NFR definitions from `website/NFR.json`.
+    ?dataset= picks the data (default: the live response store, see /api/show_results/datasets);
+    ?sections= limits the payload to a comma-separated subset of its keys.
+    NFR definitions come from `website/NFR.json`.
     """
-    #conversations = load_json_file(CONVERSATION_FILE_2)
-    #nfr_responses = load_json_file(NFR_RESPONSES_FILE_2)
-    #surveys = load_json_file(SATISFACTION_FILE_2)
-    #demographics = load_json_file(DEMOGRAPHICS_FILE_2)
-    #batch_assignments = load_json_file(BATCH_ASSIGNMENTS_FILE_2)
-    #prolific_uuid_mapping = load_json_file(PROLIFIC_UUID_MAPPING_FILE_2)
-    
-    conversations = load_json_file(CONVERSATION_FILE)
-    nfr_responses = load_json_file(NFR_RESPONSES_FILE)
-    surveys = load_json_file(SATISFACTION_FILE)
-    demographics = load_json_file(DEMOGRAPHICS_FILE)
-    batch_assignments = load_json_file(BATCH_ASSIGNMENTS_FILE)
-    prolific_uuid_mapping = load_json_file(PROLIFIC_UUID_MAPPING_FILE)
-    nfr_text_map = build_nfr_text_map()
-
-    # Only show UUIDs that have conversations.
-    # Sort UUIDs by the earliest conversation timestamp (user_time/bot_time).
-    participants = []
-    if isinstance(conversations, dict):
-        def _parse_ts(ts):
-            if not ts or not isinstance(ts, str):
-                return None
-            try:
-                # Handle ISO strings ending with 'Z' (UTC)
-                if ts.endswith('Z'):
-                    ts = ts[:-1] + '+00:00'
-                return datetime.fromisoformat(ts)
-            except Exception:
-                return None
-
-        items = []
-        for uuid, turns in conversations.items():
-            min_ts = None
-            if isinstance(turns, list):
-                for msg in turns:
-                    if not isinstance(msg, dict):
-                        continue
-                    for key in ('user_time', 'bot_time'):
-                        t = _parse_ts(msg.get(key))
-                        if t and (min_ts is None or t < min_ts):
-                            min_ts = t
-            items.append((min_ts, uuid))
-
-        # UUIDs without timestamps go last, but stable by UUID.
-        items.sort(key=lambda x: (x[0] is None, x[0] or datetime.max, x[1]))
-        participants = [uuid for _, uuid in items]
-
-    return jsonify({
-        'status': 'success',
-        'participants': participants,
-        'nfr_text_map': nfr_text_map,
-        'conversations': conversations,
-        'nfr_responses': nfr_responses,
-        'surveys': surveys,
-        'demographics': demographics,
-        'batch_assignments': batch_assignments,
-        'prolific_uuid_mapping': prolific_uuid_mapping,
-    })
+    name = request.args.get('dataset') or 'live'
+    results = BUILTIN_DATASETS.get(name) or datasets.get(name)
+    if results is None:
+        return jsonify({'status': 'error', 'message': f'Unknown dataset: {name}'}), 404
+    sections = None
+    if request.args.get('sections'):
+        sections = request.args['sections'].split(',')
+        unknown = [section for section in sections if section not in PAYLOAD_SECTIONS]
+        if unknown:
+            return jsonify({'status': 'error', 'message': f"Unknown sections: {', '.join(unknown)}"}), 400
+    return jsonify({**results.payload(sections), 'dataset': name})
+
+@app.route('/api/show_results/datasets', methods=['GET'])
+def api_show_results_datasets():
+    """Names accepted by /api/show_results/data?dataset=."""
+    return jsonify({'status': 'success', 'datasets': list(BUILTIN_DATASETS) + datasets.names()})
 
 
 @app.route('/show_results_pilot')
@@ -919,60 +1216,10 @@ def show_results_pilot():
 @app.route('/api/show_results_pilot/data', methods=['GET'])
 def api_show_results_data_pilot():
     """
-    JSON backing for the `show_results.html` viewer.
+    JSON backing for the `show_results_pilot.html` viewer.
     Reads from `website/responses2/*` and NFR definitions from `website/NFR.json`.
     """
-    conversations = load_json_file(CONVERSATION_FILE_2)
-    nfr_responses = load_json_file(NFR_RESPONSES_FILE_2)
-    surveys = load_json_file(SATISFACTION_FILE_2)
-    demographics = load_json_file(DEMOGRAPHICS_FILE_2)
-    batch_assignments = load_json_file(BATCH_ASSIGNMENTS_FILE_2)
-    prolific_uuid_mapping = load_json_file(PROLIFIC_UUID_MAPPING_FILE_2)
-    nfr_text_map = build_nfr_text_map()
-
-    # Only show UUIDs that have conversations.
-    # Sort UUIDs by the earliest conversation timestamp (user_time/bot_time).
-    participants = []
-    if isinstance(conversations, dict):
-        def _parse_ts(ts):
-            if not ts or not isinstance(ts, str):
-                return None
-            try:
-                # Handle ISO strings ending with 'Z' (UTC)
-                if ts.endswith('Z'):
-                    ts = ts[:-1] + '+00:00'
-                return datetime.fromisoformat(ts)
-            except Exception:
-                return None
-
-        items = []
-        for uuid, turns in conversations.items():
-            min_ts = None
-            if isinstance(turns, list):
-                for msg in turns:
-                    if not isinstance(msg, dict):
-                        continue
-                    for key in ('user_time', 'bot_time'):
-                        t = _parse_ts(msg.get(key))
-                        if t and (min_ts is None or t < min_ts):
-                            min_ts = t
-            items.append((min_ts, uuid))
-
-        # UUIDs without timestamps go last, but stable by UUID.
-        items.sort(key=lambda x: (x[0] is None, x[0] or datetime.max, x[1]))
-        participants = [uuid for _, uuid in items]
-
-    return jsonify({
-        'status': 'success',
-        'participants': participants,
-        'nfr_text_map': nfr_text_map,
-        'conversations': conversations,
-        'nfr_responses': nfr_responses,
-        'surveys': surveys,
-        'demographics': demographics,
-        'batch_assignments': batch_assignments,
-        'prolific_uuid_mapping': prolific_uuid_mapping,
-    })
+    return jsonify(pilot_results.payload())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class SessionPool:
+    """
+    Keeps up to `size` chat sessions already created and primed, ready to hand out.
+
+    Creating a copilot session runs the CLI with the instruction prompt, which
+    can take minutes. A background thread creates sessions ahead of time, one
+    every `refill_interval` seconds while the pool is below `size`, so a new
+    participant gets one instantly. When the pool is empty `acquire` falls back
+    to creating a session on the spot.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 2, refill_interval: float = 5.0):
+        """
+        Args:
+            factory: Creates one primed session (e.g. `Chatbot`)
+            size: How many sessions to keep ready; 0 disables the pool
+            refill_interval: Seconds to wait between two background creations
+        """
+        self.factory = factory
+        self.size = size
+        self.refill_interval = refill_interval
+
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        """Start filling the pool in the background (once; later calls do nothing)."""
+        if self.size <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refill_loop, name='session-pool', daemon=True)
+                self._thread.start()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+
+    def acquire(self) -> Any:
+        """Return a ready session, or create one now if the pool is empty."""
+        with self._lock:
+            session = self._ready.popleft() if self._ready else None
+            if session is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._wakeup.set()
+        if session is not None:
+            return session
+        return self.factory()
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._ready)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'depth': len(self._ready),
+                'hits': self.hits,
+                'misses': self.misses,
+                'created': self.created,
+                'failures': self.failures,
+            }
+
+    def _refill_loop(self) -> None:
+        while not self._closed:
+            if self.depth() >= self.size:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                session = self.factory()
+                with self._lock:
+                    self._ready.append(session)
+                    self.created += 1
+            except Exception as e:
+                print(f"Error pre-creating session: {str(e)}")
+                traceback.print_exc()
+                with self._lock:
+                    self.failures += 1
+            time.sleep(self.refill_interval)
@@ -0,0 +1,174 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    created_by TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    turn_owner TEXT,
+    turn_until REAL
+);
+CREATE TABLE IF NOT EXISTS agent_jobs (
+    job_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    output TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_agent_jobs_finished ON agent_jobs (finished_at);
+"""
+
+# A turn lease outlives the longest agent call (Chatbot's 600s timeout), so it only
+# expires on its own if the worker holding it died mid-turn
+TURN_LEASE_SECONDS = 900
+TURN_POLL_SECONDS = 0.25
+
+
+def worker_id() -> str:
+    """Identifies this worker process in the registry."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _Db:
+    """One autocommit connection per thread to the shared database."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = self.conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+class SessionRegistry:
+    """
+    Chat sessions known to any worker process, and which worker is running a turn for each.
+
+    Every worker can restore any session from its UUID (the copilot session lives
+    on disk), so the registry doesn't pin sessions to workers; what it prevents
+    is two workers resuming the same copilot session at once. `turn(session_id)`
+    holds a lease on the session for the duration of a turn, the cross-process
+    counterpart of Chatbot.turn_lock. A lease left by a worker that died expires
+    after `lease_seconds`.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = TURN_LEASE_SECONDS):
+        """
+        Args:
+            db_path: SQLite database shared by the workers (may be the response store's)
+            lease_seconds: How long a turn lease lasts if its worker never releases it
+        """
+        self._db = _Db(db_path)
+        self.lease_seconds = lease_seconds
+        self.worker = worker_id()
+
+    def register(self, session_id: str) -> None:
+        """Record that this worker created or restored `session_id`."""
+        now = time.time()
+        self._db.conn().execute(
+            'INSERT INTO chat_sessions (session_id, created_by, created_at, last_seen) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (session_id) DO UPDATE SET last_seen = excluded.last_seen',
+            (session_id, self.worker, now, now))
+
+    def claim(self, session_id: str) -> bool:
+        """Take the turn lease on `session_id` if it is free (or expired). Returns whether we got it."""
+        now = time.time()
+        self.register(session_id)
+        cursor = self._db.conn().execute(
+            'UPDATE chat_sessions SET turn_owner = ?, turn_until = ? '
+            'WHERE session_id = ? AND (turn_owner IS NULL OR turn_until < ?)',
+            (self.worker, now + self.lease_seconds, session_id, now))
+        return cursor.rowcount == 1
+
+    def release(self, session_id: str) -> None:
+        self._db.conn().execute(
+            'UPDATE chat_sessions SET turn_owner = NULL, turn_until = NULL WHERE session_id = ? AND turn_owner = ?',
+            (session_id, self.worker))
+
+    @contextmanager
+    def turn(self, session_id: str) -> Iterator[None]:
+        """Hold the session's turn lease for the block, waiting for another worker's turn to end."""
+        while not self.claim(session_id):
+            time.sleep(TURN_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    def stats(self) -> Dict:
+        conn = self._db.conn()
+        sessions, = conn.execute('SELECT COUNT(*) FROM chat_sessions').fetchone()
+        busy = conn.execute('SELECT session_id, turn_owner FROM chat_sessions WHERE turn_owner IS NOT NULL '
+                            'AND turn_until >= ?', (time.time(),)).fetchall()
+        return {
+            'worker': self.worker,
+            'sessions': sessions,
+            'turns_in_progress': {session_id: owner for session_id, owner in busy},
+        }
+
+
+class SharedJobTable:
+    """
+    Agent job states in the shared database, so a job submitted on one worker can be
+    polled or streamed from another (see AgentJobQueue's `shared` argument).
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: SQLite database shared by the workers
+        """
+        self._db = _Db(db_path)
+        self.worker = worker_id()
+
+    def save(self, job: Dict, output: List[str]) -> None:
+        """Insert or overwrite a job's state and the output produced so far."""
+        self._db.conn().execute(
+            'INSERT OR REPLACE INTO agent_jobs (job_id, session_id, worker, status, submitted_at, finished_at, '
+            'result, error, output) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job['job_id'], job['session_id'], self.worker, job['status'], job['submitted_at'],
+             job['finished_at'], json.dumps(job['result']), job['error'], json.dumps(output)))
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        """The job as AgentJobQueue keeps it (with its 'output' chunks), or None if unknown."""
+        row = self._db.conn().execute(
+            'SELECT job_id, session_id, status, submitted_at, finished_at, result, error, output '
+            'FROM agent_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job_id, session_id, status, submitted_at, finished_at, result, error, output = row
+        return {
+            'job_id': job_id,
+            'session_id': session_id,
+            'status': status,
+            'submitted_at': submitted_at,
+            'finished_at': finished_at,
+            'result': json.loads(result) if result is not None else None,
+            'error': error,
+            'output': json.loads(output),
+        }
+
+    def prune(self, cutoff: float) -> None:
+        """Drop jobs that finished before `cutoff`."""
+        self._db.conn().execute('DELETE FROM agent_jobs WHERE finished_at < ?', (cutoff,))
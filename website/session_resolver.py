@@ -0,0 +1,118 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+from typing import Optional, Set
+
+UUID_RE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+
+class SpawnContext:
+    """
+    One tracked CLI invocation. Use as a context manager around the spawn; pass
+    `log_dir` to the CLI as `--log-dir` and read `session_id` afterwards.
+    """
+
+    def __init__(self, resolver: 'SessionResolver'):
+        self.resolver = resolver
+        self.log_dir = tempfile.mkdtemp(prefix='copilot-spawn-')
+        self.before: Optional[Set[str]] = None
+        self.session_id: Optional[str] = None
+        self._serialized = False
+
+    def __enter__(self) -> 'SpawnContext':
+        if self.resolver.log_dir_supported is not True:
+            # Until the CLI has shown it honours --log-dir, snapshot for the diff fallback,
+            # which is only reliable with one spawn at a time
+            self.resolver._fallback_lock.acquire()
+            self._serialized = True
+            self.before = self.resolver._list_state()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.session_id = self.resolver._resolve(self)
+        finally:
+            shutil.rmtree(self.log_dir, ignore_errors=True)
+            if self._serialized:
+                self.resolver._fallback_lock.release()
+
+
+class SessionResolver:
+    """
+    Ties a `copilot` invocation to the session it created, without guessing by mtime.
+
+    Each spawn gets its own `--log-dir`, so the only log in it belongs to that
+    process; the session id is the UUID in that log which exists under
+    `session-state`. That costs a few stats however many sessions exist, and two
+    chats created at the same time can't pick up each other's session.
+
+    If the CLI ignores `--log-dir`, spawns fall back to diffing a listing of
+    `session-state` taken before and after the run. That is only unambiguous
+    with one creation in flight, so in that mode creations are serialized.
+    """
+
+    def __init__(self, copilot_home: str = '~/.copilot'):
+        self.state_dir = os.path.join(os.path.expanduser(copilot_home), 'session-state')
+        self.log_dir_supported: Optional[bool] = None
+        self._fallback_lock = threading.Lock()
+
+    def track(self) -> SpawnContext:
+        """Context manager for one session-creating CLI run."""
+        return SpawnContext(self)
+
+    def _resolve(self, ctx: SpawnContext) -> Optional[str]:
+        session_id = self._from_log_dir(ctx.log_dir)
+        if session_id is not None:
+            self.log_dir_supported = True
+            return session_id
+        if ctx.before is None:
+            return None
+        self.log_dir_supported = False
+        created = self._list_state() - ctx.before
+        if len(created) > 1:
+            print(f"Warning: {len(created)} new copilot sessions appeared during one spawn, picking the newest")
+        return max(created, key=self._mtime) if created else None
+
+    def _from_log_dir(self, log_dir: str) -> Optional[str]:
+        try:
+            names = os.listdir(log_dir)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            # Older CLIs name the log after the session: session-<uuid>.log
+            match = UUID_RE.search(name)
+            if match and self._exists(match.group(0)):
+                return match.group(0)
+            try:
+                with open(os.path.join(log_dir, name), 'r', errors='replace') as f:
+                    content = f.read()
+            except OSError:
+                continue
+            for candidate in UUID_RE.findall(content):
+                if self._exists(candidate):
+                    return candidate
+        return None
+
+    def _list_state(self) -> Set[str]:
+        if not os.path.isdir(self.state_dir):
+            return set()
+        names = set()
+        for name in os.listdir(self.state_dir):
+            if name.startswith('process'):
+                continue
+            names.add(name[:-6] if name.endswith('.jsonl') else name)
+        return names
+
+    def _exists(self, session_id: str) -> bool:
+        base = os.path.join(self.state_dir, session_id)
+        return os.path.exists(base) or os.path.exists(base + '.jsonl')
+
+    def _mtime(self, session_id: str) -> float:
+        base = os.path.join(self.state_dir, session_id)
+        for path in (base, base + '.jsonl'):
+            if os.path.exists(path):
+                return os.path.getmtime(path)
+        return 0.0
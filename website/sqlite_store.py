@@ -0,0 +1,415 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from response_store import FEEDBACK_FILENAME
+
+CONVERSATION_FILENAME = 'conversation.json'
+GATE_ANSWERS_FILENAME = 'gate_answers.json'
+
+# Files found in the data/N.* round directories (2.pilot ... 7.valid-data-ordered)
+ROUND_FILENAMES = [
+    'conversation.json',
+    'nfr_responses.json',
+    'prolific_uuid_mapping.json',
+    'satisfaction_survey.json',
+    'prize.json',
+    'demographics.json',
+    'user_batch_assignments.json',
+    'gate_answers.json',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    file TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (file, key)
+);
+CREATE TABLE IF NOT EXISTS nfr_responses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    batch,
+    nfr_id,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nfr_responses_session_batch_nfr
+    ON nfr_responses (session_id, batch, nfr_id);
+CREATE TABLE IF NOT EXISTS conversation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_session ON conversation (session_id);
+CREATE TABLE IF NOT EXISTS gate_answers (
+    session_id TEXT NOT NULL,
+    batch TEXT NOT NULL,
+    nfr_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, batch, nfr_id)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    file TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    file TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (file, key)
+);
+CREATE INDEX IF NOT EXISTS idx_changes_version ON changes (file, version);
+"""
+
+
+class SqliteResponseStore:
+    """
+    SQLite backend for the `responses/*.json` data, with the same interface as ResponseStore.
+
+    Everything lives in one database in WAL mode. Top-level keys of every file are
+    rows of `entries` (rowid keeps the original key order). The three per-session
+    collections get their own tables so the hot paths are indexed queries:
+    NFR responses are indexed on (session_id, batch, nfr_id), conversation turns on
+    session_id, and gate answers are keyed by (session_id, batch, nfr_id). For those
+    files the `entries` row only records the session's position (value is NULL).
+    """
+
+    def __init__(self, filepaths: List[str], db_path: str):
+        """
+        Args:
+            filepaths: The JSON files this store stands in for (matched by file name)
+            db_path: Path of the SQLite database
+        """
+        self.filepaths = list(filepaths)
+        self.db_path = db_path
+        self._names = {os.path.basename(p): p for p in self.filepaths}
+        self.feedback_file = self._names.get(FEEDBACK_FILENAME)
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit mode with explicit transactions for writes."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    # ------------------------------------------------------------------ reads
+
+    def load(self, filepath: str) -> Dict:
+        """Rebuild a whole file as the dict the JSON file would hold."""
+        name = os.path.basename(filepath)
+        conn = self._conn()
+        rows = conn.execute('SELECT key, value FROM entries WHERE file = ? ORDER BY rowid', (name,)).fetchall()
+        data = {key: (json.loads(value) if value is not None else None) for key, value in rows}
+        if name == FEEDBACK_FILENAME:
+            self._fill(data, conn.execute('SELECT session_id, data FROM nfr_responses ORDER BY id'))
+        elif name == CONVERSATION_FILENAME:
+            self._fill(data, conn.execute('SELECT session_id, data FROM conversation ORDER BY id'))
+        elif name == GATE_ANSWERS_FILENAME:
+            for key in data:
+                if data[key] is None:
+                    data[key] = {}
+            for session_id, batch, nfr_id, value in conn.execute(
+                    'SELECT session_id, batch, nfr_id, data FROM gate_answers ORDER BY rowid'):
+                data.setdefault(session_id, {}).setdefault(batch, {})[nfr_id] = json.loads(value)
+        return data
+
+    @staticmethod
+    def _fill(data: Dict, rows) -> None:
+        for key in data:
+            if data[key] is None:
+                data[key] = []
+        for session_id, value in rows:
+            data.setdefault(session_id, []).append(json.loads(value))
+
+    def get(self, filepath: str, key: str, default: Any = None) -> Any:
+        """Return one top-level entry of a file."""
+        name = os.path.basename(filepath)
+        conn = self._conn()
+        row = conn.execute('SELECT value FROM entries WHERE file = ? AND key = ?', (name, key)).fetchone()
+        if row is None:
+            return default
+        if row[0] is not None:
+            return json.loads(row[0])
+        if name == FEEDBACK_FILENAME:
+            rows = conn.execute('SELECT data FROM nfr_responses WHERE session_id = ? ORDER BY id', (key,))
+            return [json.loads(value) for value, in rows]
+        if name == CONVERSATION_FILENAME:
+            rows = conn.execute('SELECT data FROM conversation WHERE session_id = ? ORDER BY id', (key,))
+            return [json.loads(value) for value, in rows]
+        if name == GATE_ANSWERS_FILENAME:
+            answers = {}
+            for batch, nfr_id, value in conn.execute(
+                    'SELECT batch, nfr_id, data FROM gate_answers WHERE session_id = ? ORDER BY rowid', (key,)):
+                answers.setdefault(batch, {})[nfr_id] = json.loads(value)
+            return answers
+        return default
+
+    def contains(self, filepath: str, key: str) -> bool:
+        row = self._conn().execute('SELECT 1 FROM entries WHERE file = ? AND key = ?',
+                                   (os.path.basename(filepath), key)).fetchone()
+        return row is not None
+
+    def version(self, filepath: str) -> int:
+        """Monotonic counter bumped on every write to the file (shared by every process using the db)."""
+        row = self._conn().execute('SELECT version FROM versions WHERE file = ?',
+                                   (os.path.basename(filepath),)).fetchone()
+        return row[0] if row else 0
+
+    def key_version(self, filepath: str, key: str) -> int:
+        """The file version at which a top-level entry was last written (0 if unknown)."""
+        row = self._conn().execute('SELECT version FROM changes WHERE file = ? AND key = ?',
+                                   (os.path.basename(filepath), key)).fetchone()
+        return row[0] if row else 0
+
+    def changed_since(self, filepath: str, version: int) -> Optional[List[str]]:
+        """Top-level keys written after `version` (by any process), in the order they were last written, or None if the whole file was replaced since."""
+        keys = [key for key, in self._conn().execute(
+            'SELECT key FROM changes WHERE file = ? AND version > ? ORDER BY version', (os.path.basename(filepath), version))]
+        return None if '' in keys else keys
+
+    # ----------------------------------------------------------------- writes
+
+    def put(self, filepath: str, key: str, value: Any) -> None:
+        """Set a top-level entry, e.g. surveys[session_id] = data."""
+        name = os.path.basename(filepath)
+        with self._transaction() as conn:
+            self._put(conn, name, key, value)
+            self._bump(conn, name, key)
+
+    def set_in(self, filepath: str, keys: List[str], value: Any) -> None:
+        """Set a nested entry, creating intermediate dicts, e.g. gate_answers[sid][batch][nfr]."""
+        name = os.path.basename(filepath)
+        with self._transaction() as conn:
+            if len(keys) == 1:
+                self._put(conn, name, keys[0], value)
+            elif name == GATE_ANSWERS_FILENAME and len(keys) == 3:
+                self._mark(conn, name, keys[0])
+                conn.execute(
+                    'INSERT INTO gate_answers (session_id, batch, nfr_id, data) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (session_id, batch, nfr_id) DO UPDATE SET data = excluded.data',
+                    (keys[0], str(keys[1]), str(keys[2]), json.dumps(value)))
+            else:
+                row = conn.execute('SELECT value FROM entries WHERE file = ? AND key = ?', (name, keys[0])).fetchone()
+                current = json.loads(row[0]) if row and row[0] is not None else {}
+                self._put(conn, name, keys[0], _nested_set(current, keys[1:], value))
+            self._bump(conn, name, keys[0])
+
+    def append(self, filepath: str, key: str, value: Any) -> None:
+        """Append to the list stored under a top-level key, e.g. conversations[session_id]."""
+        name = os.path.basename(filepath)
+        with self._transaction() as conn:
+            if name == CONVERSATION_FILENAME:
+                self._mark(conn, name, key)
+                conn.execute('INSERT INTO conversation (session_id, data) VALUES (?, ?)', (key, json.dumps(value)))
+            elif name == FEEDBACK_FILENAME:
+                self._mark(conn, name, key)
+                self._insert_feedback(conn, key, [value])
+            else:
+                row = conn.execute('SELECT value FROM entries WHERE file = ? AND key = ?', (name, key)).fetchone()
+                current = json.loads(row[0]) if row and row[0] is not None else []
+                self._put(conn, name, key, (current if isinstance(current, list) else []) + [value])
+            self._bump(conn, name, key)
+
+    def replace(self, filepath: str, data: Dict) -> None:
+        """Replace a whole file, e.g. when the admin clears all data or a round is imported."""
+        name = os.path.basename(filepath)
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM entries WHERE file = ?', (name,))
+            if name == FEEDBACK_FILENAME:
+                conn.execute('DELETE FROM nfr_responses')
+            elif name == CONVERSATION_FILENAME:
+                conn.execute('DELETE FROM conversation')
+            elif name == GATE_ANSWERS_FILENAME:
+                conn.execute('DELETE FROM gate_answers')
+            for key, value in (data or {}).items():
+                self._put(conn, name, key, value)
+            self._bump(conn, name, '')
+
+    # ----------------------------------------------------------- nfr feedback
+
+    def feedback_for(self, session_id: str, batch: Any) -> List[Dict]:
+        """Return a participant's NFR responses for one batch (indexed lookup)."""
+        rows = self._conn().execute(
+            'SELECT data FROM nfr_responses WHERE session_id = ? AND batch = ? ORDER BY id', (session_id, batch))
+        return [json.loads(value) for value, in rows]
+
+    def iter_feedback(self, batch: Any = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Yield (session_id, response) for every NFR response (or those of one batch), grouped by
+        participant. Rows are read from the cursor as they are consumed, not all at once.
+        """
+        if batch is None:
+            rows = self._conn().execute('SELECT session_id, data FROM nfr_responses ORDER BY session_id, id')
+        else:
+            rows = self._conn().execute(
+                'SELECT session_id, data FROM nfr_responses WHERE batch = ? ORDER BY session_id, id', (batch,))
+        for session_id, value in rows:
+            yield session_id, json.loads(value)
+
+    def replace_feedback(self, session_id: str, batch: Any, entries: List[Dict], nfr_id: Any) -> None:
+        """Replace a participant's NFR response for one NFR of a batch (None matches responses without one)."""
+        with self._transaction() as conn:
+            self._mark(conn, FEEDBACK_FILENAME, session_id)
+            # IS rather than = so a missing nfr_id (NULL) matches too
+            conn.execute('DELETE FROM nfr_responses WHERE session_id = ? AND batch IS ? AND nfr_id IS ?',
+                         (session_id, batch, nfr_id))
+            self._insert_feedback(conn, session_id, entries)
+            self._bump(conn, FEEDBACK_FILENAME, session_id)
+
+    def replace_batch_feedback(self, session_id: str, batch: Any, entries: List[Dict]) -> None:
+        """Replace all of a participant's NFR responses for a batch with `entries`."""
+        with self._transaction() as conn:
+            self._mark(conn, FEEDBACK_FILENAME, session_id)
+            conn.execute('DELETE FROM nfr_responses WHERE session_id = ? AND batch IS ?', (session_id, batch))
+            self._insert_feedback(conn, session_id, entries)
+            self._bump(conn, FEEDBACK_FILENAME, session_id)
+
+    # ------------------------------------------------------------- lifecycle
+
+    def start(self) -> None:
+        """Nothing runs in the background; present for parity with ResponseStore."""
+
+    def compact(self) -> None:
+        """Fold the WAL back into the database file."""
+        self._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------------------------------------------------- import / export
+
+    def import_directory(self, directory: str) -> List[str]:
+        """Load every known round file found in `directory` (e.g. data/2.pilot), replacing current data."""
+        imported = []
+        for filename in ROUND_FILENAMES:
+            path = os.path.join(directory, filename)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.replace(filename, data)
+            imported.append(filename)
+        return imported
+
+    def export_directory(self, directory: str, indent: Optional[int] = 2) -> List[str]:
+        """Write every file present in the database back out in the `responses/*.json` layout."""
+        os.makedirs(directory, exist_ok=True)
+        present = {name for name, in self._conn().execute('SELECT file FROM versions')}
+        exported = []
+        for filename in ROUND_FILENAMES:
+            if filename not in present:
+                continue
+            with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+                json.dump(self.load(filename), f, indent=indent)
+            exported.append(filename)
+        return exported
+
+    # -------------------------------------------------------------- internals
+
+    def _put(self, conn: sqlite3.Connection, name: str, key: str, value: Any) -> None:
+        if name == FEEDBACK_FILENAME and isinstance(value, list):
+            self._mark(conn, name, key)
+            conn.execute('DELETE FROM nfr_responses WHERE session_id = ?', (key,))
+            self._insert_feedback(conn, key, value)
+        elif name == CONVERSATION_FILENAME and isinstance(value, list):
+            self._mark(conn, name, key)
+            conn.execute('DELETE FROM conversation WHERE session_id = ?', (key,))
+            conn.executemany('INSERT INTO conversation (session_id, data) VALUES (?, ?)',
+                             [(key, json.dumps(turn)) for turn in value])
+        elif name == GATE_ANSWERS_FILENAME and isinstance(value, dict):
+            self._mark(conn, name, key)
+            conn.execute('DELETE FROM gate_answers WHERE session_id = ?', (key,))
+            conn.executemany('INSERT INTO gate_answers (session_id, batch, nfr_id, data) VALUES (?, ?, ?, ?)',
+                             [(key, batch, nfr_id, json.dumps(answer))
+                              for batch, answers in value.items() for nfr_id, answer in answers.items()])
+        else:
+            conn.execute('INSERT INTO entries (file, key, value) VALUES (?, ?, ?) '
+                         'ON CONFLICT (file, key) DO UPDATE SET value = excluded.value',
+                         (name, key, json.dumps(value)))
+
+    @staticmethod
+    def _mark(conn: sqlite3.Connection, name: str, key: str) -> None:
+        """Record a session key whose contents live in a side table (keeps key order, value NULL)."""
+        conn.execute('INSERT INTO entries (file, key, value) VALUES (?, ?, NULL) '
+                     'ON CONFLICT (file, key) DO UPDATE SET value = NULL', (name, key))
+
+    @staticmethod
+    def _insert_feedback(conn: sqlite3.Connection, session_id: str, entries: List[Dict]) -> None:
+        conn.executemany(
+            'INSERT INTO nfr_responses (session_id, batch, nfr_id, data) VALUES (?, ?, ?, ?)',
+            [(session_id, e.get('batch'), e.get('nfr_id'), json.dumps(e)) for e in entries])
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, key: str) -> None:
+        """Bump the file's version and record it against the key written ('' for the whole file)."""
+        conn.execute('INSERT INTO versions (file, version) VALUES (?, 1) '
+                     'ON CONFLICT (file) DO UPDATE SET version = version + 1', (name,))
+        if not key:
+            conn.execute('DELETE FROM changes WHERE file = ?', (name,))
+        conn.execute('INSERT INTO changes (file, key, version) SELECT ?, ?, version FROM versions WHERE file = ? '
+                     'ON CONFLICT (file, key) DO UPDATE SET version = excluded.version', (name, key, name))
+
+
+class _Transaction:
+    """`with` helper that runs the block in BEGIN IMMEDIATE ... COMMIT/ROLLBACK."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def _nested_set(data: Dict, keys: List[str], value: Any) -> Dict:
+    updated = dict(data) if isinstance(data, dict) else {}
+    if len(keys) == 1:
+        updated[keys[0]] = value
+    else:
+        updated[keys[0]] = _nested_set(updated.get(keys[0], {}), keys[1:], value)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move study rounds between data/N.* directories and SQLite.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='Load a round directory (e.g. data/2.pilot) into a database')
+    imp.add_argument('directory')
+    imp.add_argument('db')
+    exp = sub.add_parser('export', help='Write a database back out as a round directory')
+    exp.add_argument('db')
+    exp.add_argument('directory')
+    args = parser.parse_args()
+
+    store = SqliteResponseStore(ROUND_FILENAMES, args.db)
+    if args.command == 'import':
+        files = store.import_directory(args.directory)
+        print(f"Imported {', '.join(files) or 'nothing'} from {args.directory} into {args.db}")
+    else:
+        files = store.export_directory(args.directory)
+        print(f"Exported {', '.join(files) or 'nothing'} from {args.db} to {args.directory}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()